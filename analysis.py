@@ -0,0 +1,264 @@
+"""
+kata-analyze 输出解析与分析快照
+
+解析线程每收到一次引擎更新就构造一个新的 AnalysisSnapshot，再通过一次属性赋值整体替换；
+绘制线程拿到引用后直接读取，不需要加锁。快照及其中的候选字典发布后不再修改。
+"""
+import math
+import random
+import re
+import time
+from collections import namedtuple
+
+from animal_rules import ROWS, COLS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ANALYSIS_MOVE_PATTERN = re.compile(
+    r'info move (\w+)'
+    r'.*?visits (\d+)'
+    r'.*?winrate ([-\d.]+(?:[eE][-+]?\d+)?)'
+    r'.*?scoreMean ([-\d.]+(?:[eE][-+]?\d+)?)'
+    r'.*?lcb ([-\d.]+(?:[eE][-+]?\d+)?)'
+    r'.*?order (\d+)'
+    r'.*?pv ([\w\s]+?)(?=\s*(?:info|rootInfo|ownership|ownershipStdev|$))',
+    re.DOTALL
+)
+ROOT_VISITS_PATTERN = re.compile(r'rootInfo.*?\bvisits\s+(\d+)')
+# 数值个数必须恰好是 ROWS*COLS，多出来的说明棋盘尺寸不符
+OWNERSHIP_PATTERN = re.compile(r'\bownership((?:\s+[-\d.eE+]+){%d})(?!\S|\s+[-\d.])' % (ROWS * COLS))
+
+# results: 按 visits、winrate 降序排列的候选元组；root_visits: rootInfo 中的总访问数（没有时为0）
+# key: 快照所属局面的缓存键（见 Dandelion.analysis_position_key）
+# ownership: 走棋方视角的归属度 ROWS×COLS 数组（+1为走棋方），未请求或没有numpy时为None
+AnalysisSnapshot = namedtuple(
+    'AnalysisSnapshot', ['results', 'root_visits', 'created', 'key', 'ownership'], defaults=(None, None)
+)
+EMPTY_SNAPSHOT = AnalysisSnapshot((), 0, 0.0)
+
+
+def movestr_to_pos(move):
+    if len(move) != 2 and len(move) != 3:
+        return (None, None)
+    col = ord(move[0].upper()) - ord('A')
+    assert (col != ord('I') - ord('A'))
+    if col > ord('I') - ord('A'):  # gtp协议不包括i
+        col -= 1
+    row = ROWS - int(move[1:]) if len(move) == 2 else ROWS - int(move[1:3])
+    return col, row
+
+
+def parse_root_visits(line):
+    if "rootInfo" not in line:
+        return None
+    root_match = ROOT_VISITS_PATTERN.search(line)
+    return int(root_match.group(1)) if root_match else None
+
+
+def parse_ownership(line):
+    """解析ownership段的 ROWS*COLS 个数，按棋盘行列排成数组；没有numpy时返回None"""
+    if np is None or "ownership" not in line:
+        return None
+    match = OWNERSHIP_PATTERN.search(line)
+    if not match:
+        return None
+    return np.array(match.group(1).split(), dtype=np.float32).reshape(ROWS, COLS)
+
+
+def parse_analysis_moves(line):
+    """解析一行中的全部候选着法，返回字典列表"""
+    results = []
+    if not ("info" in line and "visits" in line and "winrate" in line):
+        return results
+    for match in ANALYSIS_MOVE_PATTERN.finditer(line):
+        move = match.group(1)
+        col, row = movestr_to_pos(move)
+        if col is None:
+            continue
+        results.append({
+            'move': move,
+            'col': col,
+            'row': row,
+            'visits': int(match.group(2)),
+            'winrate': float(match.group(3)) * 100,
+            'drawrate': float(match.group(4)),
+            'lcb': float(match.group(5)),
+            'order': int(match.group(6)),
+            'pv': match.group(7),
+        })
+    return results
+
+
+def sort_results(results):
+    return tuple(sorted(results, key=lambda x: (-x['visits'], -x['winrate'])))
+
+
+def build_snapshot(previous, line, merge=False, key=None):
+    """由上一个快照和一行引擎输出构造新快照；merge为True时保留上一快照中本行未出现的着法"""
+    if previous.key != key:
+        previous = AnalysisSnapshot((), 0, 0.0, key)
+    root_visits = parse_root_visits(line)
+    moves = parse_analysis_moves(line)
+    ownership = parse_ownership(line)
+    if root_visits is None:
+        root_visits = previous.root_visits
+    if ownership is None:
+        ownership = previous.ownership
+    if not moves:
+        if root_visits == previous.root_visits and ownership is previous.ownership:
+            return previous
+        return AnalysisSnapshot(previous.results, root_visits, time.time(), key, ownership)
+
+    if merge:
+        by_move = {result['move']: result for result in previous.results}
+        for result in moves:
+            by_move[result['move']] = result
+        moves = list(by_move.values())
+    return AnalysisSnapshot(sort_results(moves), root_visits, time.time(), key, ownership)
+
+
+def snapshot_depth(snapshot):
+    """快照的搜索深度：优先用rootInfo的访问数，没有时用候选访问数之和"""
+    if snapshot.root_visits > 0:
+        return snapshot.root_visits
+    return sum(result['visits'] for result in snapshot.results)
+
+
+def best_result(results):
+    """order为0的着法，没有时取第一项"""
+    if not results:
+        return None
+    return next((r for r in results if r['order'] == 0), results[0])
+
+
+# 收敛判断：最佳着法连续这么久不变、期间胜率漂移不超过阈值、LCB领先次佳足够多且访问数足够时停止分析
+CONVERGENCE_STABLE_SECONDS = 15.0
+CONVERGENCE_MIN_VISITS = 20000
+CONVERGENCE_WINRATE_DELTA = 0.5  # 百分点
+CONVERGENCE_LCB_GAP = 1.0  # 百分点
+
+
+class ConvergenceMonitor:
+    """跟踪同一局面的分析快照，判断继续搜索是否还会改变结论"""
+
+    def __init__(self, stable_seconds=CONVERGENCE_STABLE_SECONDS, min_visits=CONVERGENCE_MIN_VISITS,
+                 winrate_delta=CONVERGENCE_WINRATE_DELTA, lcb_gap=CONVERGENCE_LCB_GAP):
+        self.stable_seconds = stable_seconds
+        self.min_visits = min_visits
+        self.winrate_delta = winrate_delta
+        self.lcb_gap = lcb_gap
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.best_move = None
+        self.since = 0.0  # 当前最佳着法开始稳定的时间
+        self.since_winrate = 0.0
+
+    def update(self, snapshot, now=None):
+        """喂入最新快照，返回是否已收敛；局面、最佳着法变化或胜率漂移过大时重新计时"""
+        now = time.time() if now is None else now
+        best = best_result(snapshot.results)
+        if best is None:
+            self.reset()
+            return False
+        if (snapshot.key != self.key or best['move'] != self.best_move
+                or abs(best['winrate'] - self.since_winrate) > self.winrate_delta):
+            self.key, self.best_move = snapshot.key, best['move']
+            self.since, self.since_winrate = now, best['winrate']
+            return False
+        if now - self.since < self.stable_seconds or snapshot_depth(snapshot) < self.min_visits:
+            return False
+        others = [result['lcb'] for result in snapshot.results if result is not best]
+        return not others or (best['lcb'] - max(others)) * 100 >= self.lcb_gap
+
+
+# 着法评价：(图片键, 文字)，与 resource 中的评价图片对应
+MOVE_CLASSES = {
+    'nice': "关键的一步棋。",
+    'brilliant': "太棒了！",
+    'best': "精准的着法。",
+    'ok': "很好。",
+    'mistake': "还有更好的走法。",
+    'blunder': "恶手。",
+}
+
+
+def classify_move(best_winrate, played_winrate, is_best, second_winrate=None):
+    """按胜率损失给着法分类，返回 MOVE_CLASSES 的键；走了最佳着且与次佳差距大时评为关键/妙手"""
+    if is_best and second_winrate is not None:
+        criticality = best_winrate - second_winrate
+        if criticality > 15:
+            return 'nice'
+        elif 10 < criticality <= 15:
+            return 'brilliant'
+
+    win_rate_drop = best_winrate - played_winrate
+    if win_rate_drop <= 3:
+        return 'best'
+    elif win_rate_drop < 8:
+        return 'ok'
+    elif win_rate_drop < 20:
+        return 'mistake'
+    return 'blunder'
+
+
+ANALYZE_MIN_INTERVAL = 20  # kata-analyze 输出间隔下限（厘秒），即原先固定使用的值
+ANALYZE_MAX_INTERVAL = 100
+
+
+def analyze_command(fps=None, maxmoves=None, ownership=False, root_info=True, interval=None):
+    """按界面实际需要组装 kata-analyze 命令：输出不比画面刷新更快，只请求会被绘制的内容"""
+    if interval is None:
+        interval = ANALYZE_MIN_INTERVAL
+        if fps:
+            interval = min(ANALYZE_MAX_INTERVAL, max(ANALYZE_MIN_INTERVAL, math.ceil(100 / fps)))
+    parts = [f"kata-analyze interval {interval}"]
+    if maxmoves:
+        parts.append(f"maxmoves {maxmoves}")
+    if ownership:
+        parts.append("ownership true")
+    if root_info:
+        parts.append("rootInfo true")
+    return " ".join(parts)
+
+
+def parse_raw_policy(lines):
+    """从 kata-raw-nn 的输出行中取出 policy 段，返回 ROWS×COLS 的概率列表（NAN即非法处记为0）"""
+    try:
+        start = lines.index("policy") + 1
+    except ValueError:
+        return None
+    grid = []
+    for line in lines[start:start + ROWS]:
+        try:
+            values = [float(v) for v in line.split()]
+        except ValueError:
+            return None  # 输出被截断或夹杂了其他响应
+        grid.append([0.0 if math.isnan(v) else v for v in values])
+    if len(grid) != ROWS or any(len(row) != COLS for row in grid):
+        return None
+    return grid
+
+
+def sample_policy_move(source_policy, destination_policies, legal_moves, temperature, rng=random):
+    """按 P(选子)×P(落子|选子) 的联合策略采样一步合法着法；temperature 为0时取概率最大的着法"""
+    weights = []
+    for start, end in legal_moves:
+        dest_policy = destination_policies.get(start)
+        if dest_policy is None:
+            continue
+        p = source_policy[start[0]][start[1]] * dest_policy[end[0]][end[1]]
+        if p > 0:
+            weights.append(((start, end), p))
+    if not weights:
+        return None
+    if temperature <= 0:
+        return max(weights, key=lambda item: item[1])[0]
+    moves = [move for move, _ in weights]
+    top = max(p for _, p in weights)
+    scaled = [(p / top) ** (1.0 / temperature) for _, p in weights]
+    return rng.choices(moves, weights=scaled)[0]
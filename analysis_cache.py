@@ -0,0 +1,82 @@
+"""
+按局面缓存分析快照（LRU）
+
+键由调用方给出（局面FEN、规则设置、选中的棋子等），每个键只保留访问数最多的快照，
+回到访问过的局面时可以立即显示之前的分析，新的分析更深时才替换。
+可选的 store（见 analysis_store.AnalysisStore）作为二级存储：内存未命中时查询，更深的快照写回。
+"""
+import threading
+from collections import OrderedDict
+
+from analysis import snapshot_depth
+
+ANALYSIS_CACHE_SIZE = 2000
+
+
+class AnalysisCache:
+    def __init__(self, capacity=ANALYSIS_CACHE_SIZE, store=None):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.store = store
+        self.store_misses = set()  # 已确认持久库中没有的键，避免每帧重复查询
+
+    def get(self, key):
+        with self.lock:
+            snapshot = self.entries.get(key)
+            if snapshot is not None:
+                self.entries.move_to_end(key)
+                return snapshot
+            if self.store is None or key in self.store_misses:
+                return None
+        snapshot = self.store.lookup(key)
+        with self.lock:
+            if snapshot is None:
+                if len(self.store_misses) > self.capacity * 4:
+                    self.store_misses.clear()
+                self.store_misses.add(key)
+                return None
+            self.insert(key, snapshot)
+        return snapshot
+
+    def insert(self, key, snapshot):
+        """调用方需持有 self.lock"""
+        self.entries[key] = snapshot
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def preload(self):
+        """启动时从持久库读入最近的条目"""
+        if self.store is None:
+            return
+        for key, snapshot in self.store.recent(self.capacity):
+            with self.lock:
+                existing = self.entries.get(key)
+                if existing is None or snapshot_depth(snapshot) > snapshot_depth(existing):
+                    self.insert(key, snapshot)
+
+    def depth(self, key):
+        snapshot = self.get(key)
+        return snapshot_depth(snapshot) if snapshot is not None else 0
+
+    def offer(self, key, snapshot):
+        """快照比已有的更深时存入，返回是否替换"""
+        if key is None or not snapshot.results:
+            return False
+        existing = self.get(key)
+        with self.lock:
+            if existing is not None and snapshot_depth(existing) >= snapshot_depth(snapshot):
+                return False
+            self.store_misses.discard(key)
+            self.insert(key, snapshot)
+        if self.store is not None:
+            self.store.save(key, snapshot)
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,144 @@
+"""
+跨会话持久化的分析库（SQLite）
+
+每个（局面键, 网络）只保存访问数最多的一份快照。读取在调用线程上直接查询，
+写入放进队列由后台线程合并后批量提交，不阻塞界面。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from queue import Queue, Empty
+
+from analysis import AnalysisSnapshot, snapshot_depth
+
+ANALYSIS_STORE_PATH = "./resource/analysis.sqlite3"
+STORE_FLUSH_INTERVAL = 1.0  # 批量提交的最长间隔（秒）
+STORE_BATCH_SIZE = 200
+STORE_PRELOAD_LIMIT = 2000  # 启动时预读最近更新的条目数
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    position TEXT NOT NULL,
+    network TEXT NOT NULL,
+    visits INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (position, network)
+)
+"""
+UPSERT = """
+INSERT INTO analysis (position, network, visits, payload, updated) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(position, network) DO UPDATE SET
+    visits = excluded.visits, payload = excluded.payload, updated = excluded.updated
+WHERE excluded.visits > analysis.visits
+"""
+
+
+def engine_network_id(command):
+    """从引擎命令行中取 -model 参数的文件名作为网络标识"""
+    parts = command.split()
+    for i, part in enumerate(parts[:-1]):
+        if part == "-model":
+            return os.path.basename(parts[i + 1])
+    return os.path.basename(parts[0]) if parts else "unknown"
+
+
+def encode_key(key):
+    return json.dumps(key, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_key(text):
+    fen, selected, *rest = json.loads(text)
+    return (fen, tuple(selected) if selected is not None else None, *rest)
+
+
+def encode_snapshot(snapshot):
+    return json.dumps(
+        {'root_visits': snapshot.root_visits, 'results': list(snapshot.results)},
+        ensure_ascii=False, separators=(',', ':')
+    )
+
+
+def decode_snapshot(payload, key, updated):
+    data = json.loads(payload)
+    return AnalysisSnapshot(tuple(data['results']), data['root_visits'], updated, key)
+
+
+class AnalysisStore:
+    def __init__(self, path=ANALYSIS_STORE_PATH, network="unknown"):
+        self.path = path
+        self.network = network
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.read_lock = threading.Lock()
+        self.write_queue = Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def lookup(self, key):
+        with self.read_lock:
+            row = self.conn.execute(
+                "SELECT payload, updated FROM analysis WHERE position = ? AND network = ?",
+                (encode_key(key), self.network)
+            ).fetchone()
+        if row is None:
+            return None
+        return decode_snapshot(row[0], key, row[1])
+
+    def recent(self, limit=STORE_PRELOAD_LIMIT):
+        """最近更新的条目，按时间从旧到新，用于启动时预热内存缓存"""
+        with self.read_lock:
+            rows = self.conn.execute(
+                "SELECT position, payload, updated FROM analysis WHERE network = ? ORDER BY updated DESC LIMIT ?",
+                (self.network, limit)
+            ).fetchall()
+        entries = []
+        for position, payload, updated in reversed(rows):
+            key = decode_key(position)
+            entries.append((key, decode_snapshot(payload, key, updated)))
+        return entries
+
+    def save(self, key, snapshot):
+        self.write_queue.put((key, snapshot))
+
+    def write_loop(self):
+        conn = sqlite3.connect(self.path)
+        running = True
+        while running:
+            pending = {}
+            item = self.write_queue.get()
+            deadline = time.time() + STORE_FLUSH_INTERVAL
+            while True:
+                if item is None:
+                    running = False
+                    break
+                key, snapshot = item
+                existing = pending.get(key)
+                if existing is None or snapshot_depth(snapshot) > snapshot_depth(existing):
+                    pending[key] = snapshot
+                if len(pending) >= STORE_BATCH_SIZE:
+                    break
+                try:
+                    item = self.write_queue.get(timeout=max(0.0, deadline - time.time()))
+                except Empty:
+                    break
+            if pending:
+                conn.executemany(UPSERT, [
+                    (encode_key(key), self.network, snapshot_depth(snapshot), encode_snapshot(snapshot), time.time())
+                    for key, snapshot in pending.items()
+                ])
+                conn.commit()
+        conn.close()
+
+    def close(self):
+        self.write_queue.put(None)
+        self.writer.join(timeout=5)
+        with self.read_lock:
+            self.conn.close()
@@ -0,0 +1,272 @@
+"""
+斗兽棋规则核心（不依赖pygame）
+
+棋盘为 ROWS x COLS 的二维列表，' ' 表示空格；大写为蓝方('w')，小写为红方('b')。
+rule 对应 kata-set-rule scoring 的取值：
+    0 狮虎不能跳过己方老鼠，河里和陆上的老鼠不能互吃
+    1 狮虎不能跳过己方老鼠，河里和陆上的老鼠能互吃
+    2 狮虎能跳过己方老鼠，河里和陆上的老鼠不能互吃
+    3 狮虎能跳过己方老鼠，河里和陆上的老鼠能互吃
+"""
+
+ROWS, COLS = 9, 7
+DRAW_MOVE_LIMIT = 300
+BLUE_DEN = (8, 3)  # D1
+RED_DEN = (0, 3)   # D9
+DENS = {'w': BLUE_DEN, 'b': RED_DEN}
+TRAPS = {
+    'w': {(8, 2), (7, 3), (8, 4)},  # C1, D2, E1
+    'b': {(0, 2), (1, 3), (0, 4)},  # C9, D8, E9
+}
+WATER = {
+    (3, 1), (3, 2), (4, 1), (4, 2), (5, 1), (5, 2),
+    (3, 4), (3, 5), (4, 4), (4, 5), (5, 4), (5, 5),
+}
+PIECE_RANKS = {
+    'r': 1, 'c': 2, 'd': 3, 'w': 4, 'j': 5, 't': 6, 'l': 7, 'e': 8,
+}
+PIECE_LETTERS = set('rcdwjtleRCDWJTLE')
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+INITIAL_FEN = "l5t/1d3c1/r1j1w1e/7/7/7/E1W1J1R/1C3D1/T5L w"
+
+
+def get_opp(p):
+    if p == 'w':
+        return 'b'
+    elif p == 'b':
+        return 'w'
+    return None
+
+
+def player_name(player):
+    return "蓝方" if player == 'w' else "红方"
+
+
+def piece_owner(piece):
+    if piece == ' ':
+        return None
+    return 'w' if piece.isupper() else 'b'
+
+
+def is_piece_of_player(piece, player):
+    if piece == ' ':
+        return False
+    return (player == 'w' and piece.isupper()) or (player == 'b' and piece.islower())
+
+
+def piece_rank(piece):
+    return PIECE_RANKS.get(piece.lower(), 0)
+
+
+def can_lion_tiger_jump_over_own_rat(rule):
+    return rule in [2, 3]
+
+
+def can_water_land_rats_capture(rule):
+    return rule in [1, 3]
+
+
+def can_capture_piece(rule, piece, target_piece, from_pos, to_pos):
+    if target_piece == ' ':
+        return True
+
+    player = piece_owner(piece)
+    target_player = piece_owner(target_piece)
+    if player is None or target_player is None or player == target_player:
+        return False
+
+    # A piece in the defender's own trap can be captured by any defender.
+    if to_pos in TRAPS[player]:
+        return True
+
+    piece_type = piece.lower()
+    target_type = target_piece.lower()
+    from_water = from_pos in WATER
+    to_water = to_pos in WATER
+
+    if piece_type == 'r' and target_type == 'r':
+        if from_water != to_water and not can_water_land_rats_capture(rule):
+            return False
+        return True
+
+    if piece_type == 'r' and target_type == 'e':
+        return not from_water
+    if piece_type == 'e' and target_type == 'r':
+        return False
+
+    mover_rank = piece_rank(piece)
+    target_rank = piece_rank(target_piece)
+    if from_pos in TRAPS[target_player]:
+        mover_rank = 0
+    return mover_rank >= target_rank
+
+
+def legal_move_destination(board, rule, row, col, drow, dcol):
+    piece = board[row][col]
+    player = piece_owner(piece)
+    if player is None:
+        return None
+
+    target_row = row + drow
+    target_col = col + dcol
+    if not (0 <= target_row < ROWS and 0 <= target_col < COLS):
+        return None
+
+    if piece.lower() in ('l', 't') and (target_row, target_col) in WATER:
+        jump_row, jump_col = target_row, target_col
+        while 0 <= jump_row < ROWS and 0 <= jump_col < COLS and (jump_row, jump_col) in WATER:
+            blocker = board[jump_row][jump_col]
+            if blocker.lower() == 'r':
+                blocker_owner = piece_owner(blocker)
+                if blocker_owner != player or not can_lion_tiger_jump_over_own_rat(rule):
+                    return None
+            jump_row += drow
+            jump_col += dcol
+
+        if not (0 <= jump_row < ROWS and 0 <= jump_col < COLS):
+            return None
+        target_row, target_col = jump_row, jump_col
+
+    if DENS[player] == (target_row, target_col):
+        return None
+
+    target_piece = board[target_row][target_col]
+    if target_piece != ' ' and piece_owner(target_piece) == player:
+        return None
+
+    if (target_row, target_col) in WATER and piece.lower() != 'r':
+        return None
+
+    if target_piece != ' ' and not can_capture_piece(rule, piece, target_piece, (row, col), (target_row, target_col)):
+        return None
+
+    return target_row, target_col
+
+
+def piece_destinations(board, rule, row, col):
+    destinations = []
+    for drow, dcol in DIRECTIONS:
+        target = legal_move_destination(board, rule, row, col, drow, dcol)
+        if target is not None:
+            destinations.append(target)
+    return destinations
+
+
+def legal_moves(board, player, rule):
+    """返回 [((sr, sc), (er, ec)), ...]"""
+    moves = []
+    for row in range(ROWS):
+        for col in range(COLS):
+            if not is_piece_of_player(board[row][col], player):
+                continue
+            for target in piece_destinations(board, rule, row, col):
+                moves.append(((row, col), target))
+    return moves
+
+
+def has_legal_move(board, player, rule):
+    for row in range(ROWS):
+        for col in range(COLS):
+            if not is_piece_of_player(board[row][col], player):
+                continue
+            for drow, dcol in DIRECTIONS:
+                if legal_move_destination(board, rule, row, col, drow, dcol) is not None:
+                    return True
+    return False
+
+
+def calculate_game_result(board, player, move_num, rule):
+    if board[RED_DEN[0]][RED_DEN[1]] != ' ' and piece_owner(board[RED_DEN[0]][RED_DEN[1]]) == 'w':
+        return {'type': 'win', 'winner': 'w', 'reason': '进入红色兽穴D9'}
+    if board[BLUE_DEN[0]][BLUE_DEN[1]] != ' ' and piece_owner(board[BLUE_DEN[0]][BLUE_DEN[1]]) == 'b':
+        return {'type': 'win', 'winner': 'b', 'reason': '进入蓝色兽穴D1'}
+    if move_num >= DRAW_MOVE_LIMIT:
+        return {'type': 'draw', 'winner': None, 'reason': '达到300步（150回合）'}
+    if not has_legal_move(board, player, rule):
+        return {'type': 'win', 'winner': get_opp(player), 'reason': f"{player_name(player)}无子可动"}
+    return None
+
+
+def apply_move(board, start, end):
+    """返回走子后的新棋盘，原棋盘不变"""
+    new_board = [row.copy() for row in board]
+    sr, sc = start
+    er, ec = end
+    new_board[er][ec] = new_board[sr][sc]
+    new_board[sr][sc] = ' '
+    return new_board
+
+
+def board_to_fen(board, player=None):
+    fen_rows = []
+    for row in board:
+        fen_row = []
+        empty = 0
+        for cell in row:
+            if cell == ' ':
+                empty += 1
+            else:
+                if empty > 0:
+                    fen_row.append(str(empty))
+                    empty = 0
+                fen_row.append(cell)
+        if empty > 0:
+            fen_row.append(str(empty))
+        fen_rows.append(''.join(fen_row))
+    fen = '/'.join(fen_rows)
+    if player is not None:
+        fen += f' {player}'
+    return fen
+
+
+def parse_fen(fen_str):
+    """解析FEN，返回 (board, player)，格式错误时抛出 ValueError"""
+    parts = fen_str.strip().split()
+    if len(parts) < 1:
+        raise ValueError("FEN不能为空")
+
+    rows = parts[0].split('/')
+    if len(rows) != ROWS:
+        raise ValueError(f"需要{ROWS}行，实际{len(rows)}行")
+
+    board = []
+    for row in rows:
+        fen_row = []
+        empty = 0
+        for char in row:
+            if char.isdigit():
+                empty = empty * 10 + int(char)
+            else:
+                if empty > 0:
+                    fen_row.extend([' '] * empty)
+                    empty = 0
+                if char not in PIECE_LETTERS:
+                    raise ValueError(f"无效棋子字符: {char}")
+                fen_row.append(char)
+        if empty > 0:
+            fen_row.extend([' '] * empty)
+        if len(fen_row) != COLS:
+            raise ValueError(f"行'{row}'列数错误，应有{COLS}列")
+        board.append(fen_row)
+
+    player = 'w'
+    if len(parts) >= 2:
+        player = parts[1].lower()
+        if player not in ('w', 'b'):
+            raise ValueError("当前玩家应为w或b")
+    return board, player
+
+
+def coord_to_movestr(row, col):
+    return f"{chr(col + ord('A'))}{ROWS - row}"
+
+
+def movestr_to_coord(move):
+    """'C1' -> (row, col)，格式错误返回 None"""
+    if len(move) not in (2, 3) or not move[1:].isdigit():
+        return None
+    col = ord(move[0].upper()) - ord('A')
+    row = ROWS - int(move[1:])
+    if not (0 <= row < ROWS and 0 <= col < COLS):
+        return None
+    return row, col
@@ -0,0 +1,154 @@
+"""
+按本机硬件校准人机对弈的难度
+
+HUMAN_AI_DIFFICULTIES 是固定的访问数，在GPU与纯CPU（Eigen）版本上的思考时间相差很大。
+本工具先测本机的 visits/s，把每一档的访问数限制在 --max-move-seconds 秒内能完成的范围，
+再让相邻两档自对弈测出Elo差（最低的搜索档记为0），结果写入难度配置文件，人机对弈启动时读取。
+只用策略网络的档（HUMAN_AI_POLICY_LEVELS）不搜索，原样写入配置，不参与测速与Elo测量。
+
+用法：
+    python calibrate.py --engine "<katago命令行>" --games 40
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+from analysis import snapshot_depth
+from animal_rules import INITIAL_FEN
+from engine_client import GtpEngine, GtpError
+from match_runner import MATCH_ANALYZE_INTERVAL, EngineConfig, Match, elo_interval, load_openings
+from settings import HUMAN_AI_DIFFICULTIES, HUMAN_AI_POLICY_LEVELS, KATAGO_COMMAND
+
+DIFFICULTY_PROFILE_PATH = "./resource/difficulty_profile.json"
+SPEED_TEST_VISITS = 2000
+MIN_LEVEL_VISITS = 10
+
+
+def load_difficulty_profile(path=DIFFICULTY_PROFILE_PATH):
+    """读取校准结果；文件不存在或格式不对时返回None（使用默认难度）"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            profile = json.load(f)
+        levels = profile['levels']
+        if not levels or not all(level['name'] and int(level['visits']) > 0 for level in levels):
+            raise ValueError("难度列表为空或访问数无效")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"无法读取难度配置 {path}: {e}")
+        return None
+    return profile
+
+
+def measure_speed(command, openings, visits=SPEED_TEST_VISITS):
+    """在若干开局上各搜索一次，返回平均 visits/s"""
+    engine = GtpEngine(command)
+    try:
+        engine.command(f"setfen {openings[0]}")
+        engine.analyze(100, interval=MATCH_ANALYZE_INTERVAL)  # 预热，排除首次计算的开销
+        total_visits, total_seconds = 0, 0.0
+        for fen in openings[:3]:
+            engine.command(f"setfen {fen}")
+            started = time.perf_counter()
+            snapshot = engine.analyze(visits, interval=MATCH_ANALYZE_INTERVAL)
+            total_seconds += time.perf_counter() - started
+            total_visits += snapshot_depth(snapshot)
+    finally:
+        engine.close()
+    return total_visits / total_seconds if total_seconds > 0 else 0.0
+
+
+def calibrated_visits(nominal, visits_per_second, max_move_seconds):
+    return max(MIN_LEVEL_VISITS, min(nominal, int(visits_per_second * max_move_seconds)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按本机硬件校准人机对弈难度")
+    parser.add_argument("--engine", metavar="CMD", default=KATAGO_COMMAND, help="引擎命令行，默认使用KATAGO_COMMAND")
+    parser.add_argument("--max-move-seconds", type=float, default=5.0, help="每档AI每步的最长预期用时（秒）")
+    parser.add_argument("--games", type=int, default=20, help="相邻两档之间的对局数，为0时只测速")
+    parser.add_argument("--concurrency", type=int, default=2, help="并行对局数")
+    parser.add_argument("--openings", metavar="FILE", help="开局库，每行一个FEN")
+    parser.add_argument("--output", metavar="FILE", default=DIFFICULTY_PROFILE_PATH,
+                        help=f"难度配置文件，默认 {DIFFICULTY_PROFILE_PATH}")
+    args = parser.parse_args(argv)
+
+    openings = load_openings(args.openings) if args.openings else [INITIAL_FEN]
+    try:
+        visits_per_second = measure_speed(args.engine, openings)
+    except (OSError, GtpError) as e:
+        print(f"测速失败: {e}")
+        return 1
+    if visits_per_second <= 0:
+        print("测速失败: 引擎没有输出搜索结果")
+        return 1
+    print(f"本机速度: {visits_per_second:.0f} visits/s")
+
+    levels = []
+    for name, nominal in HUMAN_AI_DIFFICULTIES:
+        if name in HUMAN_AI_POLICY_LEVELS:
+            levels.append({
+                'name': name,
+                'nominal_visits': nominal,
+                'visits': nominal,
+                'policy_temperature': HUMAN_AI_POLICY_LEVELS[name],
+            })
+            print(f"{name}: 策略网络（温度 {HUMAN_AI_POLICY_LEVELS[name]}），不参与校准")
+            continue
+        visits = calibrated_visits(nominal, visits_per_second, args.max_move_seconds)
+        levels.append({
+            'name': name,
+            'nominal_visits': nominal,
+            'visits': visits,
+            'move_seconds': round(visits / visits_per_second, 3),
+            'elo': 0.0,
+            'elo_margin': 0.0,
+        })
+        print(f"{name}: {visits} visits（原 {nominal}），约 {visits / visits_per_second:.2f}秒/步")
+
+    # 相邻两个搜索档对局，Elo差与误差沿阶梯累加
+    search_levels = [level for level in levels if 'policy_temperature' not in level]
+    for lower, upper in zip(search_levels, search_levels[1:]):
+        upper['elo'], upper['elo_margin'] = lower['elo'], lower['elo_margin']
+        if args.games <= 0:
+            continue
+        print(f"{upper['name']} 对 {lower['name']} ...")
+        match = Match(
+            EngineConfig("A", args.engine, upper['visits'], []),
+            EngineConfig("B", args.engine, lower['visits'], []),
+            openings, args.games, args.concurrency, verbose=False,
+        )
+        match.run()
+        if match.wins + match.draws + match.losses == 0:
+            continue
+        elo, low, high = elo_interval(match.wins, match.draws, match.losses)
+        upper['elo'] = round(lower['elo'] + elo, 1)
+        upper['elo_margin'] = round(math.hypot(lower['elo_margin'], (high - low) / 2), 1)
+
+    profile = {
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'engine': args.engine,
+        'visits_per_second': round(visits_per_second, 1),
+        'max_move_seconds': args.max_move_seconds,
+        'games_per_level': args.games,
+        'levels': levels,
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    for level in search_levels:
+        print(f"{level['name']}: {level['visits']} visits  Elo {level['elo']:+.0f} ±{level['elo_margin']:.0f}")
+    print(f"已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+后台任务用的独立GTP引擎
+
+每个 GtpEngine 单独启动一个引擎进程，与主界面的引擎互不干扰。命令带编号同步收发，
+kata-analyze 读到目标访问数（或引擎不再输出）为止。EnginePool 让一组引擎各占一个工作线程，
+从同一个任务队列取任务并行处理，用于整盘复盘等批量分析；serve 模式下引擎常驻，随时接收 submit 的任务。
+MirrorEngine 则是异步的：界面把发给主引擎的命令原样转发给它，用于双引擎对比。
+"""
+import itertools
+import subprocess
+import threading
+import time
+from collections import deque
+from queue import Queue, Empty
+
+from analysis import AnalysisSnapshot, analyze_command, build_snapshot, snapshot_depth
+from engine_metrics import ENGINE_READY_TIMEOUT, EngineMetrics
+
+ANALYZE_INTERVAL = 50  # 后台分析的输出间隔（厘秒），只需要最后一行，不必太密
+ANALYZE_STALL_SECONDS = 5.0  # 这么久没有新的分析行就认为搜索已停止
+
+
+class GtpError(Exception):
+    pass
+
+
+def position_update(previous, commands):
+    """从上次摆好的局面（setfen 加一串 play）换到 commands 描述的局面：返回 (要悔的步数, 要补发的命令)；
+    setfen 不同或没有上次的局面时返回 (0, 全部命令)"""
+    if not previous or not commands or previous[0] != commands[0]:
+        return 0, list(commands)
+    common = 0
+    for old, new in zip(previous, commands):
+        if old != new:
+            break
+        common += 1
+    return len(previous) - common, list(commands[common:])
+
+
+def is_analysis_command(command):
+    """开始/停止分析的命令（可带GTP编号）；排队时只有最后一条有意义"""
+    name = command.split()
+    if name and name[0].isdigit():
+        name = name[1:]
+    return bool(name) and (name[0] == "kata-analyze" or name == ["stop"])
+
+
+def enqueue_command(queue, command, ready):
+    """把命令加入发送队列（deque，就地修改），主引擎与对比引擎共用的合并规则：
+    引擎就绪前还没有在分析，开始/停止分析只有最后一条有意义；
+    就绪后只取代队尾连续的开始/停止分析，更早的要保持与play等命令的先后"""
+    if is_analysis_command(command):
+        if not ready:
+            kept = [c for c in queue if not is_analysis_command(c)]
+            queue.clear()
+            queue.extend(kept)
+        else:
+            while queue and is_analysis_command(queue[-1]):
+                queue.pop()
+    queue.append(command)
+
+
+class GtpEngine:
+    def __init__(self, command):
+        self.command_line = command
+        self.process = subprocess.Popen(
+            command.split(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        self.lines = Queue()
+        self.stderr_tail = deque(maxlen=20)  # 出错时用于提示
+        self.ids = itertools.count(1)
+        self.setup = None  # 最近一次 configure 的命令
+        self.position = None  # 最近一次 set_position 摆好的局面，不确定时为None
+        threading.Thread(target=self.pump_stdout, daemon=True).start()
+        threading.Thread(target=self.pump_stderr, daemon=True).start()
+
+    def pump_stdout(self):
+        for line in self.process.stdout:
+            self.lines.put(line.rstrip("\r\n"))
+        self.lines.put(None)
+
+    def pump_stderr(self):
+        for line in self.process.stderr:
+            self.stderr_tail.append(line.rstrip())
+
+    def read_line(self, timeout=None):
+        try:
+            line = self.lines.get(timeout=timeout)
+        except Empty:
+            raise GtpError("引擎响应超时")
+        if line is None:
+            self.lines.put(None)
+            detail = self.stderr_tail[-1] if self.stderr_tail else ""
+            raise GtpError(f"引擎已退出 {detail}".strip())
+        return line
+
+    def send(self, command):
+        """发送一条带编号的命令，返回编号"""
+        cmd_id = next(self.ids)
+        try:
+            self.process.stdin.write(f"{cmd_id} {command}\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise GtpError(f"命令发送失败: {e}")
+        return cmd_id
+
+    def wait_response(self, cmd_id, timeout=None, multiline=True):
+        """跳过之前残留的输出，读到 =编号 / ?编号 开头的响应"""
+        while True:
+            line = self.read_line(timeout)
+            head, _, text = line.partition(" ")
+            if head in (f"={cmd_id}", f"?{cmd_id}"):
+                break
+        lines = [text]
+        if multiline:
+            while True:
+                line = self.read_line(timeout)
+                if not line.strip():
+                    break
+                lines.append(line)
+        if head.startswith("?"):
+            raise GtpError(f"引擎拒绝命令: {' '.join(lines).strip()}")
+        return "\n".join(lines).strip()
+
+    def command(self, command, timeout=None):
+        return self.wait_response(self.send(command), timeout)
+
+    def configure(self, commands, timeout=None):
+        """规则等设置与上次不同时才发送；设置变了之后局面也重新摆"""
+        commands = list(commands)
+        if commands == self.setup:
+            return
+        self.forget_state()
+        for command in commands:
+            self.command(command, timeout)
+        self.setup = commands
+
+    def set_position(self, commands, timeout=None):
+        """摆到 commands（setfen 加一串 play，每个play对应一次undo）描述的局面，只发送与上次局面不同的部分"""
+        undo_count, new_commands = position_update(self.position, commands)
+        self.position = None  # 中途出错时下次完整重摆
+        for _ in range(undo_count):
+            self.command("undo", timeout)
+        for command in new_commands:
+            self.command(command, timeout)
+        self.position = list(commands)
+
+    def forget_state(self):
+        """任务出错后引擎的状态不确定，下次完整发送设置与局面"""
+        self.setup = None
+        self.position = None
+
+    def analyze(self, visits, key=None, timeout=None, interval=ANALYZE_INTERVAL):
+        """分析当前局面直到达到访问数，返回最后的快照"""
+        self.command(f"kata-set-param maxVisits {visits}", timeout)
+        cmd_id = self.send(analyze_command(interval=interval))
+        self.wait_response(cmd_id, timeout, multiline=False)
+        snapshot = AnalysisSnapshot((), 0, 0.0, key)
+        while snapshot_depth(snapshot) < visits:
+            try:
+                line = self.read_line(ANALYZE_STALL_SECONDS)
+            except GtpError:
+                if self.process.poll() is not None:
+                    raise
+                break  # 已到引擎自己的访问上限或无着可走
+            if line.startswith("info"):
+                snapshot = build_snapshot(snapshot, line, key=key)
+        self.command("stop", timeout)
+        return snapshot
+
+    def close(self):
+        try:
+            self.command("quit", timeout=2)
+        except GtpError:
+            pass
+        if self.process.poll() is None:
+            self.process.terminate()
+
+
+class EnginePool:
+    """固定数量的引擎，每个引擎一个工作线程；引擎在工作线程里启动，互不等待"""
+
+    def __init__(self, command, size, setup_commands=()):
+        self.command = command
+        self.size = max(1, size)
+        self.setup_commands = list(setup_commands)
+        self.cancelled = threading.Event()
+        self.engines = []
+        self.lock = threading.Lock()
+        self.tasks = None  # serve 模式的任务队列
+
+    def run(self, tasks, handler, on_result, on_error=None):
+        """handler(engine, task) 在工作线程中执行，结果交给 on_result(task, result)；
+        出错时调用 on_error(error, task)，引擎启动失败时 task 为None"""
+        queue = Queue()
+        for task in tasks:
+            queue.put(task)
+        workers = []
+        for _ in range(min(self.size, len(tasks))):
+            worker = threading.Thread(target=self.worker, args=(queue, handler, on_result, on_error), daemon=True)
+            worker.start()
+            workers.append(worker)
+        return workers
+
+    def serve(self, handler, on_result, on_error=None):
+        """常驻模式：启动全部引擎，工作线程一直等待 submit 提交的任务，直到 cancel"""
+        self.tasks = Queue()
+        for _ in range(self.size):
+            threading.Thread(target=self.worker, args=(self.tasks, handler, on_result, on_error, True), daemon=True).start()
+
+    def submit(self, task):
+        self.tasks.put(task)
+
+    def discard_pending(self):
+        """丢弃还没开始的任务，正在分析的任务照常完成"""
+        while True:
+            try:
+                self.tasks.get_nowait()
+            except Empty:
+                break
+
+    def start_engine(self):
+        engine = GtpEngine(self.command)
+        with self.lock:
+            self.engines.append(engine)
+        try:
+            for command in self.setup_commands:
+                engine.command(command)
+        except GtpError:
+            engine.close()
+            raise
+        return engine
+
+    def worker(self, queue, handler, on_result, on_error, wait=False):
+        """一个任务出错只报告该任务，工作线程继续处理后面的任务；引擎进程退出时重新启动"""
+        engine = None
+        try:
+            while not self.cancelled.is_set():
+                if engine is None or engine.process.poll() is not None:
+                    if engine is not None:
+                        engine.close()
+                        with self.lock:
+                            self.engines.remove(engine)
+                        engine = None
+                    engine = self.start_engine()
+                try:
+                    task = queue.get(timeout=0.5) if wait else queue.get_nowait()
+                except Empty:
+                    if wait:
+                        continue
+                    break
+                try:
+                    result = handler(engine, task)
+                except Exception as e:
+                    engine.forget_state()
+                    if on_error and not self.cancelled.is_set():
+                        on_error(e, task)
+                    continue
+                on_result(task, result)
+        except (OSError, GtpError) as e:
+            if on_error and not self.cancelled.is_set():
+                on_error(e, None)
+        finally:
+            if engine is not None:
+                engine.close()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.lock:
+            engines = list(self.engines)
+        for engine in engines:
+            if engine.process.poll() is None:
+                engine.process.terminate()
+
+
+class MirrorEngine:
+    """跟随主引擎命令的第二个引擎：命令经发送队列由独立线程写入（就绪前暂存），
+    stdout 中的分析行连同引擎最近确认的GTP编号一起交给 on_info(line, epoch)，其余响应丢弃"""
+
+    def __init__(self, command, on_info):
+        self.command_line = command
+        self.on_info = on_info
+        self.metrics = EngineMetrics()
+        self.metrics.start(command)
+        self.outbound = deque()
+        self.outbound_ready = threading.Condition()
+        self.ready = False
+        self.closing = False
+        self.epoch = None  # 最近一条带编号命令的确认（=编号），只由读取线程修改
+        self.process = subprocess.Popen(
+            command.split(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        threading.Thread(target=self.pump_stdout, daemon=True).start()
+        threading.Thread(target=self.pump_stderr, daemon=True).start()
+        threading.Thread(target=self.write_commands, daemon=True).start()
+        threading.Thread(target=self.watch_startup, daemon=True).start()
+
+    def pump_stdout(self):
+        for line in self.process.stdout:
+            if line.startswith("info"):
+                self.on_info(line.strip(), self.epoch)
+            elif line.startswith("="):
+                ident = line[1:].split(" ", 1)[0].strip()
+                if ident.isdigit():
+                    self.epoch = int(ident)
+
+    def pump_stderr(self):
+        for line in self.process.stderr:
+            self.metrics.feed(line)
+            if self.metrics.ready and not self.ready:
+                self.mark_ready()
+        if not self.ready:
+            self.metrics.stage = 'exited'
+
+    def mark_ready(self):
+        with self.outbound_ready:
+            self.ready = True
+            self.outbound_ready.notify()
+
+    def watch_startup(self):
+        """与主引擎相同的兜底：长时间没有输出也没有 GTP ready 时按已就绪处理，面板显示未收到就绪标志"""
+        while not self.ready and not self.closing and self.metrics.stage != 'exited':
+            if self.metrics.startup_stalled():
+                self.metrics.assume_ready()
+                print(f"对比引擎{ENGINE_READY_TIMEOUT:.0f}秒没有输出且未报告GTP ready，按已就绪开始发送命令")
+                self.mark_ready()
+                return
+            time.sleep(1.0)
+
+    def write_commands(self):
+        """发送线程：引擎就绪后按顺序写出队列中的命令，写完quit后结束"""
+        while True:
+            with self.outbound_ready:
+                while not ((self.ready or self.closing) and self.outbound):
+                    self.outbound_ready.wait()
+                command = self.outbound.popleft()
+            self.write(command)
+            if command == "quit":
+                return
+
+    def write(self, command):
+        try:
+            self.process.stdin.write(command + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            pass  # 进程已退出，由 metrics.stage 显示
+
+    def send(self, command):
+        """只入队，不在调用线程写管道；合并规则见 enqueue_command"""
+        with self.outbound_ready:
+            if self.closing:
+                return
+            enqueue_command(self.outbound, command, self.ready)
+            self.outbound_ready.notify()
+
+    def close(self):
+        """不阻塞界面：丢弃未发出的命令，由发送线程写quit，后台等待引擎退出（如仍在调优）就终止"""
+        with self.outbound_ready:
+            self.closing = True
+            self.outbound = deque(["quit"])
+            self.outbound_ready.notify()
+        threading.Thread(target=self.reap, daemon=True).start()
+
+    def reap(self):
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
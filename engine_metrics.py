@@ -0,0 +1,229 @@
+"""
+KataGo stderr 解析为性能指标
+
+read_stderr 把每一行交给 EngineMetrics.feed，从中取出版本、后端、设备、模型、OpenCL调优进度、
+就绪耗时，以及 benchmark / genmove 日志里的 visits/s 与 nnEvals/s。kata-analyze 不在stderr输出
+搜索统计，所以访问速度另由解析线程按 rootInfo 访问数的增量估计（record_root_visits）。
+export 把当前指标追加到 JSON Lines 文件，便于比较不同机器和配置。
+stage 记录引擎启动所处的阶段，界面据此在引擎就绪前暂存命令并显示调优进度。
+没有等到 GTP ready（版本不同、日志被关闭等）时，startup_stalled 判断启动是否已停滞，由调用方 assume_ready 兜底。
+"""
+import json
+import os
+import platform
+import re
+import time
+
+ENGINE_METRICS_PATH = "./resource/engine_metrics.jsonl"
+RATE_WINDOW_SECONDS = 1.0  # 访问速度的最短统计窗口
+ENGINE_READY_TIMEOUT = 30.0  # 未就绪的引擎这么久没有任何stderr输出，就认为它已在等待命令（秒）
+
+VERSION_RE = re.compile(r'KataGo v(\S+)')
+MODEL_RE = re.compile(r'Model name:\s*(\S+)')
+BACKEND_RE = re.compile(r'\b(OpenCL|CUDA|Cuda|TensorRT|Eigen|Metal|CoreML|ONNX)\b')
+DEVICE_RE = re.compile(r'Found (?:GPU|OpenCL Device \d+:)\s*(.+?)(?:\s+memory|\s+\(|$)')
+TUNING_STAGE_RE = re.compile(r'Tuning (\w+) for')
+TUNING_STEP_RE = re.compile(r'Tuning (\d+)/(\d+)')
+VISITS_RATE_RE = re.compile(r'visits/s\s*=\s*([\d.]+)')
+NN_RATE_RE = re.compile(r'nnEvals/s\s*=\s*([\d.]+)')
+TIME_TAKEN_RE = re.compile(r'Time taken:\s*([\d.]+)')
+PLAYOUTS_RE = re.compile(r'New playouts:\s*(\d+)')
+NN_ROWS_RE = re.compile(r'NN rows:\s*(\d+)')
+READY_MARK = "GTP ready"
+
+# 引擎生命周期：进程已启动但还没有输出 → 加载配置与模型（首次运行时可能插入OpenCL调优）→ 就绪
+ENGINE_STAGES = {
+    'spawning': "启动进程",
+    'loading': "加载模型",
+    'tuning': "OpenCL调优",
+    'ready': "就绪",
+    'exited': "已退出",
+}
+
+
+class EngineMetrics:
+    def __init__(self):
+        self.start()
+
+    def start(self, command=""):
+        """引擎进程启动时调用，清空上一次的指标"""
+        self.command = command
+        self.spawned = time.time()
+        self.ready_seconds = None
+        self.ready_assumed = False  # 没收到 GTP ready，按超时认定的就绪
+        self.last_output = self.spawned
+        self.stage = 'spawning'
+        self.version = None
+        self.backend = None
+        self.device = None
+        self.model = None
+        self.tuning_stage = None
+        self.tuning_step = 0
+        self.tuning_total = 0
+        self.visits_per_second = None
+        self.nn_evals_per_second = None
+        self.lines = 0
+        self.last_line = ""
+        self.time_taken = None
+        self.rate_start = None  # (时间, 访问数)
+
+    @property
+    def ready(self):
+        return self.ready_seconds is not None
+
+    @property
+    def tuning(self):
+        return self.stage == 'tuning'
+
+    @property
+    def elapsed(self):
+        return time.time() - self.spawned
+
+    @property
+    def tuning_percent(self):
+        if not self.tuning_total:
+            return 0.0
+        return 100.0 * self.tuning_step / self.tuning_total
+
+    def feed(self, line):
+        """解析一行stderr"""
+        self.last_output = time.time()
+        line = line.strip()
+        if not line:
+            return
+        self.lines += 1
+        self.last_line = line
+        if READY_MARK in line:
+            if self.ready_seconds is None or self.ready_assumed:
+                self.ready_seconds = time.time() - self.spawned
+                self.ready_assumed = False
+            self.stage = 'ready'
+            return
+        if self.stage == 'spawning':
+            self.stage = 'loading'
+
+        match = VERSION_RE.search(line)
+        if match and self.version is None:
+            self.version = match.group(1)
+        match = MODEL_RE.search(line)
+        if match:
+            self.model = match.group(1)
+        match = DEVICE_RE.search(line)
+        if match:
+            self.device = match.group(1)
+        match = BACKEND_RE.search(line)
+        if match and self.backend is None:
+            self.backend = "CUDA" if match.group(1) == "Cuda" else match.group(1)
+
+        if self.stage != 'ready':
+            if "autotuning" in line:
+                self.stage = 'tuning'
+            elif "Done tuning" in line:
+                self.stage = 'loading'
+        match = TUNING_STAGE_RE.search(line)
+        if match:
+            self.stage = 'tuning'
+            self.tuning_stage = match.group(1)
+            self.tuning_step, self.tuning_total = 0, 0
+        match = TUNING_STEP_RE.search(line)
+        if match:
+            self.stage = 'tuning'
+            self.tuning_step, self.tuning_total = int(match.group(1)), int(match.group(2))
+
+        # katago benchmark 的汇总行
+        match = VISITS_RATE_RE.search(line)
+        if match:
+            self.visits_per_second = float(match.group(1))
+        match = NN_RATE_RE.search(line)
+        if match:
+            self.nn_evals_per_second = float(match.group(1))
+
+        # genmove 打开 logSearchInfo 时的搜索统计
+        match = TIME_TAKEN_RE.search(line)
+        if match:
+            self.time_taken = float(match.group(1))
+        if self.time_taken:
+            match = PLAYOUTS_RE.search(line)
+            if match:
+                self.visits_per_second = int(match.group(1)) / self.time_taken
+            match = NN_ROWS_RE.search(line)
+            if match:
+                self.nn_evals_per_second = int(match.group(1)) / self.time_taken
+
+    def record_root_visits(self, visits, now=None):
+        """由分析输出的根节点访问数估计搜索速度；访问数变小说明开始了新的搜索"""
+        now = time.time() if now is None else now
+        if self.rate_start is None or visits < self.rate_start[1]:
+            self.rate_start = (now, visits)
+            return
+        start_time, start_visits = self.rate_start
+        elapsed = now - start_time
+        if elapsed < RATE_WINDOW_SECONDS:
+            return
+        rate = (visits - start_visits) / elapsed
+        if self.visits_per_second is None:
+            self.visits_per_second = rate
+        else:
+            self.visits_per_second = 0.7 * self.visits_per_second + 0.3 * rate
+        self.rate_start = (now, visits)
+
+    def startup_stalled(self, now=None):
+        """还没就绪、进程也没退出，却已 ENGINE_READY_TIMEOUT 秒没有输出"""
+        if self.ready or self.stage == 'exited':
+            return False
+        now = time.time() if now is None else now
+        return now - self.last_output >= ENGINE_READY_TIMEOUT
+
+    def assume_ready(self):
+        """按已就绪处理；之后真的收到 GTP ready 时改记实际的就绪耗时"""
+        self.ready_seconds = time.time() - self.spawned
+        self.ready_assumed = True
+        self.stage = 'ready'
+
+    def stage_text(self):
+        """启动阶段的说明，如“OpenCL调优 xGemmDirect 45%”"""
+        text = ENGINE_STAGES[self.stage]
+        if self.ready_assumed:
+            text += "（未收到GTP ready）"
+        if self.tuning:
+            if self.tuning_stage:
+                text += f" {self.tuning_stage}"
+            text += f" {self.tuning_percent:.0f}%"
+        return text
+
+    def summary_text(self):
+        """控制台标题栏显示的一行摘要"""
+        if not self.ready:
+            return f"引擎{self.stage_text()} {self.elapsed:.0f}s"
+        parts = [self.backend or "未知后端"]
+        if self.visits_per_second is not None:
+            parts.append(f"{self.visits_per_second:.0f} visits/s")
+        if self.nn_evals_per_second is not None:
+            parts.append(f"{self.nn_evals_per_second:.0f} nnEvals/s")
+        parts.append(f"就绪 {self.ready_seconds:.1f}s")
+        return " | ".join(parts)
+
+    def to_dict(self):
+        return {
+            'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'machine': platform.node(),
+            'platform': platform.platform(),
+            'command': self.command,
+            'version': self.version,
+            'backend': self.backend,
+            'device': self.device,
+            'model': self.model,
+            'ready_seconds': self.ready_seconds,
+            'ready_assumed': self.ready_assumed,
+            'tuning_percent': self.tuning_percent if self.tuning else None,
+            'visits_per_second': self.visits_per_second,
+            'nn_evals_per_second': self.nn_evals_per_second,
+        }
+
+    def export(self, path=ENGINE_METRICS_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False) + "\n")
+        return path
@@ -0,0 +1,369 @@
+"""
+模拟KataGo的GTP引擎，用于在没有GPU和真实引擎的情况下压测GUI的分析管线
+
+实现Dandelion用到的GTP子集：setfen、play（先选子后落子的两段式）、undo、clear_board、stop、
+kata-set-rule、kata-set-param、mm/mc、komi、showboard、kata-analyze 和 kata-raw-nn。
+着法与PV由 animal_rules 按真实规则生成，胜率等数值为按局面哈希生成的伪随机数，同一局面结果可复现。
+
+用法：
+    python fake_katago.py --rate 200 --candidates 12
+    python main.py --engine "python fake_katago.py --rate 100"
+"""
+import argparse
+import hashlib
+import random
+import re
+import sys
+import threading
+import time
+
+import animal_rules
+from animal_rules import ROWS, COLS, get_opp
+
+COMMAND_ID_RE = re.compile(r'^(\d+)\s+(.*)$')
+
+
+def position_seed(*parts):
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+class FakeKataGo:
+    def __init__(self, rate=None, candidates=8, visits_per_second=2000.0, pv_length=8,
+                 startup_delay=0.0, tune_steps=0, out=None, err=None):
+        self.rate = rate
+        self.candidates = candidates
+        self.visits_per_second = visits_per_second
+        self.pv_length = pv_length
+        self.startup_delay = startup_delay
+        self.tune_steps = tune_steps
+        self.out = out or sys.stdout
+        self.err = err or sys.stderr
+        self.out_lock = threading.Lock()
+        self.rule = 0
+        self.max_visits = None
+        self.params = {}
+        self.rules = {}
+        self.analysis_thread = None
+        self.analysis_stop = threading.Event()
+        self.clear_board()
+
+    # ================= 局面状态 =================
+    def clear_board(self):
+        board, player = animal_rules.parse_fen(animal_rules.INITIAL_FEN)
+        self.set_position(board, player)
+
+    def set_position(self, board, player):
+        self.board = board
+        self.player = player
+        self.selected = None
+        self.move_num = 0
+        self.history = []
+
+    def push_state(self):
+        self.history.append(([row.copy() for row in self.board], self.player, self.selected, self.move_num))
+
+    def play(self, color, square):
+        player = 'w' if color.upper() == 'B' else 'b'
+        coord = animal_rules.movestr_to_coord(square)
+        if coord is None or player != self.player:
+            return False
+        if self.selected is None:
+            if not animal_rules.is_piece_of_player(self.board[coord[0]][coord[1]], player):
+                return False
+            self.push_state()
+            self.selected = coord
+            return True
+        if coord not in animal_rules.piece_destinations(self.board, self.rule, *self.selected):
+            return False
+        self.push_state()
+        self.board = animal_rules.apply_move(self.board, self.selected, coord)
+        self.selected = None
+        self.player = get_opp(self.player)
+        self.move_num += 1
+        return True
+
+    def undo(self):
+        if not self.history:
+            return False
+        self.board, self.player, self.selected, self.move_num = self.history.pop()
+        return True
+
+    # ================= 伪分析 =================
+    def random_pv(self, board, player, rng, length):
+        pv = []
+        move_num = self.move_num
+        for _ in range(length // 2):
+            if animal_rules.calculate_game_result(board, player, move_num, self.rule):
+                break
+            moves = animal_rules.legal_moves(board, player, self.rule)
+            if not moves:
+                break
+            start, end = rng.choice(moves)
+            pv.append(animal_rules.coord_to_movestr(*start))
+            pv.append(animal_rules.coord_to_movestr(*end))
+            board = animal_rules.apply_move(board, start, end)
+            player = get_opp(player)
+            move_num += 1
+        return pv
+
+    def build_candidates(self):
+        """返回 [(着法, 先验, 基础胜率, 基础和率, pv列表), ...]，同一局面结果固定"""
+        fen = animal_rules.board_to_fen(self.board, self.player)
+        rng = random.Random(position_seed(fen, self.selected, self.rule))
+        if self.selected is None:
+            moves = animal_rules.legal_moves(self.board, self.player, self.rule)
+            by_start = {}
+            for start, end in moves:
+                by_start.setdefault(start, []).append(end)
+            options = [(start, rng.choice(ends)) for start, ends in sorted(by_start.items())]
+        else:
+            ends = animal_rules.piece_destinations(self.board, self.rule, *self.selected)
+            options = [(self.selected, end) for end in ends]
+
+        base = rng.uniform(0.2, 0.8)
+        candidates = []
+        for start, end in options:
+            prior = rng.random() ** 2 + 0.01
+            winrate = min(0.99, max(0.01, base + rng.uniform(-0.25, 0.15)))
+            drawrate = rng.uniform(0.0, 30.0)
+            after = animal_rules.apply_move(self.board, start, end)
+            tail = self.random_pv(after, get_opp(self.player), rng, self.pv_length)
+            head = [animal_rules.coord_to_movestr(*start), animal_rules.coord_to_movestr(*end)]
+            pv = head[1:] + tail if self.selected is not None else head + tail
+            move = pv[0]
+            candidates.append((move, prior, winrate, drawrate, pv))
+        total_prior = sum(c[1] for c in candidates) or 1.0
+        return [(m, p / total_prior, w, d, pv) for m, p, w, d, pv in candidates]
+
+    def raw_nn(self):
+        """kata-raw-nn 的输出：选子阶段给可动棋子的格子、落子阶段给目的格子分配策略，其余为NAN"""
+        fen = animal_rules.board_to_fen(self.board, self.player)
+        rng = random.Random(position_seed(fen, self.selected, self.rule, "policy"))
+        if self.selected is None:
+            squares = sorted({start for start, _ in animal_rules.legal_moves(self.board, self.player, self.rule)})
+        else:
+            squares = animal_rules.piece_destinations(self.board, self.rule, *self.selected)
+        weights = {square: rng.random() ** 2 + 0.01 for square in squares}
+        total = sum(weights.values()) or 1.0
+        win = rng.uniform(0.2, 0.8)
+        lines = ["symmetry 0", f"whiteWin {win:.6f}", f"whiteLoss {1 - win:.6f}", "noResult 0.000000", "policy"]
+        for row in range(ROWS):
+            lines.append(" ".join(
+                f"{weights[(row, col)] / total:.6f}" if (row, col) in weights else "NAN" for col in range(COLS)
+            ))
+        lines.append("policyPass 0.000000")
+        return "\n".join(lines)
+
+    def format_update(self, candidates, visits, rng, options):
+        shown = sorted(candidates, key=lambda c: -c[1])[:min(options['maxmoves'] or self.candidates, self.candidates)]
+        parts = []
+        root_winrate = 0.0
+        for order, (move, prior, winrate, drawrate, pv) in enumerate(shown):
+            child_visits = max(1, int(visits * prior))
+            noise = rng.gauss(0, 0.03) / (1 + child_visits ** 0.5 / 10)
+            wr = min(0.999, max(0.001, winrate + noise))
+            lcb = wr - 0.5 / (1 + child_visits ** 0.5)
+            if order == 0:
+                root_winrate = wr
+            parts.append(
+                f"info move {move} visits {child_visits} utility {2 * wr - 1:.6f} winrate {wr:.6f} "
+                f"scoreMean {drawrate:.6f} scoreStdev 0 scoreLead 0 scoreSelfplay 0 prior {prior:.6f} "
+                f"lcb {lcb:.6f} utilityLcb {2 * lcb - 1:.6f} order {order} pv {' '.join(pv)}"
+            )
+        parts.append(f"rootInfo visits {visits} utility {2 * root_winrate - 1:.6f} winrate {root_winrate:.6f} scoreMean 0")
+        if options['ownership']:
+            values = [rng.uniform(-1, 1) for _ in range(ROWS * COLS)]
+            parts.append("ownership " + " ".join(f"{v:.4f}" for v in values))
+        return " ".join(parts)
+
+    def run_analysis(self, interval, options):
+        candidates = self.build_candidates()
+        if not candidates or animal_rules.calculate_game_result(self.board, self.player, self.move_num, self.rule):
+            return
+        rng = random.Random(position_seed(time.time()))
+        period = 1.0 / self.rate if self.rate else max(0.001, interval / 100.0)
+        start = time.perf_counter()
+        max_visits = self.max_visits
+        while not self.analysis_stop.is_set():
+            visits = 1 + int((time.perf_counter() - start) * self.visits_per_second)
+            finished = max_visits is not None and visits >= max_visits
+            if finished:
+                visits = max_visits
+            self.write(self.format_update(candidates, visits, rng, options) + "\n")
+            if finished:
+                break
+            self.analysis_stop.wait(period)
+
+    def start_analysis(self, args):
+        interval = 10
+        options = {'maxmoves': 0, 'ownership': False}
+        tokens = args[:]
+        if tokens and tokens[0].isdigit():
+            interval = int(tokens.pop(0))
+        while len(tokens) >= 2:
+            key, value = tokens.pop(0), tokens.pop(0)
+            if key == "interval":
+                interval = int(value)
+            elif key == "maxmoves":
+                options['maxmoves'] = int(value)
+            elif key == "ownership":
+                options['ownership'] = value.lower() == "true"
+        self.analysis_stop.clear()
+        self.analysis_thread = threading.Thread(target=self.run_analysis, args=(interval, options), daemon=True)
+        self.analysis_thread.start()
+
+    def stop_analysis(self):
+        if self.analysis_thread is None:
+            return
+        self.analysis_stop.set()
+        self.analysis_thread.join()
+        self.analysis_thread = None
+        self.write("\n")
+
+    # ================= GTP =================
+    def write(self, text):
+        with self.out_lock:
+            self.out.write(text)
+            self.out.flush()
+
+    def respond(self, cmd_id, ok, text=""):
+        prefix = "=" if ok else "?"
+        body = f" {text}" if text else ""
+        self.write(f"{prefix}{cmd_id}{body}\n\n")
+
+    def showboard(self):
+        lines = []
+        for row in range(ROWS):
+            cells = [cell if cell != ' ' else '.' for cell in self.board[row]]
+            lines.append(f"{ROWS - row} " + " ".join(cells))
+        lines.append("  " + " ".join(chr(ord('A') + c) for c in range(COLS)))
+        lines.append(f"Next player: {'Black' if self.player == 'w' else 'White'}")
+        return "\n".join(lines)
+
+    def handle(self, line):
+        """处理一条命令，返回 False 表示退出"""
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return True
+        cmd_id = ""
+        match = COMMAND_ID_RE.match(line)
+        if match:
+            cmd_id, line = match.group(1), match.group(2)
+        parts = line.split()
+        cmd, args = parts[0], parts[1:]
+
+        self.stop_analysis()
+
+        if cmd == "quit":
+            self.respond(cmd_id, True)
+            return False
+        elif cmd == "name":
+            self.respond(cmd_id, True, "KataGo")
+        elif cmd == "version":
+            self.respond(cmd_id, True, "fake")
+        elif cmd == "protocol_version":
+            self.respond(cmd_id, True, "2")
+        elif cmd == "list_commands":
+            self.respond(cmd_id, True, "\n".join([
+                "setfen", "play", "undo", "clear_board", "stop", "showboard", "komi", "mm", "mc",
+                "kata-set-rule", "kata-set-param", "kata-analyze", "kata-raw-nn", "quit",
+            ]))
+        elif cmd == "setfen":
+            try:
+                board, player = animal_rules.parse_fen(" ".join(args))
+            except ValueError as e:
+                self.respond(cmd_id, False, str(e))
+            else:
+                self.set_position(board, player)
+                self.respond(cmd_id, True)
+        elif cmd == "clear_board":
+            self.clear_board()
+            self.respond(cmd_id, True)
+        elif cmd == "play":
+            if len(args) == 2 and self.play(args[0], args[1]):
+                self.respond(cmd_id, True)
+            else:
+                self.respond(cmd_id, False, "illegal move")
+        elif cmd == "undo":
+            ok = self.undo()
+            self.respond(cmd_id, ok, "" if ok else "cannot undo")
+        elif cmd == "showboard":
+            self.respond(cmd_id, True, "\n" + self.showboard())
+        elif cmd == "kata-set-rule":
+            if len(args) == 2 and args[0] == "scoring" and args[1].isdigit():
+                self.rule = int(args[1])
+            if len(args) == 2:
+                self.rules[args[0]] = args[1]
+            self.respond(cmd_id, True)
+        elif cmd == "kata-set-param":
+            if len(args) == 2:
+                self.params[args[0]] = args[1]
+                if args[0] == "maxVisits":
+                    self.max_visits = int(float(args[1]))
+            self.respond(cmd_id, True)
+        elif cmd in ("mm", "mc", "komi", "stop"):
+            self.respond(cmd_id, True)
+        elif cmd == "kata-analyze":
+            self.write(f"={cmd_id}\n")
+            self.start_analysis(args)
+        elif cmd == "kata-raw-nn":
+            self.respond(cmd_id, True, self.raw_nn())
+        else:
+            self.respond(cmd_id, False, "unknown command")
+        return True
+
+    def startup(self):
+        self.err.write("KataGo v1.15.3 (fake engine for Dandelion)\n")
+        self.err.write("Loaded config fake.cfg\n")
+        self.err.write("Model name: fake-network\n")
+        self.err.flush()
+        if self.tune_steps > 0:
+            # 模仿OpenCL首次调优的输出，startup_delay 平均分到每一步
+            self.err.write("Performing autotuning\n")
+            self.err.write("Tuning xGemmDirect for 1x1 convolutions and matrix mult\n")
+            self.err.write(f"Testing {self.tune_steps} different configs\n")
+            for step in range(self.tune_steps):
+                self.err.write(f"Tuning {step}/{self.tune_steps} Calls/sec {1000 + step}.0 L2Error 0\n")
+                self.err.flush()
+                time.sleep(self.startup_delay / self.tune_steps)
+            self.err.write("Done tuning\n")
+            self.err.flush()
+        elif self.startup_delay > 0:
+            time.sleep(self.startup_delay)
+        self.err.write("GTP ready, beginning main protocol loop\n")
+        self.err.flush()
+
+    def serve(self, stream=None):
+        stream = stream or sys.stdin
+        self.startup()
+        for line in stream:
+            if not self.handle(line):
+                break
+        self.stop_analysis()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟KataGo的GTP引擎（压测用）")
+    parser.add_argument("--rate", type=float, default=None, help="每秒输出多少次分析，默认按kata-analyze的interval")
+    parser.add_argument("--candidates", type=int, default=8, help="每次输出的候选着法数")
+    parser.add_argument("--visits-per-second", type=float, default=2000.0, help="模拟的搜索速度")
+    parser.add_argument("--pv-length", type=int, default=8, help="PV长度（步，按两段式计）")
+    parser.add_argument("--startup-delay", type=float, default=0.0, help="模拟加载模型的耗时（秒）")
+    parser.add_argument("--tune-steps", type=int, default=0, help="启动时模拟OpenCL调优输出的步数")
+    # 忽略未知参数（如 gtp -config ... -model ...），便于直接替换KataGo命令行
+    args, _ = parser.parse_known_args(argv)
+
+    engine = FakeKataGo(
+        rate=args.rate,
+        candidates=args.candidates,
+        visits_per_second=args.visits_per_second,
+        pv_length=args.pv_length,
+        startup_delay=args.startup_delay,
+        tune_steps=args.tune_steps,
+    )
+    engine.serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+GTP会话录制与回放
+
+录制文件每行一条记录：毫秒时间戳、流标记（i=stdin, o=stdout, e=stderr）、文本，用制表符分隔。
+文件名以 .gz 结尾时自动压缩。回放时可按原速、N倍速或不限速（speed=0）把stdout/stderr
+重新喂给 read_output / read_stderr，不需要真实的KataGo即可复现解析与绘制的负载。
+
+命令行用法：
+    python gtp_transcript.py summary session.gtp.gz
+    python gtp_transcript.py replay session.gtp.gz --speed 4
+    python gtp_transcript.py bench session.gtp.gz
+"""
+import argparse
+import gzip
+import sys
+import threading
+import time
+
+TRANSCRIPT_HEADER = "#dandelion-gtp-transcript 1"
+STREAM_STDIN = 'i'
+STREAM_STDOUT = 'o'
+STREAM_STDERR = 'e'
+STREAM_NAMES = {STREAM_STDIN: 'stdin', STREAM_STDOUT: 'stdout', STREAM_STDERR: 'stderr'}
+
+
+def open_transcript(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def load_transcript(path):
+    """读取录制文件，返回 [(秒, 流标记, 文本), ...]"""
+    records = []
+    with open_transcript(path, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split("\t", 2)
+            if len(parts) != 3 or parts[1] not in STREAM_NAMES:
+                continue
+            records.append((int(parts[0]) / 1000.0, parts[1], parts[2]))
+    return records
+
+
+class GtpTranscriptRecorder:
+    """线程安全的会话录制器，三个流共用一个时间原点"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open_transcript(path, "w")
+        self.file.write(TRANSCRIPT_HEADER + "\n")
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def record(self, stream, text):
+        text = text.rstrip("\r\n")
+        stamp = int((time.perf_counter() - self.start_time) * 1000)
+        with self.lock:
+            if self.closed:
+                return
+            for line in text.split("\n"):
+                self.file.write(f"{stamp}\t{stream}\t{line}\n")
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.file.close()
+
+
+class RecordingReader:
+    def __init__(self, stream, recorder, tag):
+        self.stream = stream
+        self.recorder = recorder
+        self.tag = tag
+
+    def readline(self):
+        line = self.stream.readline()
+        if line:
+            self.recorder.record(self.tag, line)
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class RecordingWriter:
+    def __init__(self, stream, recorder, tag):
+        self.stream = stream
+        self.recorder = recorder
+        self.tag = tag
+
+    def write(self, text):
+        if text.strip():
+            self.recorder.record(self.tag, text)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class RecordingProcess:
+    """包装 subprocess.Popen，收发的每一行都写入录制文件"""
+
+    def __init__(self, process, recorder):
+        self.process = process
+        self.recorder = recorder
+        self.stdin = RecordingWriter(process.stdin, recorder, STREAM_STDIN)
+        self.stdout = RecordingReader(process.stdout, recorder, STREAM_STDOUT)
+        self.stderr = RecordingReader(process.stderr, recorder, STREAM_STDERR)
+
+    def __getattr__(self, name):
+        return getattr(self.process, name)
+
+
+class ReplayWriter:
+    """回放时的stdin：丢弃写入，只保留最近的命令便于调试"""
+
+    def __init__(self):
+        self.last_command = None
+
+    def write(self, text):
+        if text.strip():
+            self.last_command = text.strip()
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayReader:
+    """按录制时间（除以speed）逐行吐出某个流的内容，speed<=0 表示不等待"""
+
+    def __init__(self, lines, clock_start, speed):
+        self.lines = lines
+        self.index = 0
+        self.clock_start = clock_start
+        self.speed = speed
+
+    def readline(self):
+        if self.index >= len(self.lines):
+            return ""
+        stamp, text = self.lines[self.index]
+        self.index += 1
+        if self.speed > 0:
+            delay = self.clock_start + stamp / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return text + "\n"
+
+    def close(self):
+        self.index = len(self.lines)
+
+
+class ReplayProcess:
+    """模拟 subprocess.Popen 的接口，用录制文件代替KataGo进程"""
+
+    def __init__(self, path, speed=1.0):
+        records = load_transcript(path)
+        clock_start = time.perf_counter()
+        self.stdin = ReplayWriter()
+        self.stdout = ReplayReader([(t, text) for t, s, text in records if s == STREAM_STDOUT], clock_start, speed)
+        self.stderr = ReplayReader([(t, text) for t, s, text in records if s == STREAM_STDERR], clock_start, speed)
+        self.returncode = None
+
+    def poll(self):
+        if self.stdout.index >= len(self.stdout.lines) and self.stderr.index >= len(self.stderr.lines):
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.poll()
+
+    def terminate(self):
+        self.stdout.close()
+        self.stderr.close()
+        self.returncode = 0
+
+    kill = terminate
+
+
+def summarize(records):
+    counts = {s: 0 for s in STREAM_NAMES}
+    info_lines = 0
+    for _, stream, text in records:
+        counts[stream] += 1
+        if stream == STREAM_STDOUT and text.startswith("info"):
+            info_lines += 1
+    duration = records[-1][0] if records else 0.0
+    return {
+        'duration': duration,
+        'stdin': counts[STREAM_STDIN],
+        'stdout': counts[STREAM_STDOUT],
+        'stderr': counts[STREAM_STDERR],
+        'info_lines': info_lines,
+        'info_rate': info_lines / duration if duration > 0 else 0.0,
+    }
+
+
+def bench_parser(records, repeat=1):
+    """把录制的info行全部送入分析解析器，返回 (行数, 耗时秒)"""
+    from analysis import EMPTY_SNAPSHOT, build_snapshot
+
+    lines = [text for _, stream, text in records if stream == STREAM_STDOUT and text.startswith("info")]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        snapshot = EMPTY_SNAPSHOT
+        for line in lines:
+            snapshot = build_snapshot(snapshot, line)
+    return len(lines) * repeat, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GTP会话录制文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_summary = sub.add_parser("summary", help="统计录制文件")
+    p_summary.add_argument("path")
+    p_replay = sub.add_parser("replay", help="把录制的stdout按时间输出到终端")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=1.0, help="回放倍速，0表示不限速")
+    p_bench = sub.add_parser("bench", help="测量分析行的解析速度")
+    p_bench.add_argument("path")
+    p_bench.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        stats = summarize(load_transcript(args.path))
+        print(f"时长: {stats['duration']:.1f}s")
+        print(f"stdin: {stats['stdin']}  stdout: {stats['stdout']}  stderr: {stats['stderr']}")
+        print(f"info行: {stats['info_lines']}（{stats['info_rate']:.1f} 行/秒）")
+    elif args.command == "bench":
+        count, elapsed = bench_parser(load_transcript(args.path), repeat=args.repeat)
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"解析 {count} 行，用时 {elapsed:.3f}s（{rate:.0f} 行/秒）")
+    elif args.command == "replay":
+        process = ReplayProcess(args.path, speed=args.speed)
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                break
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,49 +2,90 @@ import pygame
 import os
 import subprocess
 import threading
-from queue import Queue
-import re
+from collections import deque
+from queue import Queue, Empty
 import time
 import math
-import glob
 import sys
 import pyperclip
 import webbrowser
+import argparse
+import hashlib
+import itertools
+import random
+try:
+    import numpy as np
+except ImportError:
+    np = None
+import sqlite3
+from gtp_transcript import GtpTranscriptRecorder, RecordingProcess, ReplayProcess
+import animal_rules
+from animal_rules import DRAW_MOVE_LIMIT, WATER, DENS, get_opp
+from analysis import (
+    ANALYZE_MAX_INTERVAL, EMPTY_SNAPSHOT, MOVE_CLASSES, ConvergenceMonitor, analyze_command, build_snapshot, best_result,
+    classify_move, movestr_to_pos, parse_raw_policy, sample_policy_move, snapshot_depth
+)
+from analysis_cache import AnalysisCache
+from analysis_store import ANALYSIS_STORE_PATH, AnalysisStore, engine_network_id
+from calibrate import DIFFICULTY_PROFILE_PATH, load_difficulty_profile
+from engine_client import EnginePool, MirrorEngine, enqueue_command
+from engine_metrics import ENGINE_READY_TIMEOUT, EngineMetrics
+from settings import HUMAN_AI_DIFFICULTIES, HUMAN_AI_POLICY_LEVELS, KATAGO_COMMAND
 
 FONT_NAME = "simhei"
-GTP_COMMAND_ANALYZE = "kata-analyze interval 20"
 INITIAL_COMMANDS = "showboard"
 REFRESH_INTERVAL_SECOND = 0.02
+# 解析线程发现AI搜索达到目标访问数时投递的事件
+HUMAN_AI_SEARCH_DONE_EVENT = pygame.USEREVENT + 1
+# 策略网络快速着法的 kata-raw-nn 结果收齐时投递的事件
+HUMAN_AI_POLICY_EVENT = pygame.USEREVENT + 2
+# 复盘的全部任务结束时由等待线程投递，评分在主线程写入棋谱
+REVIEW_DONE_EVENT = pygame.USEREVENT + 3
 # 棋盘常量
 ROWS, COLS = 9, 7
 ANALYSIS_PANEL_RATIO = 0.3  # 分析面板宽度比例
 ANNOUNCE_RATIO = 0.2  # 公告栏宽度比例
-KATAGO_COMMAND = "./resource/engine/katago.exe gtp -config ./resource/engine/engine2024.cfg -model ./resource/engine/b10c384nbt.bin.gz -override-config drawJudgeRule=WEIGHT"
+# 双引擎对比时的第二个引擎，默认用 2.8_Lite 的 b10c192 网络
+COMPARE_KATAGO_COMMAND = "./resource/engine/katago.exe gtp -config ./resource/engine/engine2024.cfg -model ./resource/engine/b10c192nbt.bin.gz -override-config drawJudgeRule=WEIGHT"
+COMPARE_PANEL_MOVES = 5  # 对比模式下每个引擎显示的候选数
+COMPARE_MIN_VISITS = 200  # 两个引擎都达到这么多访问数后才计入最佳着法一致率
+COMPARE_AGREEMENT_SIZE = 1000  # 一致率最多统计这么多局面，超出后丢弃最早的
 NORMAL_MAX_VISITS = 1000000000
-HUMAN_AI_ANALYZE_COMMAND = GTP_COMMAND_ANALYZE
+ANALYSIS_PANEL_MOVES = 6  # 右侧选点列表显示的候选数，精简模式下只请求这么多
+ANALYSIS_DEBOUNCE_SECONDS = 0.2  # 连续点击、翻看棋谱时，输入停顿这么久才重新开始分析
+SELECTION_REUSE_VISITS = 3000  # 选子/取消选子时缓存的分析达到这么多访问数就直接显示，不再重新搜索
+# 空闲预分析：界面无操作一段时间且当前局面已分析足够后，依次分析棋谱中邻近的节点
+IDLE_PREANALYSIS_DELAY = 3.0  # 无操作多少秒后开始（秒）
+IDLE_FOREGROUND_VISITS = 2000  # 当前局面至少分析到这么多访问数才让出引擎
+IDLE_PREANALYSIS_VISITS = 400  # 每个邻近节点的访问数预算
+IDLE_PREANALYSIS_PLIES = 6  # 沿显示的主线向后预分析的步数
+IDLE_STALL_SECONDS = 2.0  # 引擎这么久没有新输出就认为该节点已分析完
+# 整盘复盘：每个局面的访问数与并行的引擎数
+REVIEW_VISITS = 800
+REVIEW_ENGINES = max(1, min(4, (os.cpu_count() or 2) // 2))
+# 选子后用常驻的后台引擎并行分析每个落点，落子时立即给出着法评价
+DESTINATION_VISITS = 400
+DESTINATION_ENGINES = min(2, REVIEW_ENGINES)  # 与前台分析同时运行，只占一两个引擎
+REVIEW_COLORS = {
+    'nice': (0, 150, 80), 'brilliant': (0, 120, 220), 'best': (90, 170, 90),
+    'ok': (150, 150, 150), 'mistake': (230, 140, 0), 'blunder': (210, 0, 0),
+}
+# 归属热力图：最大不透明度（归属度为±1时）
+OWNERSHIP_MAX_ALPHA = 150
+# 激进模式对应的 komi 与 playoutDoublingAdvantage
+AGGRESSIVE_SETTINGS = {0: ("0.0", "0.0"), 1: ("9.0", "-1.5"), -1: ("-9.0", "1.5")}
 HUMAN_AI_EVALUATION_VISITS = 500
-HUMAN_AI_DIFFICULTIES = [
-    ("新手", 50),
-    ("业余", 150),
-    ("爱好者", 500),
-    ("大师", 1500),
-    ("特级大师", 3000),
+HUMAN_AI_PONDER_VISITS = 20000  # 玩家思考时AI预想的访问数上限
+# 人机对弈计时：(名称, (基本时间秒, 每步加秒)），None 为不计时
+HUMAN_AI_TIME_CONTROLS = [
+    ("不计时", None),
+    ("5分+3秒", (300, 3)),
+    ("10分+5秒", (600, 5)),
+    ("15分+10秒", (900, 10)),
 ]
-DRAW_MOVE_LIMIT = 300
-BLUE_DEN = (8, 3)  # D1
-RED_DEN = (0, 3)   # D9
-DENS = {'w': BLUE_DEN, 'b': RED_DEN}
-TRAPS = {
-    'w': {(8, 2), (7, 3), (8, 4)},  # C1, D2, E1
-    'b': {(0, 2), (1, 3), (0, 4)},  # C9, D8, E9
-}
-WATER = {
-    (3, 1), (3, 2), (4, 1), (4, 2), (5, 1), (5, 2),
-    (3, 4), (3, 5), (4, 4), (4, 5), (5, 4), (5, 5),
-}
-PIECE_RANKS = {
-    'r': 1, 'c': 2, 'd': 3, 'w': 4, 'j': 5, 't': 6, 'l': 7, 'e': 8,
-}
+HUMAN_AI_MOVES_TO_GO = 25  # AI按还要走这么多步分配剩余时间
+HUMAN_AI_CLOCK_SAFETY = 0.5  # 每步预留的时间（秒），抵消事件与通信的延迟
+HUMAN_AI_MIN_SEARCH_FRACTION = 0.3  # 至少用掉这部分预算后才允许因最佳着法已确定而提前结束
 PIECE_NAMES_CN = {
     'r': '鼠', 'c': '猫', 'd': '狗', 'w': '狼',
     'j': '豹', 't': '虎', 'l': '狮', 'e': '象',
@@ -67,22 +108,9 @@ PIECES = {
     'J': 'Leopard', 'T': 'Tiger', 'L': 'Lion', 'E': 'Elephant'
 }
 
-def get_opp(p):
-    if p == 'w':
-        return 'b'
-    elif p == 'b':
-        return 'w'
-    return None
-
-def movestr_to_pos(move):
-    if len(move) != 2 and len(move) != 3:
-        return (None, None)
-    col = ord(move[0].upper()) - ord('A')
-    assert (col != ord('I') - ord('A'))
-    if col > ord('I') - ord('A'):  # gtp协议不包括i
-        col -= 1
-    row = ROWS - int(move[1:]) if len(move) == 2 else ROWS - int(move[1:3])
-    return col, row
+def format_clock(seconds):
+    seconds = max(0, int(math.ceil(seconds)))
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
 
 def draw_arrow(arrow_surface, start_pos, end_pos, line_width, arrow_size, color=(128, 128, 128, 128)):
 
@@ -153,59 +181,104 @@ def draw_arrow2(screen, start_pos, end_pos, line_width, out_width, arrow_size, c
     # 将半透明 Surface 绘制到屏幕上
     screen.blit(arrow_surface, (0, 0))
 
-def maybe_first_start():
-    # 目标目录
-    directory = r"./resource/engine/KataGoData/opencltuning"
-    # 获取目录下所有 .txt 文件的路径
-    txt_files = glob.glob(os.path.join(directory, "*.txt"))
-
-    # 遍历每个 .txt 文件
-    for file_path in txt_files:
-        # 检查文件是否非空
-        if os.path.getsize(file_path) > 0:
-            return False  # 存在非空的 .txt 文件
+def pre_tune(engine_command):
+    """不打开窗口，启动一次引擎直到 GTP ready 后退出，让OpenCL调优与模型加载提前完成"""
+    metrics = EngineMetrics()
+    metrics.start(engine_command)
+    try:
+        process = subprocess.Popen(
+            engine_command.split(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+    except OSError as e:
+        print(f"无法启动引擎: {e}")
+        return 1
+    last_text = None
+    for line in process.stderr:
+        metrics.feed(line)
+        text = metrics.stage_text()
+        if text != last_text:
+            print(f"[{metrics.elapsed:6.1f}s] {text}", flush=True)
+            last_text = text
+        if metrics.ready:
+            break
+    if not metrics.ready:
+        process.wait()
+        print(f"引擎在就绪前退出（返回码 {process.returncode}）: {metrics.last_line}")
+        return 1
+    process.stdin.write("quit\n")
+    process.stdin.flush()
+    process.wait()
+    print(f"引擎已就绪，用时 {metrics.ready_seconds:.1f}s")
+    return 0
+
+def extend_history(prefix, fen):
+    return hashlib.sha1(f"{prefix}|{fen}".encode('utf-8')).hexdigest()[:16]
 
-    return True  # 没有非空的 .txt 文件
 
 class Dandelion:
     # 在类开头添加需要被其他方法调用的方法定义
-    def try_send_command(self, cmds, enable_lock=True):
+    def try_send_command(self, cmds):
+        """命令放入发送队列后立即返回，由 write_commands 线程写入引擎，界面不会被写满的管道卡住"""
         cmds = cmds.split("\n")
-        for cmd in cmds:
+        compare = self.compare_engine
+        # 多行命令一次入队，其他线程的命令不会插在中间
+        with self.outbound_ready:
+            for cmd in cmds:
+                if compare is not None:
+                    compare.send(cmd)
+                enqueue_command(self.outbound_commands, cmd, self.engine_ready)
+            self.outbound_ready.notify()
+
+    def write_commands(self):
+        """发送线程：引擎就绪后按顺序写出队列中的命令"""
+        while True:
+            with self.outbound_ready:
+                while not (self.engine_ready and self.outbound_commands):
+                    self.outbound_ready.wait()
+                cmd = self.outbound_commands.popleft()
+            with self.analysis_lock:
+                self.gtp_log.append(('sent', cmd.strip()))  # 先记日志，保证在引擎的响应之前
             try:
                 self.katago_process.stdin.write(cmd + "\n")
                 self.katago_process.stdin.flush()
-                if enable_lock:
-                    with self.analysis_lock:
-                        self.gtp_log.append(('sent', cmd.strip()))
-                else:
-                    self.gtp_log.append(('sent', cmd.strip()))
             except Exception as e:
-                self.show_error_dialog = True
-                self.error_message = f"Instruction sending failed: {str(e)}"
+                self.show_error(f"Instruction sending failed: {str(e)}")
+
+    @property
+    def outbound_depth(self):
+        return len(self.outbound_commands)
+
+    def mark_engine_ready(self):
+        """引擎就绪，唤醒发送线程写出之前暂存的命令"""
+        with self.outbound_ready:
+            self.engine_ready = True
+            self.outbound_ready.notify()
 
     def show_error(self, message):
         self.show_error_dialog = True
         self.error_message = message
 
     def player_name(self, player):
-        return "蓝方" if player == 'w' else "红方"
+        return animal_rules.player_name(player)
 
     def gtp_color_for_player(self, player):
         return 'B' if player == 'w' else 'W'
 
     def is_piece_of_player(self, piece, player):
-        if piece == ' ':
-            return False
-        return (player == 'w' and piece.isupper()) or (player == 'b' and piece.islower())
+        return animal_rules.is_piece_of_player(piece, player)
 
     def piece_owner(self, piece):
-        if piece == ' ':
-            return None
-        return 'w' if piece.isupper() else 'b'
+        return animal_rules.piece_owner(piece)
 
     def piece_rank(self, piece):
-        return PIECE_RANKS.get(piece.lower(), 0)
+        return animal_rules.piece_rank(piece)
 
     def result_text(self, result):
         if not result:
@@ -215,10 +288,10 @@ class Dandelion:
         return f"{self.player_name(result.get('winner'))}胜：{result.get('reason', '')}"
 
     def can_lion_tiger_jump_over_own_rat(self):
-        return self.game_rule in [2, 3]
+        return animal_rules.can_lion_tiger_jump_over_own_rat(self.game_rule)
 
     def can_water_land_rats_capture(self):
-        return self.game_rule in [1, 3]
+        return animal_rules.can_water_land_rats_capture(self.game_rule)
 
     def is_water(self, row, col):
         return (row, col) in WATER
@@ -227,101 +300,16 @@ class Dandelion:
         return DENS[player] == (row, col)
 
     def can_capture_piece(self, piece, target_piece, from_pos, to_pos):
-        if target_piece == ' ':
-            return True
-
-        player = self.piece_owner(piece)
-        target_player = self.piece_owner(target_piece)
-        if player is None or target_player is None or player == target_player:
-            return False
-
-        # A piece in the defender's own trap can be captured by any defender.
-        if to_pos in TRAPS[player]:
-            return True
-
-        piece_type = piece.lower()
-        target_type = target_piece.lower()
-        from_water = from_pos in WATER
-        to_water = to_pos in WATER
-
-        if piece_type == 'r' and target_type == 'r':
-            if from_water != to_water and not self.can_water_land_rats_capture():
-                return False
-            return True
-
-        if piece_type == 'r' and target_type == 'e':
-            return not from_water
-        if piece_type == 'e' and target_type == 'r':
-            return False
-
-        mover_rank = self.piece_rank(piece)
-        target_rank = self.piece_rank(target_piece)
-        if from_pos in TRAPS[target_player]:
-            mover_rank = 0
-        return mover_rank >= target_rank
+        return animal_rules.can_capture_piece(self.game_rule, piece, target_piece, from_pos, to_pos)
 
     def legal_move_destination(self, row, col, drow, dcol):
-        piece = self.board[row][col]
-        player = self.piece_owner(piece)
-        if player is None:
-            return None
-
-        target_row = row + drow
-        target_col = col + dcol
-        if not (0 <= target_row < ROWS and 0 <= target_col < COLS):
-            return None
-
-        if piece.lower() in ('l', 't') and self.is_water(target_row, target_col):
-            jump_row, jump_col = target_row, target_col
-            while 0 <= jump_row < ROWS and 0 <= jump_col < COLS and self.is_water(jump_row, jump_col):
-                blocker = self.board[jump_row][jump_col]
-                if blocker.lower() == 'r':
-                    blocker_owner = self.piece_owner(blocker)
-                    if blocker_owner != player or not self.can_lion_tiger_jump_over_own_rat():
-                        return None
-                jump_row += drow
-                jump_col += dcol
-
-            if not (0 <= jump_row < ROWS and 0 <= jump_col < COLS):
-                return None
-            target_row, target_col = jump_row, jump_col
-
-        if self.is_own_den(player, target_row, target_col):
-            return None
-
-        target_piece = self.board[target_row][target_col]
-        if target_piece != ' ' and self.piece_owner(target_piece) == player:
-            return None
-
-        if self.is_water(target_row, target_col) and piece.lower() != 'r':
-            return None
-
-        if target_piece != ' ' and not self.can_capture_piece(piece, target_piece, (row, col), (target_row, target_col)):
-            return None
-
-        return target_row, target_col
+        return animal_rules.legal_move_destination(self.board, self.game_rule, row, col, drow, dcol)
 
     def has_legal_move(self, player):
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if not self.is_piece_of_player(piece, player):
-                    continue
-                for drow, dcol in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    if self.legal_move_destination(row, col, drow, dcol) is not None:
-                        return True
-        return False
+        return animal_rules.has_legal_move(self.board, player, self.game_rule)
 
     def calculate_game_result(self):
-        if self.board[RED_DEN[0]][RED_DEN[1]] != ' ' and self.piece_owner(self.board[RED_DEN[0]][RED_DEN[1]]) == 'w':
-            return {'type': 'win', 'winner': 'w', 'reason': '进入红色兽穴D9'}
-        if self.board[BLUE_DEN[0]][BLUE_DEN[1]] != ' ' and self.piece_owner(self.board[BLUE_DEN[0]][BLUE_DEN[1]]) == 'b':
-            return {'type': 'win', 'winner': 'b', 'reason': '进入蓝色兽穴D1'}
-        if self.current_movenum >= DRAW_MOVE_LIMIT:
-            return {'type': 'draw', 'winner': None, 'reason': '达到300步（150回合）'}
-        if not self.has_legal_move(self.current_player):
-            return {'type': 'win', 'winner': get_opp(self.current_player), 'reason': f"{self.player_name(self.current_player)}无子可动"}
-        return None
+        return animal_rules.calculate_game_result(self.board, self.current_player, self.current_movenum, self.game_rule)
 
     def update_game_result(self):
         self.game_result = self.calculate_game_result()
@@ -336,28 +324,10 @@ class Dandelion:
         return [row.copy() for row in source]
 
     def board_to_fen(self, board, player=None):
-        fen_rows = []
-        for row in board:
-            fen_row = []
-            empty = 0
-            for cell in row:
-                if cell == ' ':
-                    empty += 1
-                else:
-                    if empty > 0:
-                        fen_row.append(str(empty))
-                        empty = 0
-                    fen_row.append(cell)
-            if empty > 0:
-                fen_row.append(str(empty))
-            fen_rows.append(''.join(fen_row))
-        fen = '/'.join(fen_rows)
-        if player is not None:
-            fen += f' {player}'
-        return fen
+        return animal_rules.board_to_fen(board, player)
 
     def coord_to_movestr(self, row, col):
-        return f"{chr(col + ord('A'))}{ROWS - row}"
+        return animal_rules.coord_to_movestr(row, col)
 
     def move_notation(self, move):
         piece_name = PIECE_NAMES_CN.get(move.get('piece', ' ').lower(), '?')
@@ -376,6 +346,11 @@ class Dandelion:
         return f"{piece_name}{direction}"
 
     def reset_kifu_tree(self, board=None, player=None):
+        if self.review_pool is not None:
+            # 复盘结果按节点编号对应，新棋谱会重新编号
+            self.review_pool.cancel()
+            self.review_pool = None
+            self.review_progress = None
         start_board = self.copy_board(board)
         start_player = self.current_player if player is None else player
         self.kifu_next_id = 1
@@ -483,28 +458,33 @@ class Dandelion:
         self.view_node_id = node_id
         self.game_result = self.calculate_game_result()
 
-    def sync_engine_to_node(self, node_id, restart_analysis=True):
-        if node_id not in self.kifu_nodes:
-            return
+    def node_position_commands(self, node_id):
+        """从根局面重放到指定节点的命令，保留引擎的循环判定历史"""
         root = self.kifu_nodes[0]
-        self.try_send_command("stop")
-        self.try_send_command("setfen " + self.board_to_fen(root['board'], root['player']))
+        commands = ["setfen " + self.board_to_fen(root['board'], root['player'])]
         for move in self.get_move_path(node_id):
             color = self.gtp_color_for_player(move['player'])
             sr, sc = move['start']
             er, ec = move['end']
-            self.try_send_command(f"play {color} {self.coord_to_movestr(sr, sc)}")
-            self.try_send_command(f"play {color} {self.coord_to_movestr(er, ec)}")
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+            commands.append(f"play {color} {self.coord_to_movestr(sr, sc)}")
+            commands.append(f"play {color} {self.coord_to_movestr(er, ec)}")
+        return commands
+
+    def send_node_position(self, node_id):
+        self.try_send_command("stop")
+        for command in self.node_position_commands(node_id):
+            self.try_send_command(command)
+
+    def sync_engine_to_node(self, node_id, restart_analysis=True):
+        if node_id not in self.kifu_nodes:
+            return
+        self.send_node_position(node_id)
+        self.clear_analysis()
         result = self.update_game_result()
         if result:
             self.try_send_command("stop")
         elif restart_analysis and self.analyzing:
-            self.try_send_command(GTP_COMMAND_ANALYZE)
+            self.request_analysis()
 
     def activate_view_node_for_branch(self, restart_analysis=True):
         if self.is_viewing_current_node():
@@ -570,43 +550,7 @@ class Dandelion:
     def apply_fen(self, fen_str):
         """应用用户输入的FEN字符串"""
         try:
-            # 分割FEN组成部分
-            parts = fen_str.strip().split()
-            if len(parts) < 1:
-                raise ValueError("FEN不能为空")
-
-            # 解析棋盘部分
-            board_part = parts[0]
-            rows = board_part.split('/')
-            if len(rows) != ROWS:
-                raise ValueError(f"需要{ROWS}行，实际{len(rows)}行")
-
-            new_board = []
-            for row in rows:
-                fen_row = []
-                empty = 0
-                for char in row:
-                    if char.isdigit():
-                        empty = empty * 10 + int(char)
-                    else:
-                        if empty > 0:
-                            fen_row.extend([' '] * empty)
-                            empty = 0
-                        if char not in PIECES:
-                            raise ValueError(f"无效棋子字符: {char}")
-                        fen_row.append(char)
-                if empty > 0:
-                    fen_row.extend([' '] * empty)
-                if len(fen_row) != COLS:
-                    raise ValueError(f"行'{row}'列数错误，应有{COLS}列")
-                new_board.append(fen_row)
-
-            # 解析当前玩家（默认w）
-            current_player = 'w'
-            if len(parts) >= 2:
-                current_player = parts[1].lower()
-                if current_player not in ('w', 'b'):
-                    raise ValueError("当前玩家应为w或b")
+            new_board, current_player = animal_rules.parse_fen(fen_str)
 
             # 更新游戏状态
             with self.analysis_lock:
@@ -620,21 +564,34 @@ class Dandelion:
 
             # 同步到KataGo
             self.sync_board_assume_locked()
-            self.try_send_command(f"setfen {self.get_fen()}", enable_lock=False)
+            self.try_send_command(f"setfen {self.get_fen()}")
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
         except Exception as e:
             self.show_error(f"FEN应用失败: {str(e)}")
 
-    def __init__(self):
+    def __init__(self, engine_command=None, record_path=None, replay_path=None, replay_speed=1.0,
+                 store_path=ANALYSIS_STORE_PATH, compare_command=None, difficulty_profile_path=DIFFICULTY_PROFILE_PATH):
         self.mode = "main"  # "main" 或 "editor"
+        self.engine_command = engine_command or KATAGO_COMMAND
+        self.compare_command = compare_command or COMPARE_KATAGO_COMMAND
+        self.compare_engine = None  # 对比模式的第二个引擎，跟随主引擎的全部命令
+        self.compare_snapshot = EMPTY_SNAPSHOT
+        self.compare_agreement = {}  # 局面键 → 两个引擎最佳着法是否一致
+        self.record_path = record_path  # 录制GTP会话的文件
+        self.replay_path = replay_path  # 回放GTP会话的文件（代替KataGo）
+        self.replay_speed = replay_speed
+        self.gtp_recorder = None
+        self.engine_metrics = EngineMetrics()  # 由stderr与分析输出得到的性能指标
         self.last_analysis_time = 0  # 记录最后分析时间
         self.analysis_refresh_interval = 0.1  # 刷新间隔（秒）
         self.last_refresh_time = 0  # 记录最后刷新棋盘时间
+        self.frame_rate = 1 / REFRESH_INTERVAL_SECOND  # 实测帧率（指数平均），决定分析输出间隔
+        self.last_frame_time = time.time()
         # self.engine_ready = False  # 引擎是否已经在stderr里返回“GTP ready”
         pygame.init()
         
@@ -677,16 +634,39 @@ class Dandelion:
 
         # 分析系统
         self.analyzing = True
-        self.analysis_results = []
-        self.analysis_root_visits = 0
+        self.analysis_snapshot = EMPTY_SNAPSHOT  # 解析线程整体替换，读取时不加锁
+        self.analysis_key = None  # 引擎正在分析的局面的缓存键
+        # 分析纪元：每条 kata-analyze 带一个GTP编号，引擎以 =编号 确认后才接受新的分析行
+        self.analysis_request = (0, None, False)  # 最近发出的 (编号, 局面键, 候选是否完整)
+        self.live_stream = None  # 引擎已确认的 (编号, 局面键, 候选是否完整)，只由解析线程修改
+        self.analysis_requested_at = None  # 尚未发出的分析重启请求的时间（见 request_analysis）
+        self.convergence = ConvergenceMonitor()
+        self.analysis_converged = False  # 当前局面已收敛、引擎已停止，任意操作后继续
+        # 持久分析库按网络区分；回放录制时不写入，避免把旧会话的结果当成新分析
+        self.analysis_store = None
+        if store_path and not replay_path:
+            try:
+                self.analysis_store = AnalysisStore(store_path, engine_network_id(self.engine_command))
+            except sqlite3.Error as e:
+                print(f"无法打开分析库 {store_path}: {e}")
+        self.analysis_cache = AnalysisCache(store=self.analysis_store)
+        self.analysis_cache.preload()
         self.analysis_lock = threading.Lock()
+        self.outbound_ready = threading.Condition()
+        self.engine_ready = False  # 引擎输出 GTP ready 之前命令留在发送队列中
+        self.outbound_commands = deque()  # 待写入引擎stdin的命令
+        self.show_ownership = False  # 归属热力图，开启后分析命令附带 ownership true
+        self.ownership_overlay = None
+        self.ownership_overlay_array = None
+        self.ownership_overlay_params = None
         self.gtp_log = []  # GTP日志存储
         self.scroll_offset = 0  # 滚动条位置
         self.show_error_dialog = False
         self.error_message = ""
         self.aggressive_mode = 0  # 激进模式，0平衡，1黑激进，-1白激进
         self.current_movenum = 0  # 目前多少步了
-        self.movenum_limit = 300  # 步数限制(mm)
+        self.movenum_limit = 300  # 步数限制(mm)，相对于设置时的局面
+        self.movenum_limit_total = 300  # 从第0步算起的步数限制
         self.simple_mode = False  # 精简模式标志
         self.move_evaluation = None # To store the evaluation of the last move
         self.game_result = None
@@ -694,15 +674,41 @@ class Dandelion:
         self.human_ai_player = 'w'
         self.human_ai_difficulty_index = 2
         self.human_ai_ai_thinking = False
-        self.human_ai_ai_target_visits = HUMAN_AI_DIFFICULTIES[self.human_ai_difficulty_index][1]
+        self.difficulty_profile = load_difficulty_profile(difficulty_profile_path)
+        if self.difficulty_profile:
+            self.human_ai_difficulties = [(level['name'], int(level['visits'])) for level in self.difficulty_profile['levels']]
+        else:
+            self.human_ai_difficulties = HUMAN_AI_DIFFICULTIES
+        self.human_ai_difficulty_index = min(self.human_ai_difficulty_index, len(self.human_ai_difficulties) - 1)
+        self.human_ai_ai_target_visits = self.human_ai_difficulties[self.human_ai_difficulty_index][1]
         self.human_ai_root_visits = 0
         self.human_ai_display_visits = 0
+        self.human_ai_search_id = 0  # 每次AI开始搜索加一，用于丢弃过期的完成事件
+        self.human_ai_search_done_id = 0  # 已投递完成事件的搜索
+        self.human_ai_ponder = False  # 玩家思考时AI是否继续搜索当前局面
+        self.human_ai_pondering = False
+        self.human_ai_time_control_index = 0
+        self.human_ai_clock = None  # 计时对局中双方的剩余时间（不含当前这一步已用的时间）
+        self.human_ai_clock_player = None  # 正在计时的一方
+        self.human_ai_turn_started = 0
+        self.human_ai_search_started = 0
+        self.human_ai_search_deadline = None  # 计时对局中AI本步的最晚结束时间
+        self.gtp_ids = itertools.count(1)  # 分析纪元与 kata-raw-nn 请求共用的GTP编号
+        self.policy_request = None  # 正在等待的策略请求：{'search_id', 'ids', 'grids', 'legal', 'temperature'}
+        self.raw_nn_collecting = None  # 解析线程正在收集的多行响应：(编号, 行列表)
         self.human_ai_status = "请选择执棋方、难度和开局方式"
         self.human_ai_buttons = {}
         self.human_ai_game_over = False
         self.main_buttons = {}
         self.kifu_buttons = {}
         self.ui_status = ""
+        self.last_input_time = time.time()
+        self.idle_queue = None  # 本轮空闲待预分析的节点，None表示尚未开始
+        self.idle_node_id = None  # 引擎正在预分析的节点
+        self.idle_node_started = 0
+        self.review_pool = None
+        self.destination_pool = None  # 落点预分析的常驻引擎，第一次选子时启动
+        self.review_progress = None  # 复盘进度：{'total', 'done', 'started', 'elapsed'}
         self.reset_kifu_tree(self.board, self.current_player)
 
         # kata-set-rule scoring 0   狮虎不能跳过己方老鼠，河里和陆上的老鼠不能互吃
@@ -711,6 +717,8 @@ class Dandelion:
         # kata-set-rule scoring 3   狮虎能跳过己方老鼠，河里和陆上的老鼠能互吃
 
         self.game_rule = 0
+        self.game_drawrule = "WEIGHT"
+        self.game_looprule = "seventhree"
 
         # 初始化引擎
         self.start_katago()
@@ -812,24 +820,37 @@ class Dandelion:
     def start_katago(self):
         """启动KataGo进程"""
         try:
-            if maybe_first_start():
-                self.gtp_log.append(("warning", "引擎第一次启动需要5~10分钟，请耐心等待"))
-            self.katago_process = subprocess.Popen(
-                KATAGO_COMMAND.split(),
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                universal_newlines=True,
-                bufsize=1
-            )
+            if self.replay_path:
+                self.katago_process = ReplayProcess(self.replay_path, speed=self.replay_speed)
+                self.gtp_log.append(("warning", f"正在回放GTP录制：{self.replay_path}"))
+            else:
+                self.katago_process = subprocess.Popen(
+                    self.engine_command.split(),
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding='utf-8',
+                    errors='replace',
+                    universal_newlines=True,
+                    bufsize=1
+                )
+                if self.record_path:
+                    self.gtp_recorder = GtpTranscriptRecorder(self.record_path)
+                    self.katago_process = RecordingProcess(self.katago_process, self.gtp_recorder)
+            self.engine_metrics.start(self.engine_command)
+            self.output_queue = Queue()
+            threading.Thread(target=self.pump_output, daemon=True).start()
             threading.Thread(target=self.read_output, daemon=True).start()
             threading.Thread(target=self.read_stderr, daemon=True).start()
+            threading.Thread(target=self.write_commands, daemon=True).start()
+            if self.replay_path:
+                self.mark_engine_ready()  # 回放不读取命令，无需等待
+            else:
+                threading.Thread(target=self.watch_engine_startup, daemon=True).start()
             self.try_send_command(INITIAL_COMMANDS)
             if self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE)
+                self.start_analysis()
         except Exception as e:
             self.show_error(f"Failed to load Katago: {str(e)}")
 
@@ -838,7 +859,7 @@ class Dandelion:
         self.selected_piece = None
         self.current_player = 'w'
         self.last_move = None
-        self.analysis_results = []
+        self.clear_analysis()
         self.current_movenum = 0
         self.move_evaluation = None # 重置走法评估
         self.game_result = None
@@ -852,14 +873,14 @@ class Dandelion:
         if undo_once:
             next_player_should_be = self.current_player if self.selected_piece is not None else get_opp(
                 self.current_player)
-        self.analysis_results.clear()
+        self.clear_analysis()
         self.selected_piece = None
         self.current_player = next_player_should_be
         self.current_movenum = move_num_before_sync
 
         fen = self.get_fen(has_pla=False)
         fen = f"{fen} {next_player_should_be}"
-        self.try_send_command("setfen " + fen, enable_lock=False)
+        self.try_send_command("setfen " + fen)
 
     def swap_side(self):
         with self.analysis_lock:
@@ -868,26 +889,40 @@ class Dandelion:
             self.move_evaluation = None # 重置走法评估
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
+
+    def aggressive_commands(self):
+        komi, advantage = AGGRESSIVE_SETTINGS.get(self.aggressive_mode, AGGRESSIVE_SETTINGS[0])
+        return [f"komi {komi}", f"kata-set-param playoutDoublingAdvantage {advantage}"]
+
+    def engine_setup_commands(self):
+        """让辅助引擎与主引擎使用相同的规则与策略设置；步数限制随局面而定，见 move_limit_commands"""
+        return [
+            f"kata-set-rule scoring {self.game_rule}",
+            f"kata-set-rule drawjudge {self.game_drawrule}",
+            f"kata-set-rule looprule {self.game_looprule}",
+        ] + self.aggressive_commands()
+
+    def move_limit_commands(self, move_num):
+        """摆好第 move_num 步的局面后发送，使辅助引擎的判和步数与主引擎在该局面时一致"""
+        return [f"mm {self.remaining_moves(move_num)}", "mc 0"]
+
+    def send_move_limit(self, move_num):
+        """主引擎摆好其他节点的局面后，同样按该节点的步数重设判和步数"""
+        for command in self.move_limit_commands(move_num):
+            self.try_send_command(command)
 
     def set_aggressive_mode(self, ag_mode):
         with self.analysis_lock:
             self.aggressive_mode = ag_mode
-            if self.aggressive_mode == 0:
-                self.try_send_command("komi 0.0", enable_lock=False)
-                self.try_send_command("kata-set-param playoutDoublingAdvantage 0.0", enable_lock=False)
-            elif self.aggressive_mode == 1:
-                self.try_send_command("komi 9.0", enable_lock=False)
-                self.try_send_command("kata-set-param playoutDoublingAdvantage -1.5", enable_lock=False)
-            elif self.aggressive_mode == -1:
-                self.try_send_command("komi -9.0", enable_lock=False)
-                self.try_send_command("kata-set-param playoutDoublingAdvantage 1.5", enable_lock=False)
+            for command in self.aggressive_commands():
+                self.try_send_command(command)
             if self.game_result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
     def set_movelimit(self, movelimit):
         movelimit = movelimit - self.current_movenum
@@ -898,180 +933,588 @@ class Dandelion:
         with self.analysis_lock:
             self.sync_board_assume_locked()
             self.movenum_limit = movelimit
-            self.try_send_command(f"mm {movelimit}", enable_lock=False)
-            self.try_send_command("mc 0", enable_lock=False)
+            self.movenum_limit_total = movelimit + self.current_movenum
+            self.try_send_command(f"mm {movelimit}")
+            self.try_send_command("mc 0")
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
     def set_game_rule(self, rule):
         with self.analysis_lock:
             self.sync_board_assume_locked()
             self.game_rule = rule
-            self.try_send_command(f"kata-set-rule scoring {rule}", enable_lock=False)
+            self.try_send_command(f"kata-set-rule scoring {rule}")
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
     def set_game_drawrule(self, rule):
         with self.analysis_lock:
             self.sync_board_assume_locked()
             self.game_drawrule = rule
-            self.try_send_command(f"kata-set-rule drawjudge {rule}", enable_lock=False)
+            self.try_send_command(f"kata-set-rule drawjudge {rule}")
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
     def set_game_looprule(self, rule):
         with self.analysis_lock:
             self.sync_board_assume_locked()
             self.game_looprule = rule
-            self.try_send_command(f"kata-set-rule looprule {rule}", enable_lock=False)
+            self.try_send_command(f"kata-set-rule looprule {rule}")
             result = self.update_game_result()
             if result:
-                self.try_send_command("stop", enable_lock=False)
+                self.try_send_command("stop")
             elif self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                self.request_analysis()
 
     def read_stderr(self):
         while True:
             line = self.katago_process.stderr.readline()
             if not line:
                 break
+            self.engine_metrics.feed(line)
+            if self.engine_metrics.ready and not self.engine_ready:
+                self.mark_engine_ready()
+        if not self.engine_ready:
+            self.engine_metrics.stage = 'exited'
+            self.show_error(f"引擎在就绪前退出: {self.engine_metrics.last_line}")
+
+    def watch_engine_startup(self):
+        """没有等到 GTP ready 的兜底：引擎长时间没有输出时按已就绪处理，暂存的命令写进管道由引擎自行读取"""
+        while not self.engine_ready and self.engine_metrics.stage != 'exited':
+            if self.engine_metrics.startup_stalled():
+                self.engine_metrics.assume_ready()
+                message = f"引擎{ENGINE_READY_TIMEOUT:.0f}秒没有输出且未报告GTP ready，按已就绪开始发送命令"
+                print(message)
+                self.gtp_log.append(("warning", message))
+                self.ui_status = message
+                self.mark_engine_ready()
+                return
+            time.sleep(1.0)
 
-    def read_output(self):
+    def pump_output(self):
+        """只负责把引擎stdout按行搬进队列，解析由 read_output 完成"""
         while True:
             line = self.katago_process.stdout.readline()
+            self.output_queue.put(line)
             if not line:
                 break
 
-            line = line.strip()
-            if line.startswith("info"):
-                self.handle_analysis_line(line)
-            else:
+    def read_output(self):
+        """每次取出队列中已积压的全部行，非info行按顺序处理，info行只解析最新的一条；
+        最新一条 kata-analyze 被确认之前到达的info行属于已停止的搜索，不解析直接丢弃"""
+        while True:
+            batch = [self.output_queue.get()]
+            while True:
+                try:
+                    batch.append(self.output_queue.get_nowait())
+                except Empty:
+                    break
+
+            latest_info = None
+            finished = False
+            for line in batch:
+                if not line:
+                    finished = True
+                    break
+
+                line = line.strip()
+                if line.startswith("info"):
+                    stream = self.live_stream
+                    if self.replay_path or (stream is not None and stream[0] == self.analysis_request[0]):
+                        latest_info = line
+                    continue
+                if self.acknowledge_analysis(line):
+                    latest_info = None
+                elif self.collect_raw_nn_line(line):
+                    continue
+
                 with self.analysis_lock:
                     if "illegal" in line:
                         print("Detect illegal move, sync with the engine")
+                        latest_info = None
                         self.sync_board_assume_locked(undo_once=True)
                         result = self.update_game_result()
                         if result:
-                            self.try_send_command("stop", enable_lock=False)
+                            self.try_send_command("stop")
                         elif self.analyzing:
-                            self.try_send_command(GTP_COMMAND_ANALYZE, enable_lock=False)
+                            self.start_analysis()
 
                     self.gtp_log.append(('recv', line))
                     if len(self.gtp_log) > 100:
                         self.gtp_log.pop(0)
 
-    def handle_analysis_line(self, line):
-        if "rootInfo" in line:
-            root_match = re.search(r'rootInfo.*?\bvisits\s+(\d+)', line)
-            if root_match:
-                with self.analysis_lock:
-                    self.analysis_root_visits = int(root_match.group(1))
-                    if self.mode == "human_ai" and self.human_ai_ai_thinking:
-                        self.human_ai_root_visits = self.analysis_root_visits
-
-        if "info" in line and "visits" in line and "winrate" in line:
-            pattern = re.compile(
-                r'info move (\w+)'
-                r'.*?visits (\d+)'
-                r'.*?winrate ([-\d.]+(?:[eE][-+]?\d+)?)'
-                r'.*?scoreMean ([-\d.]+(?:[eE][-+]?\d+)?)'
-                r'.*?lcb ([-\d.]+(?:[eE][-+]?\d+)?)'
-                r'.*?order (\d+)'
-                r'.*?pv ([\w\s]+?)(?=\s*(?:info|rootInfo|ownership|ownershipStdev|$))',
-                re.DOTALL
-            )
-            with self.analysis_lock:
-                if time.time() - self.last_analysis_time >= self.analysis_refresh_interval:
-                    self.analysis_results.clear()
-                    self.last_analysis_time = time.time()
-
-                for match in pattern.finditer(line):
-                    move = match.group(1)
-                    visits = int(match.group(2))
-                    winrate = float(match.group(3)) * 100
-                    drawrate = float(match.group(4))
-                    lcb = float(match.group(5))
-                    order = int(match.group(6))
-                    pv = match.group(7)
-                    col, row = movestr_to_pos(move)
-                    if col is not None:
-                        try:
-                            exists = next((x for x in self.analysis_results if x['move'] == move), None)
-                            if exists:
-                                exists.update({
-                                    'move': move,
-                                    'col': col,
-                                    'row': row,
-                                    'visits': visits,
-                                    'winrate': winrate,
-                                    'drawrate': drawrate,
-                                    'lcb': lcb,
-                                    'order': order,
-                                    'pv': pv
-                                })
-                            else:
-                                self.analysis_results.append({
-                                    'move': move,
-                                    'col': col,
-                                    'row': row,
-                                    'visits': visits,
-                                    'winrate': winrate,
-                                    'drawrate': drawrate,
-                                    'lcb': lcb,
-                                    'order': order,
-                                    'pv': pv
-                                })
-                        except ValueError:
-                            continue
+            if latest_info is not None:
+                stream = self.live_stream
+                if stream is not None:
+                    self.handle_analysis_line(latest_info, stream[1], cacheable=stream[2])
+                else:
+                    # 回放时没有配对的确认，不能确定结果属于哪个局面，只显示不写入缓存
+                    self.handle_analysis_line(latest_info, self.analysis_key, cacheable=False)
+            if finished:
+                break
 
-                self.analysis_results.sort(key=lambda x: (-x['visits'], -x['winrate']))
+    def acknowledge_analysis(self, line):
+        """解析线程：收到最新一条 kata-analyze 的 =编号 后，之后的info行记在它的局面键下"""
+        request = self.analysis_request
+        if not request[0] or line.partition(" ")[0] != f"={request[0]}":
+            return False
+        self.live_stream = request
+        return True
 
-    def evaluate_move(self, analysis_data, user_move_coords, force=False):
-        """根据用户走法评估并设置 self.move_evaluation"""
-        self.move_evaluation = None
-        if not (self.analyzing or force) or not analysis_data:
+    def collect_raw_nn_line(self, line):
+        """解析线程：收集策略请求中各条 kata-raw-nn 的多行响应，全部收齐后投递事件；返回该行是否已被消费"""
+        request = self.policy_request
+        if request is None:
+            return False
+        if self.raw_nn_collecting is not None:
+            cmd_id, lines = self.raw_nn_collecting
+            if line:
+                lines.append(line)
+                return True
+            self.raw_nn_collecting = None
+            self.store_raw_nn_grid(request, cmd_id, parse_raw_policy(lines))
+            return True
+        head, _, rest = line.partition(" ")
+        if head[:1] not in ("=", "?") or not head[1:].isdigit() or int(head[1:]) not in request['ids']:
+            return False
+        if head[0] == "?":
+            self.store_raw_nn_grid(request, int(head[1:]), None)
+        else:
+            self.raw_nn_collecting = (int(head[1:]), [rest] if rest else [])
+        return True
+
+    def store_raw_nn_grid(self, request, cmd_id, grid):
+        request['grids'][cmd_id] = grid
+        if len(request['grids']) == len(request['ids']):
+            self.policy_request = None
+            pygame.event.post(pygame.event.Event(HUMAN_AI_POLICY_EVENT, request=request))
+
+    def clear_analysis(self):
+        """发布空快照，并清零人机对弈的访问数统计"""
+        self.analysis_snapshot = EMPTY_SNAPSHOT
+        self.human_ai_root_visits = 0
+        self.human_ai_display_visits = 0
+
+    def analysis_position_key(self, board=None, player=None, selected=None, move_num=None, history=None):
+        """分析缓存的键：局面、走棋方、选中的棋子、会影响引擎评估的规则设置、剩余步数以及循环判定用的历史摘要"""
+        if board is None:
+            board, player, selected = self.board, self.current_player, self.selected_piece
+            move_num, history = self.current_movenum, self.history_digest(self.current_node_id)
+        return (
+            self.board_to_fen(board, player),
+            selected,
+            self.game_rule,
+            self.game_drawrule,
+            self.game_looprule,
+            self.aggressive_mode,
+            self.remaining_moves(move_num),
+            history,
+        )
+
+    def node_analysis_key(self, node):
+        return self.analysis_position_key(node['board'], node['player'], None, node['move_num'], self.history_digest(node['id']))
+
+    def remaining_moves(self, move_num):
+        """引擎在第 move_num 步的局面还剩多少步判和（mm 的值）"""
+        return max(1, self.movenum_limit_total - move_num)
+
+    def history_digest(self, node_id):
+        """从该节点往前到最近一次吃子为止经过的局面的摘要，循环判定只看这段历史；按节点记忆"""
+        node = self.kifu_nodes.get(node_id)
+        if node is None:
+            return None
+        if 'history' not in node:
+            move = node['move']
+            prefix = "" if move is None or move.get('captured') else self.history_digest(node['parent'])
+            node['history'] = extend_history(prefix, self.board_to_fen(node['board'], node['player']))
+        return node['history']
+
+    def destination_key(self, target, board):
+        """当前选中的棋子走到 target 后（局面为 board）的缓存键"""
+        player = get_opp(self.current_player)
+        captured = self.board[target[0]][target[1]] != ' '
+        prefix = "" if captured else self.history_digest(self.current_node_id)
+        history = extend_history(prefix, self.board_to_fen(board, player))
+        return self.analysis_position_key(board, player, None, self.current_movenum + 1, history)
+
+    def analyze_command_for(self, purpose):
+        """purpose: view 主界面显示，background 后台预分析，ai_search AI思考，evaluation 评估玩家着法"""
+        if purpose == "ai_search":
+            # 只需要根节点访问数与最佳着法；计时对局还要次佳着法判断能否提前结束
+            return analyze_command(self.frame_rate, maxmoves=1 if self.human_ai_search_deadline is None else 2)
+        if purpose == "evaluation":
+            return analyze_command(self.frame_rate)
+        if purpose == "ponder":
+            # 预想只为积累搜索树，界面只显示访问数
+            return analyze_command(maxmoves=1, interval=ANALYZE_MAX_INTERVAL)
+        if purpose == "background":
+            return analyze_command()
+        maxmoves = ANALYSIS_PANEL_MOVES if self.simple_mode and self.selected_piece is None else None
+        return analyze_command(self.frame_rate, maxmoves=maxmoves, ownership=self.show_ownership)
+
+    def start_analysis(self, purpose="view"):
+        """让引擎开始分析当前局面，之后收到的分析结果记在该局面的缓存键下"""
+        self.send_analyze(self.analyze_command_for(purpose), self.analysis_position_key())
+
+    def request_analysis(self):
+        """主界面局面或设置改变后调用：不立即重启搜索，由 flush_analysis_request 在输入停顿后统一发出一次"""
+        self.analysis_requested_at = time.time()
+
+    def flush_analysis_request(self):
+        """主循环每帧调用：距最后一次请求超过 ANALYSIS_DEBOUNCE_SECONDS 时开始分析当时的局面"""
+        requested = self.analysis_requested_at
+        if requested is None or time.time() - requested < ANALYSIS_DEBOUNCE_SECONDS:
+            return
+        self.analysis_requested_at = None
+        if self.mode == "main" and self.analyzing and not self.game_result and self.idle_node_id is None:
+            self.start_analysis()
+
+    def send_analyze(self, command, key):
+        """发出带新纪元编号的 kata-analyze；编号与局面键一起替换，解析线程不会拿到不配对的两者。
+        带 maxmoves 的搜索（AI思考、预想、精简模式）只有部分候选，结果不写入缓存，以免挡住完整的分析"""
+        epoch = next(self.gtp_ids)
+        self.analysis_key = key
+        self.analysis_request = (epoch, key, "maxmoves" not in command)
+        self.try_send_command(f"{epoch} {command}")
+
+    def toggle_compare(self):
+        if self.compare_engine is not None:
+            engine, self.compare_engine = self.compare_engine, None
+            engine.close()
+            self.compare_snapshot = EMPTY_SNAPSHOT
+            self.ui_status = "双引擎对比已关闭"
+            return
+        try:
+            engine = MirrorEngine(self.compare_command, self.handle_compare_line)
+        except OSError as e:
+            self.show_error(f"无法启动对比引擎: {e}")
+            return
+        self.compare_snapshot = EMPTY_SNAPSHOT
+        self.compare_agreement = {}
+        # 先让第二个引擎赶上当前规则、局面与选子，之后由 try_send_command 同步转发
+        with self.analysis_lock:
+            commands = (self.engine_setup_commands() + self.node_position_commands(self.current_node_id)
+                        + self.move_limit_commands(self.current_movenum))
+            if self.selected_piece is not None:
+                row, col = self.selected_piece
+                commands.append(f"play {self.gtp_color_for_player(self.current_player)} {self.coord_to_movestr(row, col)}")
+            for command in commands:
+                engine.send(command)
+            self.compare_engine = engine
+            epoch = self.analysis_request[0]
+            if self.analyzing and not self.game_result and epoch:
+                # 沿用主引擎当前的编号，两边的分析行记在同一局面键下
+                engine.send(f"{epoch} {self.analyze_command_for('view')}")
+        self.ui_status = f"对比引擎: {engine_network_id(self.compare_command)}"
+
+    def handle_compare_line(self, line, epoch):
+        """对比引擎的解析线程：确认了最新一条 kata-analyze 后的结果才与主引擎记在同一局面键下"""
+        engine = self.compare_engine
+        request_epoch, key = self.analysis_request[:2]
+        if engine is None or not request_epoch or epoch != request_epoch:
             return
+        previous = self.compare_snapshot
+        snapshot = build_snapshot(previous, line, key=key)
+        self.compare_snapshot = snapshot
+        if snapshot.root_visits != previous.root_visits:
+            engine.metrics.record_root_visits(snapshot.root_visits)
+        main = self.analysis_snapshot
+        if main.key == key and min(snapshot_depth(main), snapshot_depth(snapshot)) >= COMPARE_MIN_VISITS:
+            best_a, best_b = best_result(main.results), best_result(snapshot.results)
+            if best_a and best_b:
+                self.compare_agreement[key] = best_a['move'] == best_b['move']
+                if len(self.compare_agreement) > COMPARE_AGREEMENT_SIZE:
+                    del self.compare_agreement[next(iter(self.compare_agreement))]
+
+    def toggle_ownership(self):
+        if np is None:
+            self.ui_status = "归属热力图需要安装numpy"
+            return
+        self.show_ownership = not self.show_ownership
+        if self.analyzing and not self.game_result and self.idle_node_id is None:
+            self.start_analysis()
 
-        best_move = analysis_data[0]
-        best_win_rate = best_move['winrate']
+    def idle_candidate_nodes(self):
+        """查看节点附近值得预分析的节点：查看节点本身、主线后续几步、父节点和兄弟节点"""
+        view_id = self.view_node_id if self.view_node_id in self.kifu_nodes else self.current_node_id
+        line_ids = self.displayed_line_ids()
+        following = []
+        if view_id in line_ids:
+            index = line_ids.index(view_id)
+            following = line_ids[index + 1:index + 1 + IDLE_PREANALYSIS_PLIES]
+        parent_id = self.kifu_nodes[view_id]['parent']
+        siblings = self.kifu_nodes[parent_id]['children'] if parent_id is not None else []
+        candidates = [view_id] + following + ([parent_id] if parent_id is not None else []) + siblings
+
+        live_key = self.analysis_position_key()
+        queue = []
+        for node_id in candidates:
+            if node_id in queue:
+                continue
+            node = self.kifu_nodes[node_id]
+            key = self.node_analysis_key(node)
+            if key == live_key or self.analysis_cache.depth(key) >= IDLE_PREANALYSIS_VISITS:
+                continue
+            if animal_rules.calculate_game_result(node['board'], node['player'], node['move_num'], self.game_rule):
+                continue
+            queue.append(node_id)
+        return queue
 
-        user_move_result = next((m for m in analysis_data if m['row'] == user_move_coords[0] and m['col'] == user_move_coords[1]), None)
+    def update_idle_preanalysis(self):
+        """主循环每帧调用：空闲时按队列逐个预分析邻近节点，全部完成后回到当前局面"""
+        if not self.engine_ready:
+            return
+        if self.idle_node_id is not None:
+            node = self.kifu_nodes.get(self.idle_node_id)
+            last_progress = max(self.idle_node_started, self.analysis_snapshot.created)
+            if (node is not None and time.time() - last_progress < IDLE_STALL_SECONDS
+                    and self.analysis_cache.depth(self.node_analysis_key(node)) < IDLE_PREANALYSIS_VISITS):
+                return
+            self.idle_node_id = None
+            if not self.idle_queue:
+                self.restore_foreground_analysis()
+                return
+        elif self.idle_queue is None:
+            if (self.mode != "main" or not self.analyzing or self.show_error_dialog or self.analysis_converged
+                    or self.selected_piece is not None
+                    or time.time() - self.last_input_time < IDLE_PREANALYSIS_DELAY):
+                return
+            if not self.game_result and self.analysis_cache.depth(self.analysis_position_key()) < IDLE_FOREGROUND_VISITS:
+                return
+            self.idle_queue = self.idle_candidate_nodes()
+            if not self.idle_queue:
+                return
+            self.try_send_command(f"kata-set-param maxVisits {IDLE_PREANALYSIS_VISITS}")
+        else:
+            return  # 本轮空闲的队列已处理完，等待下一次操作
+
+        node_id = self.idle_queue.pop(0)
+        self.idle_node_id = node_id
+        self.idle_node_started = time.time()
+        node = self.kifu_nodes[node_id]
+        self.send_node_position(node_id)
+        self.send_move_limit(node['move_num'])
+        self.send_analyze(self.analyze_command_for("background"), self.node_analysis_key(node))
+        self.ui_status = f"空闲预分析中，剩余 {len(self.idle_queue) + 1} 个局面"
+
+    def restore_foreground_analysis(self):
+        """结束预分析，把引擎恢复到当前局面继续前台分析"""
+        self.idle_node_id = None
+        self.ui_status = ""
+        self.try_send_command(f"kata-set-param maxVisits {NORMAL_MAX_VISITS}")
+        node = self.kifu_nodes.get(self.current_node_id)
+        if node and node['board'] == self.board and node['player'] == self.current_player:
+            self.sync_engine_to_node(self.current_node_id, restart_analysis=False)
+            self.send_move_limit(node['move_num'])  # 预分析时改成了邻近节点的步数限制
+            if self.analyzing and not self.game_result:
+                self.request_analysis()
+            return
+        with self.analysis_lock:
+            self.sync_board_assume_locked()
+            self.send_move_limit(self.current_movenum)
+            if self.update_game_result():
+                self.try_send_command("stop")
+            elif self.analyzing:
+                self.start_analysis()
 
-        if user_move_result is None:
+    def update_convergence(self):
+        """主循环每帧调用：前台分析收敛后停止引擎，省电并把算力让给其他任务"""
+        if (self.analysis_converged or self.mode != "main" or not self.analyzing or self.game_result
+                or self.idle_node_id is not None or self.analysis_requested_at is not None):
             return
+        snapshot = self.analysis_snapshot
+        if snapshot.key != self.analysis_key or self.analysis_key != self.analysis_position_key():
+            return
+        if not self.convergence.update(snapshot):
+            return
+        self.analysis_converged = True
+        self.try_send_command("stop")
+        self.stop_destination_analysis()
+        self.ui_status = f"分析已收敛（{snapshot_depth(snapshot)} visits），任意操作继续"
 
-        user_move_win_rate = user_move_result['winrate']
-        win_rate_drop = best_win_rate - user_move_win_rate
+    def resume_converged_analysis(self):
+        self.analysis_converged = False
+        self.convergence.reset()
+        self.ui_status = ""
+        self.request_analysis()
+
+    def note_user_input(self):
+        """有键盘或鼠标操作：立即让出预分析占用的引擎，已收敛的分析继续"""
+        self.last_input_time = time.time()
+        if self.analysis_converged:
+            self.resume_converged_analysis()
+        if self.idle_node_id is not None:
+            self.restore_foreground_analysis()
+        self.idle_queue = None
+
+    def current_analysis(self):
+        """当前局面的分析：实时结果与缓存中较深的一个"""
+        key = self.analysis_position_key()
+        live = self.analysis_snapshot
+        cached = self.analysis_cache.get(key)
+        if live.key == key and live.results:
+            # 精简模式下缓存的候选较少，实时结果候选更全时也优先显示实时结果
+            if (cached is None or snapshot_depth(live) >= snapshot_depth(cached)
+                    or len(live.results) > len(cached.results)):
+                return live
+        return cached if cached is not None else EMPTY_SNAPSHOT
+
+    def node_analysis(self, node):
+        return self.analysis_cache.get(self.node_analysis_key(node)) or EMPTY_SNAPSHOT
+
+    def handle_analysis_line(self, line, key, cacheable=True):
+        previous = self.analysis_snapshot
+        now = time.time()
+        merge = now - self.last_analysis_time < self.analysis_refresh_interval
+        snapshot = build_snapshot(previous, line, merge=merge, key=key)
+        if snapshot.results is not previous.results and not merge:
+            self.last_analysis_time = now
+        self.analysis_snapshot = snapshot
+        if cacheable:
+            self.analysis_cache.offer(key, snapshot)
+        if snapshot.root_visits != previous.root_visits:
+            self.engine_metrics.record_root_visits(snapshot.root_visits)
+
+        if self.mode == "human_ai" and self.human_ai_ai_thinking:
+            self.check_human_ai_search(snapshot)
+
+    def check_human_ai_search(self, snapshot):
+        """在解析线程中更新AI搜索进度，达到目标访问数时投递一次完成事件"""
+        search_id = self.human_ai_search_id
+        if snapshot.key != self.analysis_key or search_id == self.human_ai_search_done_id:
+            return
+        self.human_ai_root_visits = snapshot.root_visits
+        progress = snapshot_depth(snapshot)
+        self.human_ai_display_visits = progress
+        done = progress >= self.human_ai_ai_target_visits
+        if not done and self.human_ai_search_deadline is not None:
+            done = time.time() >= self.human_ai_search_deadline or self.human_ai_search_settled(snapshot, progress)
+        if not done or not snapshot.results:
+            return
+        self.human_ai_search_done_id = search_id
+        pygame.event.post(pygame.event.Event(HUMAN_AI_SEARCH_DONE_EVENT, search_id=search_id, snapshot=snapshot))
+
+    def human_ai_search_settled(self, snapshot, progress):
+        """按目前的速度，次佳着法在剩余预算内已追不上最佳着法时提前结束"""
+        now = time.time()
+        started, deadline = self.human_ai_search_started, self.human_ai_search_deadline
+        elapsed = now - started
+        if elapsed < (deadline - started) * HUMAN_AI_MIN_SEARCH_FRACTION:
+            return False
+        if len(snapshot.results) < 2:
+            return True  # 只有一个可走的着法
+        best, second = snapshot.results[0], snapshot.results[1]
+        rate = progress / elapsed if elapsed > 0 else 0.0
+        remaining_visits = min(rate * (deadline - now), self.human_ai_ai_target_visits - progress)
+        return best['visits'] - second['visits'] > remaining_visits
+
+    def evaluate_move(self, analysis_data, user_move_coords, force=False, destination_winrates=None):
+        """根据用户走法评估并设置 self.move_evaluation；destination_winrates 为落点预分析得到的各落点胜率"""
+        self.move_evaluation = None
+        if not (self.analyzing or force):
+            return
 
-        if user_move_result['move'] == best_move['move']:
-            if len(analysis_data) > 1:
-                second_best_win_rate = analysis_data[1]['winrate']
-                criticality = best_win_rate - second_best_win_rate
-                
-                if criticality > 15:
-                    self.move_evaluation = {'image_key': 'nice', 'text': "关键的一步棋。"}
-                    return
-                elif 10 < criticality <= 15:
-                    self.move_evaluation = {'image_key': 'brilliant', 'text': "太棒了！"}
-                    return
-        
-        if win_rate_drop <= 3:
-            self.move_evaluation = {'image_key': 'best', 'text': "精准的着法。"}
-        elif 3 <= win_rate_drop < 8:
-            self.move_evaluation = {'image_key': 'ok', 'text': "很好。"}
-        elif 8 <= win_rate_drop < 20:
-            self.move_evaluation = {'image_key': 'mistake', 'text': "还有更好的走法。"}
-        elif win_rate_drop >= 20:
-            self.move_evaluation = {'image_key': 'blunder', 'text': "恶手。"}
+        user_move_result = next((m for m in analysis_data if m['row'] == user_move_coords[0] and m['col'] == user_move_coords[1]), None)
+        if (destination_winrates and user_move_coords in destination_winrates
+                and (user_move_result is None or user_move_result['visits'] < DESTINATION_VISITS)):
+            # 选点列表里没有这一步或访问数太少，改用选子时预分析的全部落点
+            ranked = sorted(destination_winrates.values(), reverse=True)
+            played_win_rate = destination_winrates[user_move_coords]
+            second_win_rate = ranked[1] if len(ranked) > 1 else None
+            image_key = classify_move(ranked[0], played_win_rate, played_win_rate >= ranked[0], second_win_rate)
+            self.move_evaluation = {'image_key': image_key, 'text': MOVE_CLASSES[image_key]}
+            return
+
+        if not analysis_data or user_move_result is None:
+            return
+
+        best_move = analysis_data[0]
+        best_win_rate = best_move['winrate']
+        is_best = user_move_result['move'] == best_move['move']
+        second_win_rate = analysis_data[1]['winrate'] if len(analysis_data) > 1 else None
+        image_key = classify_move(best_win_rate, user_move_result['winrate'], is_best, second_win_rate)
+        self.move_evaluation = {'image_key': image_key, 'text': MOVE_CLASSES[image_key]}
+
+    def destination_positions(self, row, col):
+        """选中棋子的每个落点走完后的局面：{落点: (局面, 该步后对局结果)}"""
+        positions = {}
+        for target in animal_rules.piece_destinations(self.board, self.game_rule, row, col):
+            board = self.copy_board()
+            board[target[0]][target[1]], board[row][col] = board[row][col], ' '
+            result = animal_rules.calculate_game_result(board, get_opp(self.current_player), self.current_movenum + 1, self.game_rule)
+            positions[target] = (board, result)
+        return positions
+
+    def start_destination_analysis(self, row, col):
+        """选子时把每个落点走完后的局面交给后台引擎并行分析，结果记入分析缓存；复盘占用引擎时不启动"""
+        node = self.kifu_nodes.get(self.current_node_id)
+        if self.replay_path or not node or node['board'] != self.board or node['player'] != self.current_player:
+            return
+        if self.review_pool is not None:
+            return
+        if self.destination_pool is None:
+            self.destination_pool = EnginePool(self.engine_command, DESTINATION_ENGINES)
+            self.destination_pool.serve(
+                self.run_destination_task,
+                lambda task, snapshot: self.analysis_cache.offer(task[0], snapshot),
+                on_error=self.destination_task_failed,
+            )
+        self.destination_pool.discard_pending()
+        color = self.gtp_color_for_player(self.current_player)
+        setup = self.engine_setup_commands()
+        base = self.node_position_commands(self.current_node_id)
+        limits = self.move_limit_commands(self.current_movenum + 1)
+        for target, (board, result) in self.destination_positions(row, col).items():
+            key = self.destination_key(target, board)
+            if result or self.analysis_cache.depth(key) >= DESTINATION_VISITS:
+                continue
+            moves = [f"play {color} {self.coord_to_movestr(row, col)}", f"play {color} {self.coord_to_movestr(*target)}"]
+            self.destination_pool.submit((key, setup, base + moves, limits))
+
+    def stop_destination_analysis(self):
+        """分析暂停、收敛或开始复盘时关闭落点预分析的引擎，下次选子再启动"""
+        if self.destination_pool is not None:
+            self.destination_pool.cancel()
+            self.destination_pool = None
+
+    def run_destination_task(self, engine, task):
+        """常驻引擎上一次摆的局面多半与本次只差最后一步，只悔掉不同的着法再补上"""
+        key, setup, position, limits = task
+        engine.configure(setup)
+        engine.set_position(position)
+        for command in limits:
+            engine.command(command)
+        return engine.analyze(DESTINATION_VISITS, key)
+
+    def destination_task_failed(self, error, task):
+        """后台预分析出错不打断操作：只在状态栏提示，该落点落子时没有预先的评价"""
+        self.ui_status = f"落点预分析出错: {error}"
+
+    def destination_winrates(self, row, col):
+        """落子前调用：全部落点都已预分析（或该步直接分出胜负）时返回 {落点: 走棋方胜率}，否则返回None"""
+        player = self.current_player
+        winrates = {}
+        for target, (board, result) in self.destination_positions(row, col).items():
+            if result:
+                if result.get('type') == 'draw':
+                    winrates[target] = 50.0
+                else:
+                    winrates[target] = 100.0 if result.get('winner') == player else 0.0
+                continue
+            snapshot = self.analysis_cache.get(self.destination_key(target, board))
+            if snapshot is None or snapshot_depth(snapshot) < DESTINATION_VISITS or not snapshot.results:
+                return None
+            winrates[target] = 100.0 - best_result(snapshot.results)['winrate']  # 子局面的胜率是对手视角
+        return winrates
 
     def get_best_analysis_pv(self, analysis_data):
         if not analysis_data:
@@ -1126,17 +1569,13 @@ class Dandelion:
         self.try_send_command(f"play {color} {start_move_str}")
         self.try_send_command(f"play {color} {end_move_str}")
 
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.clear_analysis()
 
         result = self.update_game_result()
         if result:
             self.try_send_command("stop")
         elif self.analyzing:
-            self.try_send_command(GTP_COMMAND_ANALYZE)
+            self.request_analysis()
         return True
 
     def play_best_analysis_move(self, analysis_data, source="quick"):
@@ -1162,6 +1601,17 @@ class Dandelion:
         pygame.draw.rect(self.screen, (240, 240, 240), (0, 0, self.announce_width, self.screen_height))
         # 绘制棋盘
         self.screen.blit(self.board_img, (self.announce_width, 0))
+        if viewing_current:
+            snapshot, selected = self.current_analysis(), self.selected_piece
+        else:
+            snapshot, selected = self.node_analysis(display_node), None
+        results = snapshot.results
+        if self.show_ownership:
+            # 缓存中更深的快照可能没有归属度，优先用引擎正在输出的
+            live = self.analysis_snapshot
+            ownership = live.ownership if viewing_current and live.key == snapshot.key else snapshot.ownership
+            if ownership is not None:
+                self.screen.blit(self.ownership_surface(ownership, display_node['player']), (self.announce_width, 0))
         
         # 绘制最后一步移动指示
         if display_last_move:
@@ -1200,95 +1650,86 @@ class Dandelion:
                     ))
                     self.screen.blit(img, rect)
 
-        if viewing_current:
-            with self.analysis_lock:
-            # 精简模式只绘制最佳走法的箭头
-                if self.simple_mode:
-                    if self.analysis_results is not None and len(self.analysis_results) >= 1:
-                        best_move = None
-                        for result in self.analysis_results:
-                            if result['order'] == 0:
-                                best_move = result
-                                break
-                        if best_move is None:
-                            best_move = self.analysis_results[0]
+        # 精简模式只绘制最佳走法的箭头
+        if self.simple_mode:
+            if results:
+                best_move = best_result(results)
+                col1, row1, col2, row2 = None, None, None, None
+                if selected is None:
+                    col1, row1 = best_move['col'], best_move['row']
+                    pvs = best_move['pv'].split()
+                    if len(pvs) > 1:
+                        col2, row2 = movestr_to_pos(pvs[1])
+                else:
+                    row1, col1 = selected
+                    col2, row2 = best_move['col'], best_move['row']
+                if col1 is not None and col2 is not None:
+                    flip_row1, flip_col1 = self.flip_coord(row1, col1)
+                    flip_row2, flip_col2 = self.flip_coord(row2, col2)
+
+                    x1 = self.announce_width + flip_col1 * self.tile_size + self.tile_size // 2
+                    x2 = self.announce_width + flip_col2 * self.tile_size + self.tile_size // 2
+                    y1 = flip_row1 * self.tile_size + self.tile_size // 2
+                    y2 = flip_row2 * self.tile_size + self.tile_size // 2
+                    dx, dy = x2 - x1, y2 - y1
+                    dis = (dx * dx + dy * dy) ** 0.5
+                    if dis > self.tile_size // 2:
+                        x1 += 0.5 * self.tile_size * dx / dis
+                        y1 += 0.5 * self.tile_size * dy / dis
+                        draw_arrow2(self.screen, (x1, y1), (x2, y2),
+                                    self.tile_size * 0.15,
+                                    self.tile_size * 0.03,
+                                    self.tile_size * 0.3)
+        else:
+            if results:
+                maxVisit = float(max([x['visits'] for x in results]))
+                assert (maxVisit >= 1)
+                for result in results:
+                    row, col = result['row'], result['col']
+                    flip_row, flip_col = self.flip_coord(row, col)
+                    v, is_best_move = result['visits'], result['order'] == 0
+                    assert (0 <= flip_row < ROWS and 0 <= flip_col < COLS)
+                    alpha_surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
+                    c = float(v) / maxVisit
+                    spot_alpha = 255 if is_best_move else 255 * (0.4 * c + 0.3)
+                    spot_color = (255 * (1 - c), 255 * (0.5 + 0.5 * c), 255 * c, spot_alpha)
+                    text_bg_color = (spot_color[0], spot_color[1], spot_color[2], 100)
+                    text_color = (0, 0, 0, 255)
+
+                    if is_best_move:
+                        pygame.draw.circle(alpha_surface, (255, 0, 0, 255), (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.5)
+                        pygame.draw.circle(alpha_surface, spot_color, (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.45)
+                    else:
+                        pygame.draw.circle(alpha_surface, spot_color, (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.5)
+                    pygame.draw.circle(alpha_surface, (0, 0, 0, 0), (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.4)
+                    self.screen.blit(alpha_surface, (self.announce_width + flip_col * self.tile_size, flip_row * self.tile_size))
+
+                    self.draw_text(f"{result['winrate']:.1f}%", (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.31), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.35 * self.tile_size, bold=True)
+                    vstr = f"{v // 1000000}M" if v >= 10000000 else (f"{v // 1000}K" if v >= 10000 else f"{v}")
+                    self.draw_text(vstr, (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.6), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.25 * self.tile_size, bold=True)
+                    self.draw_text(f"{result['drawrate']:.1f}%", (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.8), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.25 * self.tile_size, bold=True)
 
+                    if is_best_move:
                         col1, row1, col2, row2 = None, None, None, None
-                        if self.selected_piece is None:
-                            col1, row1 = best_move['col'], best_move['row']
-                            pvs = best_move['pv'].split()
+                        if selected is None:
+                            col1, row1 = col, row
+                            pvs = result['pv'].split()
                             if len(pvs) > 1:
                                 col2, row2 = movestr_to_pos(pvs[1])
                         else:
-                            row1, col1 = self.selected_piece
-                            col2, row2 = best_move['col'], best_move['row']
+                            row1, col1 = selected
+                            col2, row2 = col, row
                         if col1 is not None and col2 is not None:
                             flip_row1, flip_col1 = self.flip_coord(row1, col1)
                             flip_row2, flip_col2 = self.flip_coord(row2, col2)
-
-                            x1 = self.announce_width + flip_col1 * self.tile_size + self.tile_size // 2
-                            x2 = self.announce_width + flip_col2 * self.tile_size + self.tile_size // 2
-                            y1 = flip_row1 * self.tile_size + self.tile_size // 2
-                            y2 = flip_row2 * self.tile_size + self.tile_size // 2
+                            x1, x2 = self.announce_width + flip_col1 * self.tile_size + self.tile_size // 2, self.announce_width + flip_col2 * self.tile_size + self.tile_size // 2
+                            y1, y2 = flip_row1 * self.tile_size + self.tile_size // 2, flip_row2 * self.tile_size + self.tile_size // 2
                             dx, dy = x2 - x1, y2 - y1
                             dis = (dx * dx + dy * dy) ** 0.5
                             if dis > self.tile_size // 2:
                                 x1 += 0.5 * self.tile_size * dx / dis
                                 y1 += 0.5 * self.tile_size * dy / dis
-                                draw_arrow2(self.screen, (x1, y1), (x2, y2),
-                                            self.tile_size * 0.15,
-                                            self.tile_size * 0.03,
-                                            self.tile_size * 0.3)
-                else:
-                    if self.analysis_results is not None and len(self.analysis_results) >= 1:
-                        maxVisit = float(max([x['visits'] for x in self.analysis_results]))
-                        assert (maxVisit >= 1)
-                        for result in self.analysis_results:
-                            row, col = result['row'], result['col']
-                            flip_row, flip_col = self.flip_coord(row, col)
-                            v, is_best_move = result['visits'], result['order'] == 0
-                            assert (0 <= flip_row < ROWS and 0 <= flip_col < COLS)
-                            alpha_surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
-                            c = float(v) / maxVisit
-                            spot_alpha = 255 if is_best_move else 255 * (0.4 * c + 0.3)
-                            spot_color = (255 * (1 - c), 255 * (0.5 + 0.5 * c), 255 * c, spot_alpha)
-                            text_bg_color = (spot_color[0], spot_color[1], spot_color[2], 100)
-                            text_color = (0, 0, 0, 255)
-
-                            if is_best_move:
-                                pygame.draw.circle(alpha_surface, (255, 0, 0, 255), (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.5)
-                                pygame.draw.circle(alpha_surface, spot_color, (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.45)
-                            else:
-                                pygame.draw.circle(alpha_surface, spot_color, (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.5)
-                            pygame.draw.circle(alpha_surface, (0, 0, 0, 0), (self.tile_size // 2, self.tile_size // 2), self.tile_size * 0.4)
-                            self.screen.blit(alpha_surface, (self.announce_width + flip_col * self.tile_size, flip_row * self.tile_size))
-
-                            self.draw_text(f"{result['winrate']:.1f}%", (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.31), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.35 * self.tile_size, bold=True)
-                            vstr = f"{v // 1000000}M" if v >= 10000000 else (f"{v // 1000}K" if v >= 10000 else f"{v}")
-                            self.draw_text(vstr, (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.6), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.25 * self.tile_size, bold=True)
-                            self.draw_text(f"{result['drawrate']:.1f}%", (self.announce_width + flip_col * self.tile_size + self.tile_size * 0.5, flip_row * self.tile_size + self.tile_size * 0.8), anchor='center', color=text_color, bg_color=text_bg_color, font_size=0.25 * self.tile_size, bold=True)
-
-                            if is_best_move:
-                                col1, row1, col2, row2 = None, None, None, None
-                                if self.selected_piece is None:
-                                    col1, row1 = col, row
-                                    pvs = result['pv'].split()
-                                    if len(pvs) > 1:
-                                        col2, row2 = movestr_to_pos(pvs[1])
-                                else:
-                                    row1, col1 = self.selected_piece
-                                    col2, row2 = col, row
-                                if col1 is not None and col2 is not None:
-                                    flip_row1, flip_col1 = self.flip_coord(row1, col1)
-                                    flip_row2, flip_col2 = self.flip_coord(row2, col2)
-                                    x1, x2 = self.announce_width + flip_col1 * self.tile_size + self.tile_size // 2, self.announce_width + flip_col2 * self.tile_size + self.tile_size // 2
-                                    y1, y2 = flip_row1 * self.tile_size + self.tile_size // 2, flip_row2 * self.tile_size + self.tile_size // 2
-                                    dx, dy = x2 - x1, y2 - y1
-                                    dis = (dx * dx + dy * dy) ** 0.5
-                                    if dis > self.tile_size // 2:
-                                        x1 += 0.5 * self.tile_size * dx / dis
-                                        y1 += 0.5 * self.tile_size * dy / dis
-                                        draw_arrow2(self.screen, (x1, y1), (x2, y2), self.tile_size * 0.15, self.tile_size * 0.03, self.tile_size * 0.3)
+                                draw_arrow2(self.screen, (x1, y1), (x2, y2), self.tile_size * 0.15, self.tile_size * 0.03, self.tile_size * 0.3)
 
         self.draw_analysis_panel()
         self.draw_gtp_console()
@@ -1297,6 +1738,29 @@ class Dandelion:
         if self.show_error_dialog:
             self.draw_error_dialog()
 
+    def ownership_surface(self, ownership, player):
+        """把归属度数组渲染成覆盖棋盘的热力图（蓝方区域偏蓝，红方区域偏红），数组不变时复用"""
+        params = (player, self.flip_board, self.tile_size)
+        if self.ownership_overlay_array is ownership and self.ownership_overlay_params == params:
+            return self.ownership_overlay
+        blue = ownership if player == 'w' else -ownership
+        if self.flip_board:
+            blue = blue[::-1, ::-1]
+        grid = blue.T  # surfarray 按 (x, y) 索引
+        cells = pygame.Surface((COLS, ROWS), pygame.SRCALPHA)
+        rgb = pygame.surfarray.pixels3d(cells)
+        rgb[..., 0] = np.where(grid < 0, 220, 0)
+        rgb[..., 1] = 40
+        rgb[..., 2] = np.where(grid > 0, 255, 0)
+        del rgb
+        alpha = pygame.surfarray.pixels_alpha(cells)
+        alpha[...] = (np.clip(np.abs(grid), 0, 1) * OWNERSHIP_MAX_ALPHA).astype(np.uint8)
+        del alpha
+        self.ownership_overlay = pygame.transform.smoothscale(cells, (self.board_width, self.board_height))
+        self.ownership_overlay_array = ownership
+        self.ownership_overlay_params = params
+        return self.ownership_overlay
+
     def draw_panel_button(self, registry, key, text, rect, selected=False, disabled=False, font_size=16):
         registry[key] = {'rect': rect, 'disabled': disabled}
         if disabled:
@@ -1343,6 +1807,8 @@ class Dandelion:
         y += btn_h + gap
         button("restart", "重新开始")
         button("swap_side", "切换方", col=1)
+        y += btn_h + gap
+        button("review", "取消复盘" if self.review_pool else "整盘复盘", span=2, selected=self.review_pool is not None)
         y += btn_h + 12
 
         section("显示与棋局")
@@ -1352,6 +1818,9 @@ class Dandelion:
         button("undo", "悔棋")
         button("fen", "输入FEN", col=1)
         y += btn_h + gap
+        button("ownership", "归属热力", selected=self.show_ownership, disabled=np is None)
+        button("compare", "双引擎对比", col=1, selected=self.compare_engine is not None, disabled=bool(self.replay_path))
+        y += btn_h + gap
         button("move_limit_down", "步数-8")
         button("move_limit_up", "步数+8", col=1)
         y += btn_h + 12
@@ -1405,6 +1874,28 @@ class Dandelion:
         elif self.ui_status:
             self.draw_text(self.ui_status, (x, y), font_size=15, color=(80, 80, 80))
             y += 20
+        y = self.draw_engine_startup(x, y, panel_w)
+        progress = self.review_progress
+        if progress and progress['elapsed'] is None and progress['total']:
+            bar = pygame.Rect(x, y + 2, panel_w, 12)
+            pygame.draw.rect(self.screen, (220, 220, 220), bar)
+            pygame.draw.rect(self.screen, (20, 80, 150), (bar.x, bar.y, bar.w * progress['done'] // progress['total'], bar.h))
+            pygame.draw.rect(self.screen, (120, 120, 120), bar, 1)
+            y += 18
+            text = f"复盘 {progress['done']}/{progress['total']}"
+            if progress['done']:
+                elapsed = time.time() - progress['started']
+                text += f"，预计剩余 {elapsed / progress['done'] * (progress['total'] - progress['done']):.0f} 秒"
+            self.draw_text(text, (x, y), font_size=15, color=(80, 80, 80))
+            y += 20
+        review = display_node.get('review')
+        if review:
+            color = REVIEW_COLORS.get(review['image_key'], (80, 80, 80))
+            self.draw_text(f"评价: {review['text']}（-{review['drop']:.1f}%）", (x, y), font_size=15, color=color)
+            y += 20
+            if review['best']:
+                self.draw_text(f"最佳: {review['best']}", (x, y), font_size=15, color=(80, 80, 80))
+                y += 20
 
         if self.human_ai_phase == "playing":
             self.draw_move_evaluation()
@@ -1416,6 +1907,28 @@ class Dandelion:
         self.link2_rect = pygame.Rect(10, link_y + 26, panel_w, 22)
 
 
+    def draw_engine_startup(self, x, y, width):
+        """引擎就绪前显示所处阶段、调优进度与暂存的命令数，返回下一行的y"""
+        if self.engine_ready:
+            return y
+        metrics = self.engine_metrics
+        if metrics.tuning and metrics.tuning_total:
+            bar = pygame.Rect(x, y + 2, width, 12)
+            pygame.draw.rect(self.screen, (220, 220, 220), bar)
+            pygame.draw.rect(self.screen, (150, 90, 20), (bar.x, bar.y, bar.w * metrics.tuning_step // metrics.tuning_total, bar.h))
+            pygame.draw.rect(self.screen, (120, 120, 120), bar, 1)
+            y += 18
+        color = (200, 0, 0) if metrics.stage == 'exited' else (150, 90, 20)
+        self.draw_text(f"引擎{metrics.stage_text()} {metrics.elapsed:.0f}s", (x, y), font_size=15, color=color)
+        y += 20
+        if metrics.tuning:
+            self.draw_text("首次运行需要调优，可先用 --pre-tune 完成", (x, y), font_size=14, color=(120, 120, 120))
+            y += 18
+        if self.outbound_commands:
+            self.draw_text(f"就绪后发送 {self.outbound_depth} 条命令", (x, y), font_size=14, color=(120, 120, 120))
+            y += 18
+        return y
+
     def draw_move_evaluation(self):
         """如果可用，则绘制走法评估图像和文本"""
         if ((self.mode == "main" and self.analyzing) or self.mode == "human_ai") and self.move_evaluation:
@@ -1506,6 +2019,10 @@ class Dandelion:
                     selected=selected,
                     font_size=14
                 )
+                review = self.kifu_nodes[node_id].get('review')
+                if review:
+                    color = REVIEW_COLORS.get(review['image_key'], (150, 150, 150))
+                    pygame.draw.rect(self.screen, color, (rect.x + 3, rect.y + 4, 4, rect.height - 8))
 
         var_y = y + h - 58
         pygame.draw.rect(self.screen, (238, 238, 238), (x, var_y - 6, w, 64))
@@ -1543,18 +2060,24 @@ class Dandelion:
         self.draw_text("选点列表", (panel_x + 10, 10), font_size=18, bold=True)
 
         y = 40
-        if not self.is_viewing_current_node():
-            self.draw_text("正在浏览历史局面", (panel_x + 10, y), font_size=16, color=(120, 70, 0))
-            self.draw_text("在棋盘落子会创建新分支", (panel_x + 10, y + 24), font_size=16, color=(120, 70, 0))
+        viewing_current = self.is_viewing_current_node()
+        if viewing_current:
+            results = self.current_analysis().results
         else:
-            with self.analysis_lock:
-                for idx, result in enumerate(self.analysis_results[:6]):
-                    text_line = f"{idx + 1}. {result['move']}: {result['winrate']:.1f}%  {result['visits']}v  和{result['drawrate']:.1f}%"
-                    color = (220, 0, 0) if idx == 0 else (0, 0, 0)
-                    text_surf = font.render(text_line, True, color)
-                    self.screen.blit(text_surf, (panel_x + 10, y))
-                    y += 24
-            if y == 40:
+            results = self.node_analysis(self.get_display_node()).results
+            if not results:
+                self.draw_text("正在浏览历史局面", (panel_x + 10, y), font_size=16, color=(120, 70, 0))
+                self.draw_text("在棋盘落子会创建新分支", (panel_x + 10, y + 24), font_size=16, color=(120, 70, 0))
+        if viewing_current and self.compare_engine is not None:
+            self.draw_compare_lists(panel_x + 10, y, self.sidebar_width - 20)
+        else:
+            for idx, result in enumerate(results[:ANALYSIS_PANEL_MOVES]):
+                text_line = f"{idx + 1}. {result['move']}: {result['winrate']:.1f}%  {result['visits']}v  和{result['drawrate']:.1f}%"
+                color = (220, 0, 0) if idx == 0 else (0, 0, 0)
+                text_surf = font.render(text_line, True, color)
+                self.screen.blit(text_surf, (panel_x + 10, y))
+                y += 24
+            if viewing_current and y == 40:
                 self.draw_text("等待分析...", (panel_x + 10, y), font_size=16, color=(80, 80, 80))
 
         situation_y = panel_height - 76
@@ -1567,10 +2090,14 @@ class Dandelion:
 
         if not self.is_viewing_current_node():
             display_node = self.get_display_node()
-            situation_text = f"历史第{display_node['move_num']}步"
-            text_color = (120, 70, 0)
-            score_text = "谱"
-            score_color = text_color
+            node_results = self.node_analysis(display_node).results
+            if node_results:
+                situation_text, text_color, score_text, score_color = self.situation_from_results(node_results, display_node['player'])
+            else:
+                situation_text = f"历史第{display_node['move_num']}步"
+                text_color = (120, 70, 0)
+                score_text = "谱"
+                score_color = text_color
         else:
             situation_text, text_color, score_text, score_color = self.get_situation_text()
 
@@ -1584,6 +2111,45 @@ class Dandelion:
         text_rect = text_surf.get_rect(center=(panel_x + self.sidebar_width // 2 + 20, situation_y + 38))
         self.screen.blit(text_surf, text_rect)
 
+    def draw_compare_lists(self, x, y, width):
+        """对比模式：两个引擎的候选并排显示，下面是最佳着法是否一致与累计一致率"""
+        col_w = width // 2
+        key = self.analysis_position_key()
+        compare = self.compare_snapshot if self.compare_snapshot.key == key else EMPTY_SNAPSHOT
+        columns = [
+            (self.engine_command, self.engine_metrics, self.current_analysis().results),
+            (self.compare_command, self.compare_engine.metrics, compare.results),
+        ]
+        font = self.get_font(FONT_NAME, 14)
+        for index, (command, metrics, results) in enumerate(columns):
+            cx = x + index * col_w
+            label = "AB"[index] + " " + engine_network_id(command).split(".")[0]
+            self.draw_text(label, (cx, y), font_size=13, bold=True)
+            if metrics.ready:
+                rate = metrics.visits_per_second
+                speed = f"{rate:.0f} visits/s" if rate is not None else "visits/s 统计中"
+            else:
+                speed = metrics.stage_text()
+            self.draw_text(speed, (cx, y + 18), font_size=13, color=(90, 90, 90))
+            for idx, result in enumerate(results[:COMPARE_PANEL_MOVES]):
+                text_line = f"{result['move']} {result['winrate']:.1f}% {result['visits']}v"
+                color = (220, 0, 0) if idx == 0 else (0, 0, 0)
+                self.screen.blit(font.render(text_line, True, color), (cx, y + 38 + idx * 20))
+
+        best_a, best_b = best_result(columns[0][2]), best_result(columns[1][2])
+        total = len(self.compare_agreement)
+        tally = f"  一致率 {sum(self.compare_agreement.values())}/{total}" if total else ""
+        line_y = y + 40 + COMPARE_PANEL_MOVES * 20
+        if best_a and best_b:
+            diff = best_b['winrate'] - best_a['winrate']
+            if best_a['move'] == best_b['move']:
+                text, color = f"最佳一致 胜率差{diff:+.1f}%", (0, 120, 0)
+            else:
+                text, color = f"分歧 {best_a['move']}/{best_b['move']} 胜率差{diff:+.1f}%", (200, 0, 0)
+            self.draw_text(text + tally, (x, line_y), font_size=14, color=color)
+        elif tally:
+            self.draw_text(tally.strip(), (x, line_y), font_size=14, color=(90, 90, 90))
+
     def get_situation_text(self):
         """根据胜率返回形势判断文本和颜色，以及分数文本和颜色"""
         if self.game_result:
@@ -1593,61 +2159,63 @@ class Dandelion:
             color = (0, 66, 255) if winner == 'w' else (200, 0, 0)
             return self.result_text(self.game_result), color, "胜", color
 
-        with self.analysis_lock:
-            if not self.analysis_results:
-                return "分析中...", (0, 0, 0), "0.0", (0, 0, 0)
+        return self.situation_from_results(self.current_analysis().results, self.current_player)
 
-            best_move = next((x for x in self.analysis_results if x['order'] == 0), None)
-            if not best_move:
-                return "等待分析", (0, 0, 0), "0.0", (0, 0, 0)
+    def situation_from_results(self, results, player):
+        if not results:
+            return "分析中...", (0, 0, 0), "0.0", (0, 0, 0)
 
-            winrate = best_move['winrate']
+        best_move = next((x for x in results if x['order'] == 0), None)
+        if not best_move:
+            return "等待分析", (0, 0, 0), "0.0", (0, 0, 0)
 
-            if self.current_player == 'w':
-                blue_winrate = winrate
-                red_winrate = 100 - winrate
-            else:
-                red_winrate = winrate
-                blue_winrate = 100 - winrate
-
-            if (43 <= red_winrate <= 57) or (43 <= blue_winrate <= 57):
-                situation_text, text_color = "双方均势", (0, 0, 0)
-            elif (57 < red_winrate <= 70) or (30 <= blue_winrate < 43):
-                situation_text, text_color = "红方小优", (200, 0, 0)
-            elif (70 < red_winrate <= 90) or (10 <= blue_winrate < 30):
-                situation_text, text_color = "红方大优", (200, 0, 0)
-            elif (90 < red_winrate < 99) or (1 < blue_winrate < 10):
-                situation_text, text_color = "红方胜势", (200, 0, 0)
-            elif (red_winrate >= 99) or (blue_winrate <= 1):
-                situation_text, text_color = "红方杀棋", (200, 0, 0)
-            elif (57 < blue_winrate <= 70) or (30 <= red_winrate < 43):
-                situation_text, text_color = "蓝方小优", (0, 66, 255)
-            elif (70 < blue_winrate <= 90) or (10 <= red_winrate < 30):
-                situation_text, text_color = "蓝方大优", (0, 66, 255)
-            elif (90 < blue_winrate < 99) or (1 < red_winrate < 10):
-                situation_text, text_color = "蓝方胜势", (0, 66, 255)
-            elif (red_winrate <= 1) or (blue_winrate >= 99):
-                situation_text, text_color = "蓝方杀棋", (0, 66, 255)
-            else:
-                situation_text, text_color = f"红方胜率: {red_winrate:.1f}%", (0, 0, 0)
+        winrate = best_move['winrate']
+
+        if player == 'w':
+            blue_winrate = winrate
+            red_winrate = 100 - winrate
+        else:
+            red_winrate = winrate
+            blue_winrate = 100 - winrate
+
+        if (43 <= red_winrate <= 57) or (43 <= blue_winrate <= 57):
+            situation_text, text_color = "双方均势", (0, 0, 0)
+        elif (57 < red_winrate <= 70) or (30 <= blue_winrate < 43):
+            situation_text, text_color = "红方小优", (200, 0, 0)
+        elif (70 < red_winrate <= 90) or (10 <= blue_winrate < 30):
+            situation_text, text_color = "红方大优", (200, 0, 0)
+        elif (90 < red_winrate < 99) or (1 < blue_winrate < 10):
+            situation_text, text_color = "红方胜势", (200, 0, 0)
+        elif (red_winrate >= 99) or (blue_winrate <= 1):
+            situation_text, text_color = "红方杀棋", (200, 0, 0)
+        elif (57 < blue_winrate <= 70) or (30 <= red_winrate < 43):
+            situation_text, text_color = "蓝方小优", (0, 66, 255)
+        elif (70 < blue_winrate <= 90) or (10 <= red_winrate < 30):
+            situation_text, text_color = "蓝方大优", (0, 66, 255)
+        elif (90 < blue_winrate < 99) or (1 < red_winrate < 10):
+            situation_text, text_color = "蓝方胜势", (0, 66, 255)
+        elif (red_winrate <= 1) or (blue_winrate >= 99):
+            situation_text, text_color = "蓝方杀棋", (0, 66, 255)
+        else:
+            situation_text, text_color = f"红方胜率: {red_winrate:.1f}%", (0, 0, 0)
 
-            b = blue_winrate / 100.0
-            if blue_winrate >= 99:
-                score_text, score_color = "+M", (0, 66, 255)
-            elif blue_winrate <= 1:
-                score_text, score_color = "-M", (200, 0, 0)
+        b = blue_winrate / 100.0
+        if blue_winrate >= 99:
+            score_text, score_color = "+M", (0, 66, 255)
+        elif blue_winrate <= 1:
+            score_text, score_color = "-M", (200, 0, 0)
+        else:
+            b = max(0.0001, min(0.9999, b))
+            odds = b / (1 - b)
+            score = 5 * math.log10(odds)
+            if score > 0:
+                score_text, score_color = f"+{score:.1f}", (0, 66, 255)
+            elif score < 0:
+                score_text, score_color = f"{score:.1f}", (200, 0, 0)
             else:
-                b = max(0.0001, min(0.9999, b))
-                odds = b / (1 - b)
-                score = 5 * math.log10(odds)
-                if score > 0:
-                    score_text, score_color = f"+{score:.1f}", (0, 66, 255)
-                elif score < 0:
-                    score_text, score_color = f"{score:.1f}", (200, 0, 0)
-                else:
-                    score_text, score_color = "0.0", (0, 0, 0)
+                score_text, score_color = "0.0", (0, 0, 0)
 
-            return situation_text, text_color, score_text, score_color
+        return situation_text, text_color, score_text, score_color
 
     def draw_information_panel(self):
         y0 = self.information_panel_pos - 200
@@ -1719,6 +2287,10 @@ class Dandelion:
         font = self.get_font(FONT_NAME, 20)  # 修改
         title = font.render("GTP 信息", True, (0, 0, 0))
         self.screen.blit(title, (console_x + 10, console_top - 30))
+        summary = self.engine_metrics.summary_text()
+        if self.engine_ready and self.outbound_depth:
+            summary += f" | 待发送 {self.outbound_depth}"
+        self.draw_text(summary, (console_x + 10, console_top + 6), font_size=15, color=(90, 90, 90))
 
         font = self.get_font(FONT_NAME, GTP_FONT_SIZE)  # 修改
         y_increase = GTP_FONT_SIZE + 2
@@ -1806,13 +2378,32 @@ class Dandelion:
     def unselect(self, send_command=True):
         if self.selected_piece is None:
             return
-        self.analysis_results.clear()
+        self.clear_analysis()
         if send_command:
             if self.mode == "human_ai":
                 self.try_send_command("stop")
             self.try_send_command("undo")
+            self.selected_piece = None
             if self.mode != "human_ai" and self.analyzing:
-                self.try_send_command(GTP_COMMAND_ANALYZE)
+                self.request_selection_analysis()
+
+    def select_piece(self, row, col):
+        """两段式着法的第一段：让引擎选中棋子，并分析该棋子的走法；主界面同时预分析各落点"""
+        self.selected_piece = (row, col)
+        self.try_send_command(f"play {self.gtp_color_for_player(self.current_player)} {self.coord_to_movestr(row, col)}")
+        self.clear_analysis()
+        if self.mode == "human_ai":
+            self.start_human_ai_evaluation_analysis()
+        elif self.analyzing:
+            self.request_selection_analysis()
+            self.start_destination_analysis(row, col)
+
+    def request_selection_analysis(self):
+        """选子或取消选子后：缓存中该局面（含选中的棋子）的分析已足够深时直接显示，不再让引擎重新搜索"""
+        if self.analysis_cache.depth(self.analysis_position_key()) >= SELECTION_REUSE_VISITS:
+            self.analysis_requested_at = None
+            return
+        self.request_analysis()
 
     def mouse_click_loc(self, col, row):
         if self.game_result:
@@ -1833,24 +2424,21 @@ class Dandelion:
                 if piece != ' ':
                     if (self.current_player == 'w' and piece.isupper()) or \
                        (self.current_player == 'b' and piece.islower()):
-                        self.selected_piece = (row, col)
-                        color = 'B' if self.current_player == 'w' else 'W'
-                        start_col, start_row = chr(col + ord('A')), 9 - row
-                        self.try_send_command(f"play {color} {start_col}{start_row}\n")
-                        self.analysis_results.clear()
-                        if self.mode == "human_ai":
-                            self.start_human_ai_evaluation_analysis()
-                        elif self.analyzing:
-                            self.try_send_command(GTP_COMMAND_ANALYZE)
+                        self.select_piece(row, col)
         else:
             if 0 <= row < ROWS and 0 <= col < COLS:
                 sr, sc = self.selected_piece
                 target_piece = self.board[row][col]
                 if (self.current_player == 'w' and target_piece.isupper()) or \
                    (self.current_player == 'b' and target_piece.islower()):
+                    # 点同一个棋子取消选中，点另一个己方棋子直接改选
                     self.unselect()
+                    if (row, col) != (sr, sc):
+                        self.select_piece(row, col)
+                    return
                 else:
-                    pre_move_analysis = self.analysis_results.copy()
+                    pre_move_analysis = self.current_analysis().results
+                    destination_winrates = self.destination_winrates(sr, sc) if self.mode == "main" else None
                     user_move_coords = (row, col)
 
                     captured_piece = self.board[row][col] if self.board[row][col] != ' ' else None
@@ -1862,9 +2450,11 @@ class Dandelion:
                     if self.mode == "human_ai":
                         self.try_send_command("stop")
                     self.try_send_command(f"play {color} {end_col}{end_row}")
-                    self.analysis_results.clear()
+                    self.selected_piece = None  # 走子后的分析要记在未选子的局面下
+                    self.clear_analysis()
 
-                    self.evaluate_move(pre_move_analysis, user_move_coords, force=(self.mode == "human_ai"))
+                    self.evaluate_move(pre_move_analysis, user_move_coords, force=(self.mode == "human_ai"),
+                                       destination_winrates=destination_winrates)
 
                     self.last_move = ((sr, sc), (row, col))
                     self.current_movenum += 1
@@ -1883,9 +2473,9 @@ class Dandelion:
                     if result:
                         self.try_send_command("stop")
                     elif self.analyzing:
-                        self.try_send_command(GTP_COMMAND_ANALYZE)
+                        self.request_analysis()
 
-            self.analysis_results.clear()
+            self.clear_analysis()
             self.selected_piece = None
 
     def undo_move(self):
@@ -1920,22 +2510,22 @@ class Dandelion:
         self.try_send_command("undo")
         self.try_send_command("undo")
          
-        self.analysis_results.clear()
+        self.clear_analysis()
         result = self.update_game_result()
         if result:
             self.try_send_command("stop")
         elif self.analyzing:
-            self.try_send_command(GTP_COMMAND_ANALYZE)
+            self.request_analysis()
 
     def toggle_analysis(self):
         self.analyzing = not self.analyzing
         if self.analyzing:
-            with self.analysis_lock:
-                self.analysis_results.clear()
-            self.try_send_command(GTP_COMMAND_ANALYZE)
+            self.clear_analysis()
+            self.start_analysis()
             self.ui_status = "分析已继续"
         else:
             self.try_send_command("stop")
+            self.stop_destination_analysis()
             self.ui_status = "分析已暂停"
 
     def toggle_lion_rat_rule(self):
@@ -1952,14 +2542,158 @@ class Dandelion:
             self.ui_status = "已同步历史局面，请等待分析后快速出招"
             return
         if self.analyzing and self.selected_piece is None:
-            with self.analysis_lock:
-                if not self.analysis_results:
-                    self.ui_status = "暂无可用分析结果"
-                    return
-                analysis_snapshot = [result.copy() for result in self.analysis_results]
+            analysis_snapshot = self.current_analysis().results
+            if not analysis_snapshot:
+                self.ui_status = "暂无可用分析结果"
+                return
             if not self.play_best_analysis_move(analysis_snapshot, source="quick"):
                 self.ui_status = "无可用着法"
 
+    def toggle_review(self):
+        if self.review_pool is not None:
+            self.review_pool.cancel()
+            self.review_pool = None
+            self.review_progress = None
+            self.ui_status = "复盘已取消"
+        elif self.replay_path:
+            self.ui_status = "回放录制时无法复盘"
+        else:
+            self.start_review()
+
+    def start_review(self):
+        """用多个后台引擎并行分析棋谱中的每个局面，完成后给每一步着法打分"""
+        results = {}
+        tasks = []
+        for node_id, node in self.kifu_nodes.items():
+            if animal_rules.calculate_game_result(node['board'], node['player'], node['move_num'], self.game_rule):
+                continue
+            key = self.node_analysis_key(node)
+            cached = self.analysis_cache.get(key)
+            if cached is not None and snapshot_depth(cached) >= REVIEW_VISITS:
+                results[node_id] = (key, cached)
+            else:
+                commands = self.node_position_commands(node_id) + self.move_limit_commands(node['move_num'])
+                tasks.append((node_id, key, commands))
+
+        self.review_progress = {'total': len(tasks), 'done': 0, 'started': time.time(), 'elapsed': None}
+        if not tasks:
+            self.finish_review(results)
+            return
+        self.stop_destination_analysis()
+        pool = EnginePool(self.engine_command, REVIEW_ENGINES, self.engine_setup_commands())
+        self.review_pool = pool
+        workers = pool.run(
+            tasks,
+            self.run_review_task,
+            lambda task, snapshot: self.review_task_done(pool, results, task, snapshot),
+            on_error=lambda error, task: self.review_task_failed(pool, error, task),
+        )
+        threading.Thread(target=self.wait_review, args=(pool, workers, results), daemon=True).start()
+        self.ui_status = f"复盘中（{len(workers)} 个引擎）"
+
+    def run_review_task(self, engine, task):
+        """在复盘工作线程中执行：把引擎摆到节点局面并分析到预算访问数"""
+        node_id, key, commands = task
+        for command in commands:
+            engine.command(command)
+        return engine.analyze(REVIEW_VISITS, key)
+
+    def review_task_done(self, pool, results, task, snapshot):
+        if pool is not self.review_pool:
+            return
+        node_id, key, _ = task
+        results[node_id] = (key, snapshot)
+        self.analysis_cache.offer(key, snapshot)
+        with self.analysis_lock:
+            progress = self.review_progress
+            if progress is not None:
+                progress['done'] += 1
+
+    def review_task_failed(self, pool, error, task):
+        """引擎启动失败时报错；单个局面分析失败只计入进度，该局面不评分，其余局面照常复盘"""
+        if pool is not self.review_pool:
+            return
+        if task is None:
+            self.show_error(f"复盘引擎出错: {error}")
+            return
+        with self.analysis_lock:
+            progress = self.review_progress
+            if progress is not None:
+                progress['done'] += 1
+        self.ui_status = f"复盘中有局面分析失败: {error}"
+
+    def wait_review(self, pool, workers, results):
+        for worker in workers:
+            worker.join()
+        pygame.event.post(pygame.event.Event(REVIEW_DONE_EVENT, pool=pool, results=results))
+
+    def on_review_done(self, event):
+        """主线程：复盘期间棋谱被重建或复盘被取消时丢弃结果"""
+        if event.pool is not self.review_pool:
+            return
+        self.finish_review(event.results)
+
+    def finish_review(self, results):
+        """results: {节点编号: (分析时的局面键, 快照)}；键与节点当前的键不一致（规则已改）的结果不用"""
+        snapshots = {}
+        for node_id, (key, snapshot) in results.items():
+            node = self.kifu_nodes.get(node_id)
+            if node is not None and self.node_analysis_key(node) == key:
+                snapshots[node_id] = snapshot
+        for node_id, node in list(self.kifu_nodes.items()):
+            parent_id = node['parent']
+            if parent_id in snapshots:
+                review = self.review_move(self.kifu_nodes[parent_id], node, snapshots[parent_id], snapshots.get(node_id))
+                if review:
+                    node['review'] = review
+        elapsed = time.time() - self.review_progress['started']
+        self.review_progress['elapsed'] = elapsed
+        self.review_pool = None
+        self.ui_status = f"复盘完成，用时 {elapsed:.1f} 秒"
+
+    def review_move(self, parent, node, parent_snapshot, child_snapshot):
+        """比较父局面的最佳着法与实战着法，返回该步的评价"""
+        best = best_result(parent_snapshot.results)
+        if best is None:
+            return None
+        move = node['move']
+        result = animal_rules.calculate_game_result(node['board'], node['player'], node['move_num'], self.game_rule)
+        if result:
+            if result.get('type') == 'draw':
+                played_winrate = 50.0
+            else:
+                played_winrate = 100.0 if result.get('winner') == move['player'] else 0.0
+        elif child_snapshot is not None and child_snapshot.results:
+            # 子节点的胜率是对手视角
+            played_winrate = 100.0 - best_result(child_snapshot.results)['winrate']
+        else:
+            return None
+
+        pv = best['pv'].split()
+        played = [self.coord_to_movestr(*move['start']), self.coord_to_movestr(*move['end'])]
+        second = next((r for r in parent_snapshot.results if r['order'] == 1), None)
+        image_key = classify_move(best['winrate'], played_winrate, pv[:2] == played, second['winrate'] if second else None)
+        best_text = ""
+        if len(pv) >= 2:
+            start, end = animal_rules.movestr_to_coord(pv[0]), animal_rules.movestr_to_coord(pv[1])
+            if start and end:
+                best_text = self.move_notation({'piece': parent['board'][start[0]][start[1]], 'start': start, 'end': end})
+        return {
+            'image_key': image_key,
+            'text': MOVE_CLASSES[image_key],
+            'winrate': played_winrate,
+            'drop': max(0.0, best['winrate'] - played_winrate),
+            'best': best_text,
+        }
+
+    def export_engine_metrics(self):
+        try:
+            path = self.engine_metrics.export()
+        except OSError as e:
+            self.show_error(f"指标导出失败: {e}")
+            return
+        self.ui_status = f"引擎指标已追加到 {path}"
+
     def enter_editor_mode(self):
         self.mode = "editor"
         self.board = [row.copy() for row in self.initial_board]
@@ -2012,8 +2746,18 @@ class Dandelion:
             self.set_game_looprule("none")
         elif key == "simple_mode":
             self.simple_mode = not self.simple_mode
+            if self.analyzing and not self.game_result and self.idle_node_id is None:
+                self.request_analysis()
         elif key == "quick_move":
             self.quick_play_best_move()
+        elif key == "review":
+            self.toggle_review()
+        elif key == "ownership":
+            self.toggle_ownership()
+        elif key == "compare":
+            self.toggle_compare()
+        elif key == "export_metrics":
+            self.export_engine_metrics()
         elif key == "human_ai":
             self.enter_human_ai_setup()
         elif key == "editor":
@@ -2044,6 +2788,10 @@ class Dandelion:
             pygame.K_l: "loop_none",
             pygame.K_a: "simple_mode",
             pygame.K_w: "quick_move",
+            pygame.K_r: "review",
+            pygame.K_t: "ownership",
+            pygame.K_e: "export_metrics",
+            pygame.K_c: "compare",
         }
         action = key_actions.get(key)
         if action:
@@ -2103,13 +2851,10 @@ class Dandelion:
         self.human_ai_phase = "setup"
         self.analyzing = False
         self.human_ai_ai_thinking = False
+        self.human_ai_pondering = False
         self.human_ai_game_over = False
         self.human_ai_status = "请选择执棋方、难度和开局方式"
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.clear_analysis()
         self.try_send_command("stop")
 
     def exit_human_ai_to_main(self):
@@ -2118,29 +2863,36 @@ class Dandelion:
         self.mode = "main"
         self.human_ai_phase = "setup"
         self.human_ai_ai_thinking = False
+        self.human_ai_pondering = False
         self.human_ai_game_over = False
+        self.human_ai_clock = None
         self.analyzing = True
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
+        self.clear_analysis()
         self.try_send_command("stop")
         self.try_send_command(f"kata-set-param maxVisits {NORMAL_MAX_VISITS}")
         result = self.update_game_result()
         if result:
             self.try_send_command("stop")
         else:
-            self.try_send_command(GTP_COMMAND_ANALYZE)
+            self.start_analysis()
 
     def set_human_ai_difficulty(self, index):
-        if not (0 <= index < len(HUMAN_AI_DIFFICULTIES)):
+        if not (0 <= index < len(self.human_ai_difficulties)):
             return
         self.human_ai_difficulty_index = index
-        name, visits = HUMAN_AI_DIFFICULTIES[index]
+        name, visits = self.human_ai_difficulties[index]
         if not self.human_ai_ai_thinking:
             self.human_ai_ai_target_visits = visits
+        temperature = HUMAN_AI_POLICY_LEVELS.get(name)
+        if temperature is not None:
+            detail = f"策略网络，温度 {temperature}"  # 不搜索，校准时也不测Elo
+        else:
+            detail = f"{visits} visits"
+            if self.difficulty_profile:
+                level = self.difficulty_profile['levels'][index]
+                detail += f"，约{level.get('move_seconds', 0):.1f}秒/步，Elo {level.get('elo', 0):+.0f}"
         suffix = "，下一手AI生效" if self.human_ai_ai_thinking else ""
-        self.human_ai_status = f"难度已切换为{name}（{visits} visits）{suffix}"
+        self.human_ai_status = f"难度已切换为{name}（{detail}）{suffix}"
 
     def start_human_ai_game(self, use_current_position):
         if self.selected_piece is not None:
@@ -2149,33 +2901,31 @@ class Dandelion:
         self.analyzing = False
         self.human_ai_phase = "playing"
         self.human_ai_ai_thinking = False
+        self.human_ai_pondering = False
         self.human_ai_game_over = False
         self.human_ai_root_visits = 0
         self.human_ai_display_visits = 0
-        self.analysis_root_visits = 0
         self.game_result = None
         self.move_evaluation = None
         self.current_movenum = 0
         self.selected_piece = None
         self.last_move = None
         self.movenum_limit = 300
+        self.movenum_limit_total = 300
 
         if not use_current_position:
             self.board = [row.copy() for row in self.initial_board]
             self.current_player = 'w'
         self.reset_kifu_tree(self.board, self.current_player)
 
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.clear_analysis()
 
         self.try_send_command("stop")
         self.try_send_command("setfen " + self.get_fen())
         self.try_send_command("mm 300")
         self.try_send_command("mc 0")
 
+        self.start_human_ai_clock()
         result = self.update_game_result()
         if result:
             self.try_send_command("stop")
@@ -2185,28 +2935,159 @@ class Dandelion:
             self.human_ai_status = f"AI（{self.player_name(get_opp(self.human_ai_player))}）先行"
             self.start_human_ai_search()
 
+    def human_ai_time_control(self):
+        return HUMAN_AI_TIME_CONTROLS[self.human_ai_time_control_index][1]
+
+    def cycle_human_ai_time_control(self):
+        if self.human_ai_phase == "playing":
+            self.human_ai_status = "对局中不能更改计时"
+            return
+        self.human_ai_time_control_index = (self.human_ai_time_control_index + 1) % len(HUMAN_AI_TIME_CONTROLS)
+        self.human_ai_status = f"计时：{HUMAN_AI_TIME_CONTROLS[self.human_ai_time_control_index][0]}"
+
+    def start_human_ai_clock(self):
+        control = self.human_ai_time_control()
+        if control is None:
+            self.human_ai_clock = None
+            return
+        base, _ = control
+        self.human_ai_clock = {'w': float(base), 'b': float(base)}
+        self.human_ai_clock_player = self.current_player
+        self.human_ai_turn_started = time.time()
+
+    def clock_remaining(self, player):
+        remaining = self.human_ai_clock[player]
+        if player == self.human_ai_clock_player and not (self.game_result or self.human_ai_game_over):
+            remaining -= time.time() - self.human_ai_turn_started
+        return remaining
+
+    def settle_human_ai_clock(self, increment):
+        """把正在计时一方这一步的用时记入剩余时间，increment 为True时加秒"""
+        now = time.time()
+        player = self.human_ai_clock_player
+        self.human_ai_clock[player] -= now - self.human_ai_turn_started
+        if increment:
+            self.human_ai_clock[player] += self.human_ai_time_control()[1]
+        self.human_ai_turn_started = now
+
+    def update_human_ai_clock(self):
+        """主循环每帧调用：走棋方变化时结算上一方并加秒，走棋方时间用完判负"""
+        if self.human_ai_clock is None:
+            return
+        if self.current_player != self.human_ai_clock_player:
+            self.settle_human_ai_clock(increment=True)
+            self.human_ai_clock_player = self.current_player
+        player = self.current_player
+        if self.clock_remaining(player) > 0:
+            return
+        self.settle_human_ai_clock(increment=False)
+        if self.human_ai_ai_thinking or self.human_ai_pondering:
+            self.try_send_command("stop")
+        self.human_ai_ai_thinking = False
+        self.human_ai_pondering = False
+        self.game_result = {'type': 'win', 'winner': get_opp(player), 'reason': f"{self.player_name(player)}超时"}
+
+    def ai_move_budget(self, player):
+        """把AI的剩余时间与加秒换算成本步的搜索时间"""
+        remaining = self.clock_remaining(player)
+        increment = self.human_ai_time_control()[1]
+        budget = remaining / HUMAN_AI_MOVES_TO_GO + increment * 0.8
+        return max(0.05, min(budget, remaining * 0.5 - HUMAN_AI_CLOCK_SAFETY))
+
+    def toggle_human_ai_ponder(self):
+        self.human_ai_ponder = not self.human_ai_ponder
+        if not self.human_ai_ponder and self.human_ai_pondering:
+            self.human_ai_pondering = False
+            self.try_send_command("stop")
+        self.human_ai_status = "AI预想已开启" if self.human_ai_ponder else "AI预想已关闭"
+
+    def start_human_ai_ponder(self):
+        """轮到玩家时让引擎继续搜索当前局面；玩家之后的选子和落子都通过play发送，搜索树得以保留"""
+        self.human_ai_pondering = True
+        self.try_send_command("stop")
+        self.try_send_command(f"kata-set-param maxVisits {HUMAN_AI_PONDER_VISITS}")
+        self.start_analysis(purpose="ponder")
+
     def start_human_ai_search(self):
         ai_player = get_opp(self.human_ai_player)
         if self.mode != "human_ai" or self.human_ai_phase != "playing":
             return
         if self.game_result or self.human_ai_game_over or self.current_player != ai_player:
             return
+        self.human_ai_pondering = False
 
-        name, visits = HUMAN_AI_DIFFICULTIES[self.human_ai_difficulty_index]
+        name, visits = self.human_ai_difficulties[self.human_ai_difficulty_index]
         self.human_ai_ai_thinking = True
         self.human_ai_ai_target_visits = visits
         self.human_ai_root_visits = 0
         self.human_ai_display_visits = 0
+        self.human_ai_search_id += 1
+        temperature = HUMAN_AI_POLICY_LEVELS.get(name)
+        if temperature is not None:
+            self.human_ai_search_deadline = None
+            self.human_ai_status = f"AI思考中：{name}（策略网络）"
+            self.request_policy_move(temperature)
+            return
         self.human_ai_status = f"AI思考中：{name}（目标 {visits} visits）"
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.human_ai_search_started = time.time()
+        if self.human_ai_clock is not None:
+            budget = self.ai_move_budget(ai_player)
+            self.human_ai_search_deadline = self.human_ai_search_started + budget
+            self.human_ai_status += f"，限时 {budget:.1f} 秒"
+        else:
+            self.human_ai_search_deadline = None
+        self.clear_analysis()
 
         self.try_send_command("stop")
         self.try_send_command(f"kata-set-param maxVisits {visits}")
-        self.try_send_command(HUMAN_AI_ANALYZE_COMMAND)
+        self.start_analysis(purpose="ai_search")
+
+    def request_policy_move(self, temperature):
+        """一次性发出整步所需的策略请求：当前局面一条，每个可动棋子各一条（选子后取策略再悔掉选子）
+
+        KataGo的GTP没有一次评估多个局面的命令，所以一步要做 1+可动棋子数 次神经网络评估（最多9次，
+        每次只做一次前向计算、不搜索）。选子会临时改变引擎的局面，因此先停止分析，全部命令在界面线程
+        一次排进发送队列，中间不会插入其他命令，每个选子后都有undo，引擎最终回到当前局面。
+        """
+        player = self.current_player
+        legal = animal_rules.legal_moves(self.board, player, self.game_rule)
+        color = self.gtp_color_for_player(player)
+        root_id = next(self.gtp_ids)
+        request = {'search_id': self.human_ai_search_id, 'ids': {root_id: None}, 'grids': {},
+                   'legal': legal, 'temperature': temperature}
+        commands = ["stop", f"{root_id} kata-raw-nn 0"]
+        for start in sorted({start for start, _ in legal}):
+            cmd_id = next(self.gtp_ids)
+            request['ids'][cmd_id] = start
+            commands += [f"play {color} {self.coord_to_movestr(*start)}", f"{cmd_id} kata-raw-nn 0", "undo"]
+        self.raw_nn_collecting = None
+        self.policy_request = request
+        self.try_send_command("\n".join(commands))
+
+    def on_human_ai_policy(self, event):
+        """策略结果收齐：按联合策略采样一步落子；策略不可用时退回随机合法着法"""
+        request = event.request
+        if request['search_id'] != self.human_ai_search_id or not self.human_ai_ai_thinking:
+            return
+        if self.mode != "human_ai" or self.human_ai_phase != "playing" or self.human_ai_game_over:
+            return
+        root = next(cmd_id for cmd_id, start in request['ids'].items() if start is None)
+        source_policy = request['grids'].get(root)
+        move = None
+        if source_policy is not None:
+            destinations = {start: request['grids'][cmd_id] for cmd_id, start in request['ids'].items()
+                            if start is not None and request['grids'].get(cmd_id) is not None}
+            move = sample_policy_move(source_policy, destinations, request['legal'], request['temperature'])
+        if move is None and request['legal']:
+            move = random.choice(request['legal'])
+        self.human_ai_ai_thinking = False
+        if move is None:
+            self.report_human_ai_ai_move(False)
+            return
+        start, end = move
+        self.report_human_ai_ai_move(
+            self.play_move_strings(self.coord_to_movestr(*start), self.coord_to_movestr(*end), source="ai")
+        )
 
     def start_human_ai_evaluation_analysis(self):
         if self.mode != "human_ai" or self.human_ai_phase != "playing":
@@ -2216,16 +3097,16 @@ class Dandelion:
         if self.current_player != self.human_ai_player or self.selected_piece is None:
             return
 
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.human_ai_pondering = False
+        self.clear_analysis()
+        if self.analysis_cache.depth(self.analysis_position_key()) >= HUMAN_AI_EVALUATION_VISITS:
+            self.human_ai_status = "已有该棋子的评估结果"
+            return
 
         self.human_ai_status = f"正在评估玩家着法（{HUMAN_AI_EVALUATION_VISITS} visits）"
         self.try_send_command("stop")
         self.try_send_command(f"kata-set-param maxVisits {HUMAN_AI_EVALUATION_VISITS}")
-        self.try_send_command(HUMAN_AI_ANALYZE_COMMAND)
+        self.start_analysis(purpose="evaluation")
 
     def update_human_ai(self):
         if self.mode != "human_ai" or self.human_ai_phase != "playing":
@@ -2237,11 +3118,17 @@ class Dandelion:
             return
         if self.human_ai_game_over:
             return
+        self.update_human_ai_clock()
+        if self.game_result:
+            return
 
         ai_player = get_opp(self.human_ai_player)
         if self.current_player == self.human_ai_player:
             if not self.human_ai_ai_thinking and self.selected_piece is None:
                 self.human_ai_status = f"轮到玩家（{self.player_name(self.human_ai_player)}）"
+                if self.human_ai_ponder and (not self.human_ai_pondering
+                                             or self.analysis_key != self.analysis_position_key()):
+                    self.start_human_ai_ponder()
             return
 
         if self.current_player != ai_player:
@@ -2249,30 +3136,28 @@ class Dandelion:
 
         if not self.human_ai_ai_thinking:
             self.start_human_ai_search()
+        elif self.human_ai_search_deadline is not None and time.time() > self.human_ai_search_deadline + HUMAN_AI_CLOCK_SAFETY:
+            # 到时仍没有收到完成事件（引擎不再输出），用已有的结果落子
+            snapshot = self.analysis_snapshot
+            if snapshot.key == self.analysis_key and snapshot.results:
+                self.human_ai_search_done_id = self.human_ai_search_id
+                self.finish_human_ai_ai_move(snapshot.results)
+
+    def on_human_ai_search_done(self, event):
+        """AI搜索完成事件：局面未变时立即落子"""
+        if event.search_id != self.human_ai_search_id or not self.human_ai_ai_thinking:
             return
-
-        with self.analysis_lock:
-            analysis_snapshot = [result.copy() for result in self.analysis_results]
-            root_visits = self.human_ai_root_visits
-            total_visits = sum(result.get('visits', 0) for result in analysis_snapshot)
-            max_child_visits = max([result.get('visits', 0) for result in analysis_snapshot], default=0)
-
-        target = self.human_ai_ai_target_visits
-        progress_visits = root_visits if root_visits > 0 else max(total_visits, max_child_visits)
-        self.human_ai_display_visits = progress_visits
-        if progress_visits > 0:
-            self.human_ai_status = f"AI思考中：{progress_visits}/{target} visits"
-
-        reached_by_root = root_visits >= target
-        reached_by_children = root_visits == 0 and (total_visits >= target or max_child_visits >= target)
-        if reached_by_root or reached_by_children:
-            self.finish_human_ai_ai_move(analysis_snapshot)
+        if self.mode != "human_ai" or self.human_ai_phase != "playing" or self.human_ai_game_over:
+            return
+        self.finish_human_ai_ai_move(event.snapshot.results)
 
     def finish_human_ai_ai_move(self, analysis_snapshot):
         self.try_send_command("stop")
         self.human_ai_ai_thinking = False
+        self.report_human_ai_ai_move(self.play_best_analysis_move(analysis_snapshot, source="ai"))
 
-        if self.play_best_analysis_move(analysis_snapshot, source="ai"):
+    def report_human_ai_ai_move(self, played):
+        if played:
             if self.game_result:
                 self.human_ai_game_over = True
                 self.human_ai_status = self.result_text(self.game_result)
@@ -2289,6 +3174,9 @@ class Dandelion:
         if self.human_ai_ai_thinking:
             self.try_send_command("stop")
             self.human_ai_ai_thinking = False
+        self.human_ai_pondering = False
+        if self.human_ai_clock is not None:
+            self.settle_human_ai_clock(increment=False)
 
         if self.selected_piece is not None:
             self.unselect()
@@ -2305,15 +3193,12 @@ class Dandelion:
             if self.move_history:
                 self.undo_move()
 
-        with self.analysis_lock:
-            self.analysis_results.clear()
-            self.analysis_root_visits = 0
-            self.human_ai_root_visits = 0
-            self.human_ai_display_visits = 0
+        self.clear_analysis()
 
         result = self.update_game_result()
         self.human_ai_game_over = bool(result)
         self.human_ai_status = self.result_text(result) if result else "已悔棋"
+        self.human_ai_clock_player = self.current_player  # 悔棋不加秒
 
     def draw_human_ai_button(self, key, text, rect, selected=False, disabled=False):
         self.human_ai_buttons[key] = rect
@@ -2379,14 +3264,19 @@ class Dandelion:
             self.draw_human_ai_button("side_b", "玩家执红", pygame.Rect(10, 164, 180, 36), self.human_ai_player == 'b')
 
             self.draw_text("难度：", (10, 220), font_size=18)
-            for idx, (name, visits) in enumerate(HUMAN_AI_DIFFICULTIES):
+            for idx, (name, visits) in enumerate(self.human_ai_difficulties):
                 y = 250 + idx * 42
                 selected = idx == self.human_ai_difficulty_index
                 self.draw_human_ai_button(f"difficulty_{idx}", f"{name} {visits}", pygame.Rect(10, y, 180, 34), selected)
 
+            if self.difficulty_profile:
+                self.draw_text(f"已按本机校准（{self.difficulty_profile.get('created', '')[:10]}）", (10, 458), font_size=14, color=(90, 90, 90))
             self.draw_human_ai_button("start_current", "从当前局面开始", pygame.Rect(10, 480, 180, 40))
             self.draw_human_ai_button("start_standard", "标准开局开始", pygame.Rect(10, 530, 180, 40))
             self.draw_human_ai_button("back_main", "返回分析页", pygame.Rect(10, 590, 180, 40))
+            time_name = HUMAN_AI_TIME_CONTROLS[self.human_ai_time_control_index][0]
+            self.draw_human_ai_button("time_control", f"计时：{time_name}", pygame.Rect(10, 640, 180, 36),
+                                      self.human_ai_time_control() is not None)
         else:
             player_text = f"玩家：{self.player_name(self.human_ai_player)}"
             ai_text = f"AI：{self.player_name(get_opp(self.human_ai_player))}"
@@ -2395,15 +3285,17 @@ class Dandelion:
             self.draw_text(f"当前：{self.player_name(self.current_player)}", (10, 148), font_size=18)
 
             self.draw_text("难度：", (10, 190), font_size=18)
-            for idx, (name, visits) in enumerate(HUMAN_AI_DIFFICULTIES):
+            for idx, (name, visits) in enumerate(self.human_ai_difficulties):
                 y = 220 + idx * 38
                 selected = idx == self.human_ai_difficulty_index
                 self.draw_human_ai_button(f"difficulty_{idx}", f"{name} {visits}", pygame.Rect(10, y, 180, 32), selected)
 
-            self.draw_human_ai_button("undo", "悔棋", pygame.Rect(10, 440, 180, 38))
-            self.draw_human_ai_button("restart_ai", "重新开始", pygame.Rect(10, 488, 180, 38))
-            self.draw_human_ai_button("flip_ai", "翻转棋盘", pygame.Rect(10, 536, 180, 38))
-            self.draw_human_ai_button("back_main", "返回分析页", pygame.Rect(10, 594, 180, 40))
+            ponder_text = "AI预想：开" if self.human_ai_ponder else "AI预想：关"
+            self.draw_human_ai_button("ponder", ponder_text, pygame.Rect(10, 412, 180, 32), self.human_ai_ponder)
+            self.draw_human_ai_button("undo", "悔棋", pygame.Rect(10, 452, 180, 38))
+            self.draw_human_ai_button("restart_ai", "重新开始", pygame.Rect(10, 496, 180, 38))
+            self.draw_human_ai_button("flip_ai", "翻转棋盘", pygame.Rect(10, 540, 180, 38))
+            self.draw_human_ai_button("back_main", "返回分析页", pygame.Rect(10, 590, 180, 40))
 
         self.draw_move_evaluation()
 
@@ -2412,11 +3304,20 @@ class Dandelion:
         pygame.draw.rect(self.screen, (240, 240, 240), (panel_x, 0, self.sidebar_width, self.screen_height))
         pygame.draw.rect(self.screen, (0, 0, 0), (panel_x, 0, self.sidebar_width, self.screen_height), 2)
 
-        name, visits = HUMAN_AI_DIFFICULTIES[self.human_ai_difficulty_index]
+        name, visits = self.human_ai_difficulties[self.human_ai_difficulty_index]
         display_node = self.get_display_node()
         self.draw_text("对弈信息", (panel_x + 10, 10), font_size=24)
-        self.draw_text(f"玩家方：{self.player_name(self.human_ai_player)}", (panel_x + 10, 60), font_size=20)
-        self.draw_text(f"AI方：{self.player_name(get_opp(self.human_ai_player))}", (panel_x + 10, 92), font_size=20)
+        sides = [("玩家方", self.human_ai_player, 60), ("AI方", get_opp(self.human_ai_player), 92)]
+        for label, player, y in sides:
+            text, color = f"{label}：{self.player_name(player)}", (0, 0, 0)
+            if self.human_ai_clock is not None:
+                remaining = self.clock_remaining(player)
+                text += f"  {format_clock(remaining)}"
+                if remaining < 30:
+                    color = (200, 0, 0)
+                elif player == self.current_player:
+                    color = (0, 100, 0)
+            self.draw_text(text, (panel_x + 10, y), font_size=20, color=color)
         self.draw_text(f"难度：{name}（{visits} visits）", (panel_x + 10, 124), font_size=20)
         self.draw_text(f"当前走棋：{self.player_name(display_node['player'])}", (panel_x + 10, 156), font_size=20)
         step_text = f"步数：{display_node['move_num']}"
@@ -2424,8 +3325,12 @@ class Dandelion:
             step_text += "（历史）"
         self.draw_text(step_text, (panel_x + 10, 188), font_size=20)
 
-        if self.human_ai_ai_thinking:
+        if not self.engine_ready:
+            self.draw_engine_startup(panel_x + 10, 230, self.sidebar_width - 20)
+        elif self.human_ai_ai_thinking:
             self.draw_text(f"AI搜索：{self.human_ai_display_visits}/{self.human_ai_ai_target_visits}", (panel_x + 10, 230), font_size=20, color=(200, 0, 0))
+        elif self.human_ai_pondering and not self.game_result:
+            self.draw_text(f"AI预想：{snapshot_depth(self.analysis_snapshot)} visits", (panel_x + 10, 230), font_size=20, color=(0, 100, 0))
         elif self.game_result:
             result_color = (0, 66, 255) if self.game_result.get('winner') == 'w' else (200, 0, 0) if self.game_result.get('winner') == 'b' else (0, 0, 0)
             self.draw_text(self.result_text(self.game_result), (panel_x + 10, 230), font_size=20, color=result_color)
@@ -2467,6 +3372,10 @@ class Dandelion:
                     self.start_human_ai_game(use_current_position=False)
                 elif key == "flip_ai":
                     self.flip_board = not self.flip_board
+                elif key == "ponder":
+                    self.toggle_human_ai_ponder()
+                elif key == "time_control":
+                    self.cycle_human_ai_time_control()
                 return
 
         if self.handle_kifu_click(x, y):
@@ -2503,7 +3412,7 @@ class Dandelion:
         before_selected = self.selected_piece
         self.mouse_click_loc(col, row)
         if before_selected is not None and self.selected_piece is None and self.current_player != before_player:
-            self.human_ai_status = f"AI思考中：目标 {HUMAN_AI_DIFFICULTIES[self.human_ai_difficulty_index][1]} visits"
+            self.human_ai_status = f"AI思考中：目标 {self.human_ai_difficulties[self.human_ai_difficulty_index][1]} visits"
 
     def handle_human_ai_key(self, key):
         if key == pygame.K_ESCAPE:
@@ -2514,6 +3423,10 @@ class Dandelion:
             self.human_ai_undo()
         elif key == pygame.K_8:
             self.flip_board = not self.flip_board
+        elif key == pygame.K_p:
+            self.toggle_human_ai_ponder()
+        elif key == pygame.K_t:
+            self.cycle_human_ai_time_control()
         elif pygame.K_1 <= key <= pygame.K_5:
             self.set_human_ai_difficulty(key - pygame.K_1)
 
@@ -2694,6 +3607,8 @@ class Dandelion:
                 self.last_refresh_time = current_time
 
             for event in pygame.event.get():
+                if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.MOUSEWHEEL):
+                    self.note_user_input()
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.VIDEORESIZE:
@@ -2702,6 +3617,12 @@ class Dandelion:
                     self.load_resources()
                 elif event.type == pygame.USEREVENT:
                     pass
+                elif event.type == HUMAN_AI_SEARCH_DONE_EVENT:
+                    self.on_human_ai_search_done(event)
+                elif event.type == HUMAN_AI_POLICY_EVENT:
+                    self.on_human_ai_policy(event)
+                elif event.type == REVIEW_DONE_EVENT:
+                    self.on_review_done(event)
                 elif event.type == pygame.MOUSEWHEEL:
                     if self.mode == "main":
                         console_rect = pygame.Rect(self.announce_width + self.board_width, self.screen_height - self.gtp_console_height, self.sidebar_width, self.gtp_console_height)
@@ -2726,7 +3647,7 @@ class Dandelion:
                             self.mode = "main"
                             self.restart_game()
                             self.analyzing = True
-                            self.try_send_command(GTP_COMMAND_ANALYZE)
+                            self.start_analysis()
                             continue
                         self.handle_editor_click((x, y))
                 
@@ -2749,8 +3670,12 @@ class Dandelion:
                         if event.key == pygame.K_1:
                             self.swap_player()
 
+            self.flush_analysis_request()
             if self.mode == "human_ai":
                 self.update_human_ai()
+            elif self.mode == "main":
+                self.update_idle_preanalysis()
+                self.update_convergence()
 
             if self.mode == "main":
                 self.draw_main_board()
@@ -2761,8 +3686,49 @@ class Dandelion:
 
             pygame.display.update()
             pygame.time.wait(10)
-
+            now = time.time()
+            if now > self.last_frame_time:
+                self.frame_rate = 0.9 * self.frame_rate + 0.1 / (now - self.last_frame_time)
+            self.last_frame_time = now
+
+        if self.gtp_recorder:
+            self.gtp_recorder.close()
+        if self.review_pool:
+            self.review_pool.cancel()
+        self.stop_destination_analysis()
+        if self.compare_engine:
+            self.compare_engine.close()
+        if self.analysis_store:
+            self.analysis_store.close()
         pygame.quit()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dandelion 斗兽棋")
+    parser.add_argument("--engine", metavar="CMD", help="引擎命令行，默认使用KATAGO_COMMAND")
+    parser.add_argument("--record", metavar="FILE", help="录制与引擎的GTP会话（.gz结尾自动压缩）")
+    parser.add_argument("--replay", metavar="FILE", help="回放录制的GTP会话代替KataGo")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="回放倍速，0表示不限速")
+    parser.add_argument("--analysis-store", metavar="FILE", default=ANALYSIS_STORE_PATH,
+                        help=f"跨会话保存分析结果的SQLite文件，默认 {ANALYSIS_STORE_PATH}")
+    parser.add_argument("--no-analysis-store", action="store_true", help="不读写持久分析库")
+    parser.add_argument("--compare-engine", metavar="CMD",
+                        help="双引擎对比使用的第二个引擎命令行，默认使用COMPARE_KATAGO_COMMAND")
+    parser.add_argument("--difficulty-profile", metavar="FILE", default=DIFFICULTY_PROFILE_PATH,
+                        help=f"calibrate.py 生成的难度配置，默认 {DIFFICULTY_PROFILE_PATH}")
+    parser.add_argument("--pre-tune", action="store_true",
+                        help="不打开窗口，启动引擎完成OpenCL调优与模型加载后退出")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    Dandelion().run()
+    args = parse_args()
+    if args.pre_tune:
+        sys.exit(pre_tune(args.engine or KATAGO_COMMAND))
+    Dandelion(
+        engine_command=args.engine,
+        record_path=args.record,
+        replay_path=args.replay,
+        replay_speed=args.replay_speed,
+        store_path=None if args.no_analysis_store else args.analysis_store,
+        compare_command=args.compare_engine,
+        difficulty_profile_path=args.difficulty_profile,
+    ).run()
@@ -0,0 +1,324 @@
+"""
+引擎对引擎的批量对局，用于衡量棋力与设置改动的效果
+
+两个配置（引擎命令行、访问数、额外的GTP设置）从开局库的每个FEN出发各执一方下一局、再交换先后手，
+多局并行。胜负由 animal_rules 判定（进入兽穴、无子可动、达到 DRAW_MOVE_LIMIT 步），
+循环规则由引擎自己的历史判定。结果按A的视角统计，给出Elo及95%置信区间，可用SPRT提前结束。
+
+用法：
+    python match_runner.py --engine-a "python fake_katago.py" --visits-a 400 --visits-b 200 --games 200
+    python match_runner.py --setup-b "kata-set-param playoutDoublingAdvantage 1.5" --sprt 0 10
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+from queue import Queue, Empty
+
+import animal_rules
+from animal_rules import DRAW_MOVE_LIMIT, INITIAL_FEN, get_opp
+from engine_client import GtpEngine, GtpError
+from settings import KATAGO_COMMAND
+
+DEFAULT_ENGINE = KATAGO_COMMAND
+MATCH_ANALYZE_INTERVAL = 10  # 对局中每步只等最终结果，输出间隔越短越早拿到
+MOVE_TIMEOUT = 600  # 单条GTP命令的最长等待（秒）
+CONFIDENCE_Z = 1.96
+# 每局得分方差的下限：全胜、全负时样本方差为0，不设下限的话似然比无法计算，SPRT永远不会提前结束
+SPRT_MIN_VARIANCE = 0.02
+
+
+def load_openings(path):
+    """每行一个FEN，忽略空行与#注释；没有开局库时只用初始局面"""
+    if not path:
+        return [INITIAL_FEN]
+    openings = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                animal_rules.parse_fen(line)  # 格式错误时尽早报错
+                openings.append(line)
+    if not openings:
+        raise ValueError(f"开局库为空: {path}")
+    return openings
+
+
+def gtp_color(player):
+    return 'B' if player == 'w' else 'W'
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_stats(wins, draws, losses):
+    """返回 (得分率, 每局得分的方差)"""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.5, 0.0
+    w, d = wins / games, draws / games
+    score = w + d / 2
+    return score, max(0.0, w + d / 4 - score * score)
+
+
+def elo_interval(wins, draws, losses):
+    """Elo及95%置信区间的上下界"""
+    games = wins + draws + losses
+    score, variance = score_stats(wins, draws, losses)
+    margin = CONFIDENCE_Z * math.sqrt(variance / games) if games else 0.5
+    return elo_from_score(score), elo_from_score(score - margin), elo_from_score(score + margin)
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """三项分布（胜/和/负）的对数似然比，按得分的正态近似计算"""
+    games = wins + draws + losses
+    score, variance = score_stats(wins, draws, losses)
+    if games == 0:
+        return 0.0
+    variance = max(variance, SPRT_MIN_VARIANCE)
+    s0, s1 = score_from_elo(elo0), score_from_elo(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class EngineConfig:
+    def __init__(self, name, command, visits, setup_commands):
+        self.name = name
+        self.command = command
+        self.visits = visits
+        self.setup_commands = list(setup_commands)
+
+
+def pick_move(snapshot, board, player, rule):
+    """取最佳候选PV的前两步（选子、落子），不合法时返回None"""
+    for result in snapshot.results:
+        if result['order'] != 0:
+            continue
+        pv = result['pv'].split()
+        if len(pv) < 2:
+            return None
+        start, end = animal_rules.movestr_to_coord(pv[0]), animal_rules.movestr_to_coord(pv[1])
+        if (start, end) in animal_rules.legal_moves(board, player, rule):
+            return start, end
+        return None
+    return None
+
+
+def play_game(engines, configs, fen, rule, rule_commands, cancelled):
+    """engines/configs 以执子方为键；返回对局记录，胜负按执子方给出"""
+    board, player = animal_rules.parse_fen(fen)
+    setup = [f"setfen {fen}", f"mm {DRAW_MOVE_LIMIT}", "mc 0"] + rule_commands
+    for color, engine in engines.items():
+        for command in setup + configs[color].setup_commands:
+            engine.command(command, MOVE_TIMEOUT)
+    moves = []
+    move_num = 0
+    while True:
+        result = animal_rules.calculate_game_result(board, player, move_num, rule)
+        if result:
+            break
+        if cancelled.is_set():
+            return None
+        snapshot = engines[player].analyze(configs[player].visits, timeout=MOVE_TIMEOUT, interval=MATCH_ANALYZE_INTERVAL)
+        move = pick_move(snapshot, board, player, rule)
+        if move is None:
+            result = {'type': 'win', 'winner': get_opp(player), 'reason': f"{configs[player].name}没有给出合法着法"}
+            break
+        start, end = move
+        for engine in engines.values():
+            engine.command(f"play {gtp_color(player)} {animal_rules.coord_to_movestr(*start)}", MOVE_TIMEOUT)
+            engine.command(f"play {gtp_color(player)} {animal_rules.coord_to_movestr(*end)}", MOVE_TIMEOUT)
+        moves.append(animal_rules.coord_to_movestr(*start) + animal_rules.coord_to_movestr(*end))
+        board = animal_rules.apply_move(board, start, end)
+        player = get_opp(player)
+        move_num += 1
+    return {'fen': fen, 'moves': moves, 'result': result}
+
+
+class Match:
+    def __init__(self, config_a, config_b, openings, games, concurrency, rule=0,
+                 drawrule="WEIGHT", looprule="seventhree", sprt=None, output=None, verbose=True):
+        self.configs = (config_a, config_b)
+        self.rule = rule
+        self.rule_commands = [
+            f"kata-set-rule scoring {rule}",
+            f"kata-set-rule drawjudge {drawrule}",
+            f"kata-set-rule looprule {looprule}",
+        ]
+        self.concurrency = max(1, concurrency)
+        self.sprt = sprt  # (elo0, elo1, alpha, beta)
+        self.output = output
+        self.verbose = verbose  # 为False时只输出最终结果
+        self.tasks = Queue()
+        # 每个开局下两局，A先后手各一次；A执蓝（w）时 a_color 为 'w'
+        for index in range(games):
+            fen = openings[(index // 2) % len(openings)]
+            first = animal_rules.parse_fen(fen)[1]
+            a_color = first if index % 2 == 0 else get_opp(first)
+            self.tasks.put((index, fen, a_color))
+        self.total = games
+        self.wins = self.draws = self.losses = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.engines = []
+        self.verdict = None
+        self.started = time.time()
+
+    def run(self):
+        workers = [threading.Thread(target=self.worker, daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            print("\n已中断")
+            self.cancel()
+        self.report(final=True)
+        return self.verdict
+
+    def worker(self):
+        engines = {}
+        try:
+            for config in self.configs:
+                engine = GtpEngine(config.command)
+                engines[config.name] = engine
+                with self.lock:
+                    self.engines.append(engine)
+            while not self.cancelled.is_set():
+                try:
+                    index, fen, a_color = self.tasks.get_nowait()
+                except Empty:
+                    break
+                config_a, config_b = self.configs
+                by_color = {a_color: config_a, get_opp(a_color): config_b}
+                try:
+                    record = play_game(
+                        {color: engines[config.name] for color, config in by_color.items()},
+                        by_color, fen, self.rule, self.rule_commands, self.cancelled
+                    )
+                except GtpError as e:
+                    if self.cancelled.is_set():
+                        break
+                    print(f"第{index + 1}局出错，不计入结果: {e}", file=sys.stderr)
+                    with self.lock:
+                        self.errors += 1
+                    continue
+                if record is not None:
+                    self.record_game(index, a_color, record)
+        except (OSError, GtpError) as e:
+            if not self.cancelled.is_set():
+                print(f"引擎启动失败: {e}", file=sys.stderr)
+        finally:
+            for engine in engines.values():
+                engine.close()
+
+    def record_game(self, index, a_color, record):
+        winner = record['result']['winner']
+        with self.lock:
+            if winner is None:
+                self.draws += 1
+                outcome = "和"
+            elif winner == a_color:
+                self.wins += 1
+                outcome = "A胜"
+            else:
+                self.losses += 1
+                outcome = "B胜"
+            if self.output:
+                entry = dict(record, game=index + 1, a_color=a_color, outcome=outcome)
+                with open(self.output, "a", encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.verbose:
+                print(f"第{index + 1}局 {outcome}（{record['result']['reason']}，{len(record['moves'])}步）")
+                self.report()
+            if self.sprt and self.verdict is None:
+                elo0, elo1, alpha, beta = self.sprt
+                llr = sprt_llr(self.wins, self.draws, self.losses, elo0, elo1)
+                lower, upper = sprt_bounds(alpha, beta)
+                if llr >= upper:
+                    self.verdict = "H1"
+                elif llr <= lower:
+                    self.verdict = "H0"
+        if self.verdict:
+            self.cancel()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.lock:
+            engines = list(self.engines)
+        for engine in engines:
+            if engine.process.poll() is None:
+                engine.process.terminate()
+
+    def report(self, final=False):
+        games = self.wins + self.draws + self.losses
+        if games == 0:
+            print("没有完成的对局")
+            return
+        elo, low, high = elo_interval(self.wins, self.draws, self.losses)
+        text = (f"{games}/{self.total}局  A {self.wins}胜 {self.draws}和 {self.losses}负  "
+                f"Elo {elo:+.1f} [{low:+.1f}, {high:+.1f}]")
+        if self.sprt:
+            elo0, elo1, alpha, beta = self.sprt
+            lower, upper = sprt_bounds(alpha, beta)
+            llr = sprt_llr(self.wins, self.draws, self.losses, elo0, elo1)
+            text += f"  LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]"
+        if final:
+            text += f"  用时 {time.time() - self.started:.0f}s"
+            if self.errors:
+                text += f"  出错 {self.errors}局"
+            if self.verdict == "H1":
+                text += f"\nSPRT结论：接受 H1，A比B强 {self.sprt[1]:+g} Elo 左右或更多"
+            elif self.verdict == "H0":
+                text += f"\nSPRT结论：接受 H0，A比B强不超过 {self.sprt[0]:+g} Elo"
+        print(text, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="引擎对引擎批量对局（Elo与SPRT）")
+    parser.add_argument("--engine-a", metavar="CMD", default=DEFAULT_ENGINE, help="A方引擎命令行")
+    parser.add_argument("--engine-b", metavar="CMD", help="B方引擎命令行，默认与A相同")
+    parser.add_argument("--visits-a", type=int, default=400, help="A方每步访问数")
+    parser.add_argument("--visits-b", type=int, help="B方每步访问数，默认与A相同")
+    parser.add_argument("--setup-a", metavar="GTP", action="append", default=[],
+                        help="A方每局开始时额外发送的GTP命令，可重复")
+    parser.add_argument("--setup-b", metavar="GTP", action="append", default=[], help="B方额外的GTP命令")
+    parser.add_argument("--openings", metavar="FILE", help="开局库，每行一个FEN")
+    parser.add_argument("--games", type=int, default=100, help="最多对局数（每个开局两局交换先后手）")
+    parser.add_argument("--concurrency", type=int, default=2, help="并行对局数，每局占用两个引擎进程")
+    parser.add_argument("--rule", type=int, default=0, choices=range(4), help="kata-set-rule scoring")
+    parser.add_argument("--drawrule", default="WEIGHT", help="kata-set-rule drawjudge")
+    parser.add_argument("--looprule", default="seventhree", help="kata-set-rule looprule")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="SPRT检验 H0: elo=ELO0 对 H1: elo=ELO1")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--output", metavar="FILE", help="把每局记录追加到JSON Lines文件")
+    args = parser.parse_args(argv)
+
+    config_a = EngineConfig("A", args.engine_a, args.visits_a, args.setup_a)
+    config_b = EngineConfig("B", args.engine_b or args.engine_a, args.visits_b or args.visits_a, args.setup_b)
+    sprt = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    match = Match(
+        config_a, config_b, load_openings(args.openings), args.games, args.concurrency,
+        rule=args.rule, drawrule=args.drawrule, looprule=args.looprule, sprt=sprt, output=args.output,
+    )
+    match.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
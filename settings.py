@@ -0,0 +1,18 @@
+"""
+各工具共用的默认设置
+
+界面（main.py）与命令行工具共用。本模块不依赖pygame，calibrate.py 等工具导入时不会加载界面，也不会循环导入 main。
+"""
+
+KATAGO_COMMAND = "./resource/engine/katago.exe gtp -config ./resource/engine/engine2024.cfg -model ./resource/engine/b10c384nbt.bin.gz -override-config drawJudgeRule=WEIGHT"
+
+# 只用策略网络、不搜索的难度及其采样温度（越高越随机，0为总走概率最大的着法）
+HUMAN_AI_POLICY_LEVELS = {"新手": 1.0, "业余": 0.5}
+# 默认难度；运行 calibrate.py 后改用按本机校准的配置（见 calibrate.DIFFICULTY_PROFILE_PATH）
+HUMAN_AI_DIFFICULTIES = [
+    ("新手", 50),
+    ("业余", 150),
+    ("爱好者", 500),
+    ("大师", 1500),
+    ("特级大师", 3000),
+]
@@ -0,0 +1,212 @@
+import random
+
+from analysis import (EMPTY_SNAPSHOT, AnalysisSnapshot, ConvergenceMonitor, analyze_command, best_result, build_snapshot,
+                      classify_move, parse_analysis_moves, parse_ownership, parse_raw_policy, sample_policy_move,
+                      snapshot_depth)
+from animal_rules import COLS, ROWS
+
+LINE = (
+    "info move F2 visits 9 utility 0.71 winrate 0.856643 scoreMean 1.345516 scoreStdev 0 prior 0.45 "
+    "lcb 0.731643 order 0 pv F2 G2 C7 D7 "
+    "info move A3 visits 5 utility 0.29 winrate 0.649637 scoreMean 16.772916 scoreStdev 0 prior 0.24 "
+    "lcb 0.495129 order 1 pv A3 A4 A7 B7 "
+    "rootInfo visits 15 winrate 0.8"
+)
+LATER = "info move C3 visits 4 utility 0.21 winrate 0.605474 scoreMean 7.88 scoreStdev 0 prior 0.23 lcb 0.43 order 0 pv C3 B3"
+
+
+def test_parse_analysis_moves():
+    first, second = parse_analysis_moves(LINE)
+    assert (first['move'], first['col'], first['row']) == ("F2", 5, 7)
+    assert first['visits'] == 9 and first['order'] == 0
+    assert abs(first['winrate'] - 85.6643) < 1e-9
+    assert first['pv'] == "F2 G2 C7 D7"
+    assert second['move'] == "A3" and second['pv'] == "A3 A4 A7 B7"
+
+
+def test_parse_analysis_moves_ignores_other_lines():
+    assert parse_analysis_moves("= ") == []
+    assert parse_analysis_moves("info move F2 visits 9") == []
+
+
+def test_build_snapshot_sorts_and_reads_root_visits():
+    snapshot = build_snapshot(EMPTY_SNAPSHOT, LINE, key="k")
+    assert [r['move'] for r in snapshot.results] == ["F2", "A3"]
+    assert snapshot.key == "k" and snapshot.root_visits == 15
+    assert snapshot_depth(snapshot) == 15
+    assert best_result(snapshot.results)['move'] == "F2"
+
+
+def test_build_snapshot_merge():
+    previous = build_snapshot(EMPTY_SNAPSHOT, LINE)
+    merged = build_snapshot(previous, LATER, merge=True)
+    assert [r['move'] for r in merged.results] == ["F2", "A3", "C3"]
+    replaced = build_snapshot(previous, LATER)
+    assert [r['move'] for r in replaced.results] == ["C3"]
+    assert replaced.root_visits == 15  # 没有rootInfo时沿用上一快照
+    assert previous.results[0]['move'] == "F2"  # 已发布的快照不被修改
+
+
+def test_build_snapshot_unchanged_line_returns_previous():
+    previous = build_snapshot(EMPTY_SNAPSHOT, LINE)
+    assert build_snapshot(previous, "info nothing useful") is previous
+
+
+def test_build_snapshot_new_key_drops_previous():
+    previous = build_snapshot(EMPTY_SNAPSHOT, LINE, key="a")
+    snapshot = build_snapshot(previous, LATER, merge=True, key="b")
+    assert [r['move'] for r in snapshot.results] == ["C3"]
+    assert snapshot.root_visits == 0
+
+
+def test_snapshot_depth_without_root_info():
+    snapshot = build_snapshot(EMPTY_SNAPSHOT, LATER, key="k")
+    assert snapshot_depth(snapshot) == 4
+    assert snapshot_depth(AnalysisSnapshot((), 0, 0.0)) == 0
+
+
+def test_classify_move_thresholds():
+    assert classify_move(60.0, 57.0, False) == 'best'
+    assert classify_move(60.0, 56.9, False) == 'ok'
+    assert classify_move(60.0, 52.1, False) == 'ok'
+    assert classify_move(60.0, 52.0, False) == 'mistake'
+    assert classify_move(60.0, 40.1, False) == 'mistake'
+    assert classify_move(60.0, 40.0, False) == 'blunder'
+
+
+def test_classify_move_criticality_of_best_move():
+    assert classify_move(80.0, 80.0, True, 64.9) == 'nice'
+    assert classify_move(80.0, 80.0, True, 65.0) == 'brilliant'
+    assert classify_move(80.0, 80.0, True, 69.9) == 'brilliant'
+    assert classify_move(80.0, 80.0, True, 70.0) == 'best'
+    assert classify_move(80.0, 80.0, True) == 'best'
+    assert classify_move(80.0, 60.0, False, 50.0) == 'blunder'  # 只有走了最佳着才看关键程度
+
+
+def ownership_line(count):
+    values = " ".join("%.2f" % ((i % 7) / 10 - 0.3) for i in range(count))
+    return LATER + " ownership " + values + " ownershipStdev 0.1"
+
+
+def test_parse_ownership():
+    ownership = parse_ownership(ownership_line(ROWS * COLS))
+    assert ownership.shape == (ROWS, COLS)
+    assert abs(ownership[0][0] + 0.3) < 1e-6 and abs(ownership[ROWS - 1][COLS - 1] - 0.3) < 1e-6
+    assert parse_ownership(LATER) is None
+
+
+def test_parse_ownership_rejects_wrong_value_count():
+    assert parse_ownership(ownership_line(ROWS * COLS - 1)) is None
+    assert parse_ownership(ownership_line(ROWS * COLS + 1)) is None
+    assert parse_ownership(ownership_line(ROWS * COLS + 1).replace(" ownershipStdev 0.1", "")) is None
+    assert parse_ownership("ownership " + " ".join(["0.25"] * (ROWS * COLS - 1)) + " 0.123") is not None
+
+
+def test_build_snapshot_keeps_ownership_until_replaced():
+    first = build_snapshot(EMPTY_SNAPSHOT, ownership_line(ROWS * COLS), key="k")
+    later = build_snapshot(first, LINE, key="k")
+    assert later.ownership is first.ownership
+
+
+def test_analyze_command_interval_follows_frame_rate():
+    assert analyze_command() == "kata-analyze interval 20 rootInfo true"
+    assert analyze_command(60) == "kata-analyze interval 20 rootInfo true"
+    assert analyze_command(3) == "kata-analyze interval 34 rootInfo true"
+    assert analyze_command(0.5) == "kata-analyze interval 100 rootInfo true"
+
+
+def test_analyze_command_options():
+    assert analyze_command(maxmoves=6, ownership=True) == \
+        "kata-analyze interval 20 maxmoves 6 ownership true rootInfo true"
+    assert analyze_command(root_info=False) == "kata-analyze interval 20"
+    assert analyze_command(60, interval=100) == "kata-analyze interval 100 rootInfo true"
+
+
+def converging(visits, best="F2", winrate=60.0, best_lcb=0.58, other_lcb=0.50, key="k"):
+    results = (
+        {'move': best, 'visits': visits - 10, 'winrate': winrate, 'lcb': best_lcb, 'order': 0},
+        {'move': "A3", 'visits': 10, 'winrate': 50.0, 'lcb': other_lcb, 'order': 1},
+    )
+    return AnalysisSnapshot(results, visits, 0.0, key)
+
+
+def test_convergence_needs_stable_time_and_visits():
+    monitor = ConvergenceMonitor(stable_seconds=10, min_visits=1000)
+    assert not monitor.update(converging(500), now=0)
+    assert not monitor.update(converging(900), now=20)  # 访问数不够
+    assert not monitor.update(converging(2000), now=5)  # 稳定时间不够
+    assert monitor.update(converging(2000), now=10)
+
+
+def test_convergence_restarts_on_change():
+    monitor = ConvergenceMonitor(stable_seconds=10, min_visits=0)
+    monitor.update(converging(100), now=0)
+    assert not monitor.update(converging(100, best="A3"), now=20)  # 最佳着法变了
+    assert not monitor.update(converging(100, best="A3", key="other"), now=40)  # 换了局面
+    assert not monitor.update(converging(100, best="A3", key="other", winrate=61.0), now=60)  # 胜率漂移
+    assert monitor.update(converging(100, best="A3", key="other", winrate=61.2), now=70)
+
+
+def test_convergence_requires_lcb_gap():
+    monitor = ConvergenceMonitor(stable_seconds=0, min_visits=0, lcb_gap=1.0)
+    monitor.update(converging(100, best_lcb=0.505, other_lcb=0.50), now=0)
+    assert not monitor.update(converging(100, best_lcb=0.505, other_lcb=0.50), now=1)
+    assert monitor.update(converging(100, best_lcb=0.52, other_lcb=0.50), now=2)
+
+
+def test_convergence_resets_on_empty_snapshot():
+    monitor = ConvergenceMonitor(stable_seconds=0, min_visits=0)
+    monitor.update(converging(100), now=0)
+    assert not monitor.update(EMPTY_SNAPSHOT, now=1)
+    assert monitor.best_move is None
+
+
+def policy_grid(values):
+    grid = [[0.0] * COLS for _ in range(ROWS)]
+    for (row, col), p in values.items():
+        grid[row][col] = p
+    return grid
+
+
+def test_parse_raw_policy():
+    rows = [" ".join(["0.5"] + ["NAN"] * (COLS - 1))] * ROWS
+    grid = parse_raw_policy(["whiteWin 0.5", "policy"] + rows)
+    assert grid[0][0] == 0.5 and grid[0][1] == 0.0
+    assert parse_raw_policy(["whiteWin 0.5"]) is None
+    assert parse_raw_policy(["policy"] + rows[:-1]) is None
+    assert parse_raw_policy(["policy", "0.1 = 0.2"] + rows[1:]) is None
+
+
+SOURCE = policy_grid({(6, 0): 0.7, (6, 6): 0.3})
+DESTINATIONS = {
+    (6, 0): policy_grid({(5, 0): 0.9, (7, 0): 0.1}),
+    (6, 6): policy_grid({(5, 6): 1.0}),
+}
+LEGAL = [((6, 0), (5, 0)), ((6, 0), (7, 0)), ((6, 6), (5, 6)), ((8, 0), (8, 1))]
+
+
+def test_sample_policy_move_greedy():
+    assert sample_policy_move(SOURCE, DESTINATIONS, LEGAL, 0) == ((6, 0), (5, 0))
+
+
+def test_sample_policy_move_skips_missing_and_zero_policy():
+    assert sample_policy_move(SOURCE, DESTINATIONS, [((8, 0), (8, 1))], 1.0) is None
+    assert sample_policy_move(SOURCE, {}, LEGAL, 1.0) is None
+
+
+def test_sample_policy_move_follows_joint_policy():
+    rng = random.Random(1)
+    counts = {}
+    for _ in range(4000):
+        move = sample_policy_move(SOURCE, DESTINATIONS, LEGAL, 1.0, rng=rng)
+        counts[move] = counts.get(move, 0) + 1
+    assert set(counts) == set(LEGAL[:3])
+    # 联合概率 0.63 : 0.07 : 0.30
+    assert abs(counts[((6, 0), (5, 0))] / 4000 - 0.63) < 0.04
+    assert abs(counts[((6, 6), (5, 6))] / 4000 - 0.30) < 0.04
+
+
+def test_sample_policy_move_low_temperature_sharpens():
+    rng = random.Random(2)
+    moves = [sample_policy_move(SOURCE, DESTINATIONS, LEGAL, 0.1, rng=rng) for _ in range(200)]
+    assert moves.count(((6, 0), (5, 0))) >= 195
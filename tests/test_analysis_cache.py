@@ -0,0 +1,65 @@
+from analysis import AnalysisSnapshot
+from analysis_cache import AnalysisCache
+
+
+def snapshot(visits, key="k"):
+    results = ({'move': "F2", 'visits': visits, 'winrate': 50.0, 'order': 0},)
+    return AnalysisSnapshot(results, visits, 0.0, key)
+
+
+def test_offer_keeps_deeper_snapshot():
+    cache = AnalysisCache()
+    assert cache.offer("k", snapshot(100))
+    assert not cache.offer("k", snapshot(50))
+    assert not cache.offer("k", snapshot(100))
+    assert cache.depth("k") == 100
+    assert cache.offer("k", snapshot(200))
+    assert cache.depth("k") == 200
+
+
+def test_offer_rejects_empty_snapshot_and_missing_key():
+    cache = AnalysisCache()
+    assert not cache.offer("k", AnalysisSnapshot((), 500, 0.0, "k"))
+    assert not cache.offer(None, snapshot(100))
+    assert cache.get("k") is None
+
+
+def test_capacity_evicts_least_recently_used():
+    cache = AnalysisCache(capacity=2)
+    cache.offer("a", snapshot(10, "a"))
+    cache.offer("b", snapshot(10, "b"))
+    cache.get("a")
+    cache.offer("c", snapshot(10, "c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+class FakeStore:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+        self.saved = []
+        self.lookups = 0
+
+    def lookup(self, key):
+        self.lookups += 1
+        return self.entries.get(key)
+
+    def save(self, key, saved):
+        self.saved.append((key, saved.root_visits))
+
+
+def test_offer_writes_through_to_store_only_when_deeper():
+    store = FakeStore({"k": snapshot(300)})
+    cache = AnalysisCache(store=store)
+    assert not cache.offer("k", snapshot(200))  # 持久库中已有更深的
+    assert cache.offer("k", snapshot(400))
+    assert store.saved == [("k", 400)]
+
+
+def test_store_misses_are_remembered():
+    store = FakeStore()
+    cache = AnalysisCache(store=store)
+    assert cache.get("k") is None and cache.get("k") is None
+    assert store.lookups == 1
+    cache.offer("k", snapshot(100))
+    assert cache.depth("k") == 100
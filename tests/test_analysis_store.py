@@ -0,0 +1,52 @@
+from analysis import AnalysisSnapshot
+from analysis_store import AnalysisStore, decode_key, encode_key, engine_network_id
+
+KEY = ("l5t/1d3c1/r1j1w1e/7/7/7/E1W1J1R/1C3D1/T5L w", (6, 0), 0, 'WEIGHT', 'seventhree', 0)
+
+
+def snapshot(visits, move="F2"):
+    results = ({'move': move, 'col': 5, 'row': 7, 'visits': visits, 'winrate': 55.0, 'order': 0, 'pv': move},)
+    return AnalysisSnapshot(results, visits, 0.0, KEY)
+
+
+def test_key_round_trip():
+    assert decode_key(encode_key(KEY)) == KEY
+    unselected = (KEY[0], None) + KEY[2:]
+    assert decode_key(encode_key(unselected)) == unselected
+
+
+def test_engine_network_id():
+    assert engine_network_id("katago gtp -model ./engine/b10c384nbt.bin.gz -config x.cfg") == "b10c384nbt.bin.gz"
+    assert engine_network_id("/usr/bin/fake_katago") == "fake_katago"
+
+
+def test_store_round_trip_keeps_deeper_entry(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    store = AnalysisStore(path, "net-a")
+    store.save(KEY, snapshot(800))
+    store.save(KEY, snapshot(300, move="A3"))
+    store.close()
+
+    store = AnalysisStore(path, "net-a")
+    loaded = store.lookup(KEY)
+    assert loaded.key == KEY and loaded.root_visits == 800
+    assert loaded.results[0]['move'] == "F2"
+    store.save(KEY, snapshot(200, move="A3"))  # 跨会话也不会被较浅的分析覆盖
+    store.close()
+
+    store = AnalysisStore(path, "net-a")
+    assert store.lookup(KEY).root_visits == 800
+    assert [key for key, _ in store.recent()] == [KEY]
+    store.close()
+
+
+def test_store_is_per_network(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    store = AnalysisStore(path, "net-a")
+    store.save(KEY, snapshot(800))
+    store.close()
+    store = AnalysisStore(path, "net-b")
+    assert store.lookup(KEY) is None
+    assert store.recent() == []
+    store.close()
+
@@ -0,0 +1,234 @@
+import random
+
+import pytest
+
+import animal_rules
+from animal_rules import (BLUE_DEN, COLS, DENS, DRAW_MOVE_LIMIT, INITIAL_FEN, PIECE_RANKS, RED_DEN, ROWS, TRAPS, WATER,
+                          calculate_game_result, get_opp, has_legal_move, legal_moves, parse_fen)
+
+
+class PreRefactorRules:
+    """拆分到 animal_rules 之前 Dandelion 中的规则方法，从 main.py 原样复制，作为对照"""
+
+    def __init__(self, board, rule, player=None, move_num=0):
+        self.board = board
+        self.game_rule = rule
+        self.current_player = player
+        self.current_movenum = move_num
+
+    def player_name(self, player):
+        return "蓝方" if player == 'w' else "红方"
+
+    def is_piece_of_player(self, piece, player):
+        if piece == ' ':
+            return False
+        return (player == 'w' and piece.isupper()) or (player == 'b' and piece.islower())
+
+    def piece_owner(self, piece):
+        if piece == ' ':
+            return None
+        return 'w' if piece.isupper() else 'b'
+
+    def piece_rank(self, piece):
+        return PIECE_RANKS.get(piece.lower(), 0)
+
+    def can_lion_tiger_jump_over_own_rat(self):
+        return self.game_rule in [2, 3]
+
+    def can_water_land_rats_capture(self):
+        return self.game_rule in [1, 3]
+
+    def is_water(self, row, col):
+        return (row, col) in WATER
+
+    def is_own_den(self, player, row, col):
+        return DENS[player] == (row, col)
+
+    def can_capture_piece(self, piece, target_piece, from_pos, to_pos):
+        if target_piece == ' ':
+            return True
+
+        player = self.piece_owner(piece)
+        target_player = self.piece_owner(target_piece)
+        if player is None or target_player is None or player == target_player:
+            return False
+
+        # A piece in the defender's own trap can be captured by any defender.
+        if to_pos in TRAPS[player]:
+            return True
+
+        piece_type = piece.lower()
+        target_type = target_piece.lower()
+        from_water = from_pos in WATER
+        to_water = to_pos in WATER
+
+        if piece_type == 'r' and target_type == 'r':
+            if from_water != to_water and not self.can_water_land_rats_capture():
+                return False
+            return True
+
+        if piece_type == 'r' and target_type == 'e':
+            return not from_water
+        if piece_type == 'e' and target_type == 'r':
+            return False
+
+        mover_rank = self.piece_rank(piece)
+        target_rank = self.piece_rank(target_piece)
+        if from_pos in TRAPS[target_player]:
+            mover_rank = 0
+        return mover_rank >= target_rank
+
+    def legal_move_destination(self, row, col, drow, dcol):
+        piece = self.board[row][col]
+        player = self.piece_owner(piece)
+        if player is None:
+            return None
+
+        target_row = row + drow
+        target_col = col + dcol
+        if not (0 <= target_row < ROWS and 0 <= target_col < COLS):
+            return None
+
+        if piece.lower() in ('l', 't') and self.is_water(target_row, target_col):
+            jump_row, jump_col = target_row, target_col
+            while 0 <= jump_row < ROWS and 0 <= jump_col < COLS and self.is_water(jump_row, jump_col):
+                blocker = self.board[jump_row][jump_col]
+                if blocker.lower() == 'r':
+                    blocker_owner = self.piece_owner(blocker)
+                    if blocker_owner != player or not self.can_lion_tiger_jump_over_own_rat():
+                        return None
+                jump_row += drow
+                jump_col += dcol
+
+            if not (0 <= jump_row < ROWS and 0 <= jump_col < COLS):
+                return None
+            target_row, target_col = jump_row, jump_col
+
+        if self.is_own_den(player, target_row, target_col):
+            return None
+
+        target_piece = self.board[target_row][target_col]
+        if target_piece != ' ' and self.piece_owner(target_piece) == player:
+            return None
+
+        if self.is_water(target_row, target_col) and piece.lower() != 'r':
+            return None
+
+        if target_piece != ' ' and not self.can_capture_piece(piece, target_piece, (row, col), (target_row, target_col)):
+            return None
+
+        return target_row, target_col
+
+    def has_legal_move(self, player):
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = self.board[row][col]
+                if not self.is_piece_of_player(piece, player):
+                    continue
+                for drow, dcol in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                    if self.legal_move_destination(row, col, drow, dcol) is not None:
+                        return True
+        return False
+
+    def calculate_game_result(self):
+        if self.board[RED_DEN[0]][RED_DEN[1]] != ' ' and self.piece_owner(self.board[RED_DEN[0]][RED_DEN[1]]) == 'w':
+            return {'type': 'win', 'winner': 'w', 'reason': '进入红色兽穴D9'}
+        if self.board[BLUE_DEN[0]][BLUE_DEN[1]] != ' ' and self.piece_owner(self.board[BLUE_DEN[0]][BLUE_DEN[1]]) == 'b':
+            return {'type': 'win', 'winner': 'b', 'reason': '进入蓝色兽穴D1'}
+        if self.current_movenum >= DRAW_MOVE_LIMIT:
+            return {'type': 'draw', 'winner': None, 'reason': '达到300步（150回合）'}
+        if not self.has_legal_move(self.current_player):
+            return {'type': 'win', 'winner': get_opp(self.current_player), 'reason': f"{self.player_name(self.current_player)}无子可动"}
+        return None
+
+def reference_moves(board, player, rule):
+    """用拆分前的 legal_move_destination 逐个棋子、逐个方向枚举着法"""
+    rules = PreRefactorRules(board, rule)
+    moves = []
+    for row in range(ROWS):
+        for col in range(COLS):
+            if not rules.is_piece_of_player(board[row][col], player):
+                continue
+            for drow, dcol in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                target = rules.legal_move_destination(row, col, drow, dcol)
+                if target is not None:
+                    moves.append(((row, col), target))
+    return moves
+
+
+def random_board(rng):
+    """随机摆放双方部分棋子；老鼠以外的棋子不放进河里"""
+    board = [[' '] * COLS for _ in range(ROWS)]
+    squares = [(r, c) for r in range(ROWS) for c in range(COLS)]
+    rng.shuffle(squares)
+    for piece in "rcdwjtleRCDWJTLE":
+        if rng.random() < 0.25:
+            continue
+        while True:
+            row, col = squares.pop()
+            if piece.lower() == 'r' or (row, col) not in WATER:
+                board[row][col] = piece
+                break
+    return board
+
+
+def board_from(placements):
+    board = [[' '] * COLS for _ in range(ROWS)]
+    for move, piece in placements.items():
+        row, col = animal_rules.movestr_to_coord(move)
+        board[row][col] = piece
+    return board
+
+
+def destinations(board, rule, move):
+    row, col = animal_rules.movestr_to_coord(move)
+    return sorted(animal_rules.coord_to_movestr(*t) for t in animal_rules.piece_destinations(board, rule, row, col))
+
+
+@pytest.mark.parametrize("rule", [0, 1, 2, 3])
+def test_legal_moves_match_reference(rule):
+    rng = random.Random(rule)
+    for _ in range(300):
+        board = random_board(rng)
+        move_num = rng.choice([0, DRAW_MOVE_LIMIT - 1, DRAW_MOVE_LIMIT])
+        for player in ('w', 'b'):
+            old = PreRefactorRules(board, rule, player, move_num)
+            assert legal_moves(board, player, rule) == reference_moves(board, player, rule)
+            assert has_legal_move(board, player, rule) == old.has_legal_move(player)
+            assert calculate_game_result(board, player, move_num, rule) == old.calculate_game_result()
+
+
+def test_initial_position():
+    board, player = parse_fen(INITIAL_FEN)
+    assert player == 'w'
+    assert len(legal_moves(board, 'w', 0)) == len(reference_moves(board, 'w', 0)) == 24
+    assert calculate_game_result(board, 'w', 0, 0) is None
+
+
+def test_lion_jumps_river_unless_blocked_by_rat():
+    board = board_from({"B3": 'L'})
+    assert destinations(board, 0, "B3") == ["A3", "B2", "B7", "C3"]
+    board = board_from({"B3": 'L', "B5": 'R'})
+    assert "B7" not in destinations(board, 0, "B3")
+    assert "B7" in destinations(board, 2, "B3")  # 规则2、3允许跳过己方老鼠
+    board = board_from({"B3": 'L', "B5": 'r'})
+    assert "B7" not in destinations(board, 3, "B3")
+
+
+def test_rat_capture_between_water_and_land():
+    board = board_from({"B4": 'R', "A4": 'r'})
+    assert "A4" not in destinations(board, 0, "B4")
+    assert "A4" in destinations(board, 1, "B4")
+    board = board_from({"B4": 'R', "B3": 'e'})
+    assert "B3" not in destinations(board, 0, "B4")  # 河里的老鼠不能吃象
+    board = board_from({"A3": 'R', "A4": 'e'})
+    assert "A4" in destinations(board, 0, "A3")
+
+
+def test_traps_and_dens():
+    board = board_from({"C9": 'R', "C8": 'l'})
+    assert "C9" in destinations(board, 0, "C8")  # 在对方陷阱里的棋子谁都能吃
+    assert "D9" not in destinations(board_from({"D8": 'l'}), 0, "D8")  # 不能进自己的兽穴
+    board = board_from({"D9": 'E', "A1": 'r'})
+    assert calculate_game_result(board, 'b', 10, 0)['winner'] == 'w'
+    assert calculate_game_result(board_from({"A1": 'R', "G9": 'l'}), 'w', 300, 0)['type'] == 'draw'
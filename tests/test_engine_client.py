@@ -0,0 +1,165 @@
+import os
+import sys
+import threading
+from collections import deque
+
+import engine_metrics
+from engine_client import EnginePool, GtpEngine, MirrorEngine, enqueue_command, is_analysis_command, position_update
+
+FAKE_ENGINE = f"{sys.executable} {os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fake_katago.py')}"
+ROOT = "setfen l5t/1d3c1/r1j1w1e/7/7/7/E1W1J1R/1C3D1/T5L w"
+
+# 不输出 GTP ready 的引擎：每收到一条命令就以info行回显，quit时退出
+SILENT_ENGINE = """
+import sys
+for line in sys.stdin:
+    print("info echo " + line.strip(), flush=True)
+    if line.strip() == "quit":
+        break
+"""
+
+
+def test_mirror_engine_sends_after_startup_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine_metrics, "ENGINE_READY_TIMEOUT", 0.2)
+    script = tmp_path / "silent_engine.py"
+    script.write_text(SILENT_ENGINE)
+    received = []
+    echoed = threading.Event()
+
+    def on_info(line, epoch):
+        received.append(line)
+        echoed.set()
+
+    mirror = MirrorEngine(f"{sys.executable} {script}", on_info)
+    try:
+        mirror.send("kata-set-rule scoring 0")
+        assert echoed.wait(10)
+        assert received == ["info echo kata-set-rule scoring 0"]
+        assert mirror.ready and mirror.metrics.ready_assumed
+    finally:
+        mirror.close()
+
+
+def test_position_update():
+    previous = [ROOT, "play B A3", "play B A4", "play W G7", "play W G6"]
+    assert position_update(None, previous) == (0, previous)
+    assert position_update(previous, previous) == (0, [])
+    assert position_update(previous, previous[:3] + ["play W A7", "play W A6"]) == (2, ["play W A7", "play W A6"])
+    assert position_update(previous, previous + ["play B C3"]) == (0, ["play B C3"])
+    assert position_update(previous, previous[:1]) == (4, [])
+    other = ["setfen 7/7/7/7/7/7/7/7/7 w", "play B A3"]
+    assert position_update(previous, other) == (0, other)
+
+
+def recording_engine():
+    engine = GtpEngine.__new__(GtpEngine)
+    engine.setup = None
+    engine.position = None
+    engine.sent = []
+    engine.command = lambda command, timeout=None: engine.sent.append(command)
+    return engine
+
+
+def test_set_position_sends_only_the_difference():
+    engine = recording_engine()
+    engine.configure(["kata-set-rule scoring 0"])
+    engine.set_position([ROOT, "play B A3", "play B A4"])
+    engine.sent.clear()
+    engine.configure(["kata-set-rule scoring 0"])
+    engine.set_position([ROOT, "play B C3", "play B C4"])
+    assert engine.sent == ["undo", "undo", "play B C3", "play B C4"]
+
+
+def test_setup_change_or_error_replays_everything():
+    engine = recording_engine()
+    engine.configure(["kata-set-rule scoring 0"])
+    engine.set_position([ROOT, "play B A3", "play B A4"])
+    engine.sent.clear()
+    engine.configure(["kata-set-rule scoring 1"])
+    engine.set_position([ROOT, "play B A3", "play B A4"])
+    assert engine.sent == ["kata-set-rule scoring 1", ROOT, "play B A3", "play B A4"]
+    engine.sent.clear()
+    engine.forget_state()
+    engine.configure(["kata-set-rule scoring 1"])
+    engine.set_position([ROOT])
+    assert engine.sent == ["kata-set-rule scoring 1", ROOT]
+
+
+def test_pool_worker_survives_failing_tasks():
+    results, errors = [], []
+
+    def handler(engine, task):
+        if task % 2:
+            raise ValueError(f"task {task}")
+        return engine.command("name")
+
+    def on_result(task, result):
+        results.append((task, result))
+
+    pool = EnginePool(FAKE_ENGINE, 1)
+    workers = pool.run(list(range(5)), handler, on_result, on_error=lambda e, task: errors.append((task, str(e))))
+    for worker in workers:
+        worker.join(30)
+    assert [task for task, _ in results] == [0, 2, 4]
+    assert errors == [(1, "task 1"), (3, "task 3")]
+
+
+def test_pool_restarts_engine_that_exited():
+    results, errors = [], []
+
+    def handler(engine, task):
+        if task == 0:
+            engine.process.kill()
+            engine.process.wait()
+        return engine.command("name")
+
+    pool = EnginePool(FAKE_ENGINE, 1)
+    workers = pool.run([0, 1], handler, lambda task, result: results.append(task),
+                       on_error=lambda e, task: errors.append(task))
+    for worker in workers:
+        worker.join(30)
+    assert errors == [0] and results == [1]
+
+
+def test_pool_reports_engine_start_failure():
+    errors = []
+    pool = EnginePool("/nonexistent/katago gtp", 1)
+    for worker in pool.run([0], lambda engine, task: None, lambda task, result: None,
+                           on_error=lambda e, task: errors.append(task)):
+        worker.join(10)
+    assert errors == [None]
+
+
+def test_is_analysis_command_with_id_prefix():
+    assert is_analysis_command("kata-analyze interval 20")
+    assert is_analysis_command("12 kata-analyze interval 20 rootInfo true")
+    assert is_analysis_command("stop") and is_analysis_command("7 stop")
+    assert not is_analysis_command("3 kata-raw-nn 0")
+    assert not is_analysis_command("play B A3") and not is_analysis_command("")
+
+
+def enqueued(commands, ready, queue=()):
+    queue = deque(queue)
+    for command in commands:
+        enqueue_command(queue, command, ready)
+    return list(queue)
+
+
+def test_enqueue_replaces_trailing_analysis_after_ready():
+    assert enqueued(["stop", "5 kata-analyze interval 20"], True) == ["5 kata-analyze interval 20"]
+    assert enqueued(["4 kata-analyze interval 20", "stop"], True) == ["stop"]
+    # play之前的分析命令保持先后，不被后面的取代
+    assert enqueued(["stop", "play B A3", "6 kata-analyze interval 20"], True) == \
+        ["stop", "play B A3", "6 kata-analyze interval 20"]
+
+
+def test_enqueue_keeps_only_last_analysis_before_ready():
+    commands = ["2 kata-analyze interval 20", ROOT, "stop", "play B A3", "3 kata-analyze interval 20"]
+    assert enqueued(commands, False) == [ROOT, "play B A3", "3 kata-analyze interval 20"]
+    assert enqueued(commands, True) == commands  # 就绪后每条都隔着其他命令，不能合并
+
+
+def test_enqueue_modifies_queue_in_place():
+    queue = deque(["stop", "play B A3", "stop"])
+    enqueue_command(queue, "8 kata-analyze interval 20", False)
+    assert list(queue) == ["play B A3", "8 kata-analyze interval 20"]
@@ -0,0 +1,141 @@
+import pytest
+
+from engine_metrics import ENGINE_READY_TIMEOUT, EngineMetrics
+
+STAMP = "2024-05-01 10:00:00+0800: "
+
+STARTUP = [
+    STAMP + "KataGo v1.14.1",
+    STAMP + "Using TrompTaylor rules initially, unless GTP/GUI overrides this",
+    STAMP + "Loaded config ./engine/engine2024.cfg",
+    STAMP + "Loaded model ./engine/b10c384nbt.bin.gz",
+    STAMP + "Model name: b10c384nbt-dandelion-s1234",
+    STAMP + "GTP Engine starting...",
+]
+OPENCL = [
+    "Found OpenCL Platform 0: NVIDIA CUDA (NVIDIA Corporation) (OpenCL 3.0 CUDA 12.2.138)",
+    "Found 1 device(s) on platform 0 with type CPU or GPU or Accelerator",
+    "Found OpenCL Device 0: NVIDIA GeForce RTX 3060 (NVIDIA Corporation) (score 11000300)",
+    "Creating context for OpenCL Platform: NVIDIA CUDA (NVIDIA Corporation) (OpenCL 3.0 CUDA 12.2.138)",
+    "Using OpenCL Device 0: NVIDIA GeForce RTX 3060 (NVIDIA Corporation) OpenCL 3.0 CUDA (Extensions: cl_khr_fp16)",
+]
+TUNING_START = [
+    "No existing tuning parameters found or parseable or valid at: "
+    "/root/.katago/opencltuning/tune11_gpuNVIDIAGeForceRTX3060_x7_y9_c384_mv14.txt",
+    "Performing autotuning",
+    "*** On some systems, this may take a while, only needs to be done once per GPU/net combination ***",
+    "Setting winograd3x3TileSize = 4",
+    "------------------------------------------------------",
+    "Tuning xGemmDirect for 1x1 convolutions and matrix mult",
+    "Testing 56 different configs",
+    "Tuning 0/56 (reference) Calls/sec 4503.76 L2Error 0 WGD=8 MDIMCD=1 NDIMCD=1 MDIMAD=1 NDIMBD=1 KWID=1",
+    "Tuning 14/56 Calls/sec 7212.39 L2Error 2.3e-11 WGD=16 MDIMCD=8 NDIMCD=8 MDIMAD=8 NDIMBD=8 KWID=2",
+]
+TUNING_NEXT_STAGE = [
+    "------------------------------------------------------",
+    "Tuning xGemm for convolutions",
+    "Testing 70 different configs",
+]
+TUNING_DONE = [
+    "Tuning 70/70 Calls/sec 9101.11 L2Error 1.1e-11 MWG=32 NWG=32 KWG=16",
+    "Done tuning",
+    "------------------------------------------------------",
+    "OpenCL backend thread 0: Model version 14",
+]
+READY = [STAMP + "GTP ready, beginning main protocol loop"]
+CUDA = [
+    STAMP + "KataGo v1.15.3",
+    STAMP + "Cuda backend thread 0: Found GPU NVIDIA GeForce RTX 4090 memory 25393692672 compute capability major 8 minor 9",
+    STAMP + "Cuda backend thread 0: Model version 14 useFP16 = true useNHWC = true",
+    STAMP + "Model name: b18c384nbt-dandelion",
+]
+EIGEN = [STAMP + "KataGo v1.14.1", STAMP + "Eigen backend thread 0: Model version 14"]
+BENCHMARK = [
+    "numSearchThreads = 16: 10 / 10 positions, visits/s = 1523.45 nnEvals/s = 1240.12 "
+    "nnBatches/s = 496.31 avgBatchSize = 2.50 (6.6 secs)",
+]
+GENMOVE_LOG = [
+    STAMP + "Time taken: 2.00",
+    STAMP + "Root visits: 1001",
+    STAMP + "New playouts: 1000",
+    STAMP + "NN rows: 800",
+    STAMP + "NN batches: 400",
+]
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (STARTUP, {'version': "1.14.1", 'model': "b10c384nbt-dandelion-s1234", 'backend': None, 'ready': False,
+               'tuning': False}),
+    (STARTUP + OPENCL, {'backend': "OpenCL", 'device': "NVIDIA GeForce RTX 3060", 'tuning': False}),
+    (STARTUP + OPENCL + TUNING_START, {'tuning': True, 'tuning_stage': "xGemmDirect", 'tuning_step': 14,
+                                       'tuning_total': 56, 'tuning_percent': 25.0, 'ready': False}),
+    (STARTUP + OPENCL + TUNING_START + TUNING_NEXT_STAGE, {'tuning': True, 'tuning_stage': "xGemm",
+                                                          'tuning_percent': 0.0}),
+    (STARTUP + OPENCL + TUNING_START + TUNING_NEXT_STAGE + TUNING_DONE, {'tuning': False, 'ready': False}),
+    (STARTUP + OPENCL + READY, {'ready': True, 'tuning': False, 'backend': "OpenCL"}),
+    (CUDA + READY, {'version': "1.15.3", 'backend': "CUDA", 'device': "NVIDIA GeForce RTX 4090",
+                    'model': "b18c384nbt-dandelion", 'ready': True}),
+    (EIGEN, {'backend': "Eigen", 'device': None}),
+    (BENCHMARK, {'visits_per_second': 1523.45, 'nn_evals_per_second': 1240.12}),
+    (GENMOVE_LOG, {'visits_per_second': 500.0, 'nn_evals_per_second': 400.0}),
+    (["", "   "], {'lines': 0, 'version': None}),
+])
+def test_feed(lines, expected):
+    metrics = EngineMetrics()
+    for line in lines:
+        metrics.feed(line + "\n")
+    for name, value in expected.items():
+        assert getattr(metrics, name) == value, name
+
+
+def test_version_keeps_first_match():
+    metrics = EngineMetrics()
+    for line in STARTUP + [STAMP + "Model was trained with KataGo v1.12.0"]:
+        metrics.feed(line)
+    assert metrics.version == "1.14.1"
+
+
+def test_summary_text():
+    metrics = EngineMetrics()
+    for line in STARTUP + OPENCL + TUNING_START:
+        metrics.feed(line)
+    assert "xGemmDirect" in metrics.summary_text() and "25%" in metrics.summary_text()
+    for line in TUNING_DONE + READY:
+        metrics.feed(line)
+    assert metrics.summary_text().startswith("OpenCL | ")
+
+
+@pytest.mark.parametrize("samples, expected", [
+    ([(0.0, 100), (0.5, 600)], None),  # 不到统计窗口
+    ([(0.0, 100), (2.0, 1100)], 500.0),
+    ([(0.0, 100), (2.0, 1100), (3.0, 2100)], 0.7 * 500.0 + 0.3 * 1000.0),
+    ([(0.0, 5000), (1.0, 100), (3.0, 900)], 400.0),  # 访问数变小：新的搜索重新计时
+])
+def test_record_root_visits(samples, expected):
+    metrics = EngineMetrics()
+    for now, visits in samples:
+        metrics.record_root_visits(visits, now=now)
+    assert metrics.visits_per_second == expected
+
+
+def test_startup_stalled_only_when_silent_and_not_ready():
+    metrics = EngineMetrics()
+    start = metrics.spawned
+    assert not metrics.startup_stalled(now=start + ENGINE_READY_TIMEOUT - 1)
+    assert metrics.startup_stalled(now=start + ENGINE_READY_TIMEOUT)
+    metrics.feed(STARTUP[0])
+    assert not metrics.startup_stalled(now=metrics.last_output + ENGINE_READY_TIMEOUT - 1)
+    metrics.stage = 'exited'
+    assert not metrics.startup_stalled(now=metrics.last_output + ENGINE_READY_TIMEOUT)
+
+
+def test_assume_ready_until_real_ready_line():
+    metrics = EngineMetrics()
+    metrics.feed(STARTUP[0])
+    metrics.assume_ready()
+    assert metrics.ready and metrics.ready_assumed
+    assert not metrics.startup_stalled(now=metrics.last_output + ENGINE_READY_TIMEOUT)
+    assert "未收到GTP ready" in metrics.stage_text()
+    metrics.feed(READY[0])
+    assert metrics.ready and not metrics.ready_assumed
+    assert metrics.stage_text() == "就绪"
@@ -0,0 +1,92 @@
+import io
+import time
+
+import pytest
+
+from gtp_transcript import (STREAM_STDERR, STREAM_STDIN, STREAM_STDOUT, GtpTranscriptRecorder, RecordingProcess,
+                            ReplayProcess, load_transcript)
+
+
+class FakeProcess:
+    def __init__(self, stdout, stderr):
+        self.stdin = io.StringIO()
+        self.stdout = io.StringIO(stdout)
+        self.stderr = io.StringIO(stderr)
+        self.pid = 1234
+
+
+@pytest.mark.parametrize("name", ["session.gtp", "session.gtp.gz"])
+def test_record_and_load_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    recorder = GtpTranscriptRecorder(path)
+    process = RecordingProcess(FakeProcess("= \n\ninfo move A3 visits 1\n", "GTP ready\n"), recorder)
+    process.stdin.write("1 kata-analyze interval 20\n")
+    process.stdin.write("\n")  # 空行不记录
+    assert process.stderr.readline() == "GTP ready\n"
+    assert process.stdout.readline() == "= \n"
+    assert process.stdout.readline() == "\n"
+    assert process.stdout.readline() == "info move A3 visits 1\n"
+    assert process.stdout.readline() == ""
+    assert process.pid == 1234  # 其余属性转给原进程
+    recorder.close()
+    recorder.record(STREAM_STDOUT, "关闭后丢弃")
+
+    records = load_transcript(path)
+    assert [(stream, text) for _, stream, text in records] == [
+        (STREAM_STDIN, "1 kata-analyze interval 20"),
+        (STREAM_STDERR, "GTP ready"),
+        (STREAM_STDOUT, "= "),
+        (STREAM_STDOUT, ""),
+        (STREAM_STDOUT, "info move A3 visits 1"),
+    ]
+    stamps = [stamp for stamp, _, _ in records]
+    assert stamps == sorted(stamps)
+    assert process.stdin.getvalue() == "1 kata-analyze interval 20\n\n"
+
+
+def write_transcript(path, lines):
+    with open(path, "w", encoding='utf-8') as f:
+        f.write("#dandelion-gtp-transcript 1\n")
+        for stamp, stream, text in lines:
+            f.write(f"{stamp}\t{stream}\t{text}\n")
+        f.write("garbage line\n")
+
+
+def test_replay_order_and_speed(tmp_path):
+    path = str(tmp_path / "session.gtp")
+    write_transcript(path, [
+        (0, STREAM_STDERR, "GTP ready"),
+        (0, STREAM_STDIN, "kata-analyze"),
+        (100, STREAM_STDOUT, "="),
+        (200, STREAM_STDOUT, "info move A3"),
+        (400, STREAM_STDOUT, "info move B3"),
+    ])
+    started = time.perf_counter()
+    process = ReplayProcess(path, speed=10)
+    lines = []
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            break
+        lines.append(line)
+    elapsed = time.perf_counter() - started
+    assert lines == ["=\n", "info move A3\n", "info move B3\n"]
+    assert 0.035 <= elapsed < 0.3  # 400ms 按10倍速回放
+    assert process.poll() is None  # stderr 还没读完
+    assert process.stderr.readline() == "GTP ready\n"
+    assert process.stderr.readline() == ""
+    assert process.poll() == 0
+
+
+def test_replay_unlimited_speed_and_terminate(tmp_path):
+    path = str(tmp_path / "session.gtp")
+    write_transcript(path, [(60000, STREAM_STDOUT, "info move A3"), (120000, STREAM_STDOUT, "info move B3")])
+    process = ReplayProcess(path, speed=0)
+    started = time.perf_counter()
+    assert process.stdout.readline() == "info move A3\n"
+    assert time.perf_counter() - started < 1.0
+    process.stdin.write("stop\n")
+    assert process.stdin.last_command == "stop"
+    process.terminate()
+    assert process.stdout.readline() == ""
+    assert process.poll() == 0
@@ -0,0 +1,83 @@
+import animal_rules
+from analysis import AnalysisSnapshot
+from main import Dandelion
+
+
+def app(**attributes):
+    """只设置被测方法用到的属性，不初始化pygame窗口和引擎"""
+    dandelion = Dandelion.__new__(Dandelion)
+    dandelion.game_rule = 0
+    dandelion.frame_rate = 10
+    dandelion.simple_mode = False
+    dandelion.selected_piece = None
+    dandelion.show_ownership = False
+    dandelion.human_ai_search_deadline = None
+    for name, value in attributes.items():
+        setattr(dandelion, name, value)
+    return dandelion
+
+
+def candidate(move, winrate, order, pv):
+    return {'move': move, 'visits': 100, 'winrate': winrate, 'lcb': winrate / 100, 'order': order, 'pv': pv}
+
+
+def snapshot(*results):
+    return AnalysisSnapshot(tuple(results), 200, 0.0)
+
+
+def played_node(start=(6, 0), end=(5, 0), move_num=1):
+    board, player = animal_rules.parse_fen(animal_rules.INITIAL_FEN)
+    parent = {'board': board, 'player': player, 'move_num': move_num - 1}
+    child = [row.copy() for row in board]
+    child[end[0]][end[1]], child[start[0]][start[1]] = child[start[0]][start[1]], ' '
+    move = {'player': player, 'piece': board[start[0]][start[1]], 'start': start, 'end': end}
+    node = {'board': child, 'player': animal_rules.get_opp(player), 'move_num': move_num, 'move': move}
+    return parent, node
+
+
+def test_review_move_grades_by_opponent_winrate():
+    parent, node = played_node()
+    parent_snapshot = snapshot(candidate("C3", 70.0, 0, "C3 C4 A7 A6"), candidate("A3", 66.0, 1, "A3 A4 G7 G6"))
+    child_snapshot = snapshot(candidate("G7", 35.0, 0, "G7 G6"))
+    review = app().review_move(parent, node, parent_snapshot, child_snapshot)
+    assert review['image_key'] == 'ok'
+    assert review['winrate'] == 65.0 and review['drop'] == 5.0
+    assert review['best'] == "狼上"
+
+
+def test_review_move_best_move_and_criticality():
+    parent, node = played_node()
+    parent_snapshot = snapshot(candidate("A3", 70.0, 0, "A3 A4 G7 G6"), candidate("C3", 58.0, 1, "C3 C4"))
+    child_snapshot = snapshot(candidate("G7", 30.0, 0, "G7 G6"))
+    assert app().review_move(parent, node, parent_snapshot, child_snapshot)['image_key'] == 'brilliant'
+    parent_snapshot = snapshot(candidate("A3", 70.0, 0, "A3 A4 G7 G6"), candidate("C3", 50.0, 1, "C3 C4"))
+    assert app().review_move(parent, node, parent_snapshot, child_snapshot)['image_key'] == 'nice'
+
+
+def test_review_move_terminal_and_missing_analysis():
+    parent, node = played_node(move_num=animal_rules.DRAW_MOVE_LIMIT)
+    parent_snapshot = snapshot(candidate("C3", 75.0, 0, "C3 C4"))
+    review = app().review_move(parent, node, parent_snapshot, None)
+    assert review['winrate'] == 50.0 and review['image_key'] == 'blunder'  # 和棋按50%计
+    parent, node = played_node()
+    assert app().review_move(parent, node, parent_snapshot, None) is None
+    assert app().review_move(parent, node, snapshot(), snapshot(candidate("G7", 40.0, 0, "G7"))) is None
+
+
+def test_analyze_command_for_each_purpose():
+    assert app().analyze_command_for("ai_search") == "kata-analyze interval 20 maxmoves 1 rootInfo true"
+    assert app(human_ai_search_deadline=30.0).analyze_command_for("ai_search") == \
+        "kata-analyze interval 20 maxmoves 2 rootInfo true"
+    assert app().analyze_command_for("evaluation") == "kata-analyze interval 20 rootInfo true"
+    assert app().analyze_command_for("ponder") == "kata-analyze interval 100 maxmoves 1 rootInfo true"
+    assert app(frame_rate=2).analyze_command_for("background") == "kata-analyze interval 20 rootInfo true"
+    assert app(frame_rate=2).analyze_command_for("view") == "kata-analyze interval 50 rootInfo true"
+
+
+def test_analyze_command_for_view_requests_only_what_is_drawn():
+    assert app(simple_mode=True).analyze_command_for("view") == "kata-analyze interval 20 maxmoves 6 rootInfo true"
+    # 选中棋子后要显示全部落点
+    assert app(simple_mode=True, selected_piece=(6, 0)).analyze_command_for("view") == \
+        "kata-analyze interval 20 rootInfo true"
+    assert app(show_ownership=True).analyze_command_for("view") == \
+        "kata-analyze interval 20 ownership true rootInfo true"
@@ -0,0 +1,62 @@
+import math
+
+import pytest
+
+from match_runner import (SPRT_MIN_VARIANCE, elo_from_score, elo_interval, score_from_elo, score_stats, sprt_bounds,
+                          sprt_llr)
+
+
+def test_elo_score_round_trip():
+    assert elo_from_score(0.5) == pytest.approx(0.0)
+    assert elo_from_score(0.75) == pytest.approx(190.85, abs=0.01)
+    for elo in (-300, -35, 0, 10, 200):
+        assert elo_from_score(score_from_elo(elo)) == pytest.approx(elo)
+
+
+def test_score_stats():
+    assert score_stats(0, 0, 0) == (0.5, 0.0)
+    score, variance = score_stats(60, 20, 20)
+    assert score == pytest.approx(0.7)
+    assert variance == pytest.approx(0.16)
+
+
+def test_elo_interval():
+    elo, low, high = elo_interval(50, 0, 50)
+    assert elo == pytest.approx(0.0)
+    assert low == pytest.approx(-high)
+    elo, low, high = elo_interval(60, 20, 20)
+    margin = 1.96 * math.sqrt(0.16 / 100)
+    assert elo == pytest.approx(elo_from_score(0.7))
+    assert (low, high) == (pytest.approx(elo_from_score(0.7 - margin)), pytest.approx(elo_from_score(0.7 + margin)))
+    assert low < elo < high
+
+
+def test_elo_interval_all_wins_stays_finite():
+    elo, low, high = elo_interval(10, 0, 0)
+    assert math.isfinite(elo) and low <= elo <= high
+
+
+def test_sprt_llr():
+    assert sprt_llr(0, 0, 0, 0, 10) == 0.0
+    s0, s1 = score_from_elo(0), score_from_elo(10)
+    assert sprt_llr(60, 20, 20, 0, 10) == pytest.approx(100 * (s1 - s0) * (1.4 - s0 - s1) / 0.32)
+    assert sprt_llr(60, 20, 20, 0, 10) > 0
+    assert sprt_llr(20, 20, 60, 0, 10) < 0
+    # 得分正好在两假设中点时似然比为0
+    midpoint = sprt_llr(1, 0, 1, -10, 10)
+    assert midpoint == pytest.approx(0.0)
+
+
+def test_sprt_bounds():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(-math.log(19))
+    assert upper == pytest.approx(math.log(19))
+
+
+def test_sprt_stops_on_one_sided_results():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert sprt_llr(20, 0, 0, 0, 10) > upper
+    assert sprt_llr(0, 0, 20, 0, 10) < lower
+    assert sprt_llr(0, 20, 0, 0, 10) < 0  # 全和：得分0.5，偏向H0
+    s0, s1 = score_from_elo(0), score_from_elo(10)
+    assert sprt_llr(5, 0, 0, 0, 10) == pytest.approx(5 * (s1 - s0) * (2 - s0 - s1) / (2 * SPRT_MIN_VARIANCE))